@@ -1,3 +1,4 @@
+import time
 import pymongo
 #import numpy as np
 
@@ -5,6 +6,9 @@ host = 'localhost'
 database = 'solar-reliability-cost'
 solarCollection = 'solar'
 reliabilityCollection = 'reliabilityFrontiers'
+surfaceCollection = 'reliabilitySurfaces'
+loadProfileCollection = 'loadProfiles'
+queueCollection = 'frontierQueue'
 
 def install():
     db = Database()
@@ -25,6 +29,25 @@ def install():
         ('loadTypeId', pymongo.ASCENDING),
         ('solarId', pymongo.ASCENDING)
     ],unique=True)
+    db.db[surfaceCollection].create_index([
+        ('lat', pymongo.ASCENDING),
+        ('lon', pymongo.ASCENDING),
+        ('loadTypeId', pymongo.ASCENDING),
+        ('solarId', pymongo.ASCENDING)
+    ],unique=True)
+    db.db[loadProfileCollection].create_index([
+        ('loadTypeId', pymongo.ASCENDING)
+    ],unique=True)
+    db.db[queueCollection].create_index([
+        ('lat', pymongo.ASCENDING),
+        ('lon', pymongo.ASCENDING),
+        ('loadTypeId', pymongo.ASCENDING),
+        ('reliabilityKey', pymongo.ASCENDING)
+    ],unique=True)
+    db.db[queueCollection].create_index([
+        ('state', pymongo.ASCENDING),
+        ('leaseExpires', pymongo.ASCENDING)
+    ])
     db.disconnect()
 
 def uninstall():
@@ -34,9 +57,13 @@ def uninstall():
 
 class Database:
 
+    def __init__(self,host=host,name=database):
+        self.host = host
+        self.name = name
+
     def connect(self):
-        self.client = pymongo.MongoClient(host)
-        self.db = pymongo.database.Database(self.client, database)
+        self.client = pymongo.MongoClient(self.host)
+        self.db = pymongo.database.Database(self.client, self.name)
 
     def disconnect(self):
         self.client.close()
@@ -53,7 +80,7 @@ class Database:
             'startDay': startDay,
             'endDay': endDay
         })
-        return solarData.dailyInsolation,solarData._id
+        return solarData['dailyInsolation'],solarData['_id']
 
     def loadHourlySolar(self,lat,lon,startYear,endYear,startMonth,endMonth,
         startDay,endDay):
@@ -120,7 +147,7 @@ class Database:
         },
         {
             '$set': {
-                'hourlyInsolation': data
+                'hourlyInsolation': _asList(data)
             }
         },
         upsert=True,
@@ -129,9 +156,31 @@ class Database:
         return x['_id']
 
     def saveReliabilityFrontiers(self,reliabilityFrontiers,lat,lon,loadTypeId,solarId):
+        self.db[reliabilityCollection].update_one({
+            'lat': lat,
+            'lon': lon,
+            'loadTypeId': loadTypeId,
+            'solarId': solarId
+        },
+        {
+            '$set': {
+                'reliabilityFrontiers.'+r: reliabilityFrontiers[r] for r in reliabilityFrontiers
+            }
+        },
+        upsert=True)
 
+    def loadReliabilitySurface(self,lat,lon,loadTypeId,solarId):
+        #Returns None if no surface has been saved for the key
+        c = self.db[surfaceCollection].find_one({
+            'lat': lat,
+            'lon': lon,
+            'loadTypeId': loadTypeId,
+            'solarId': solarId
+        })
+        return c['reliabilitySurface'] if c is not None else None
 
-        self.db[reliabilityCollection].update({
+    def saveReliabilitySurface(self,reliabilitySurface,lat,lon,loadTypeId,solarId):
+        self.db[surfaceCollection].update_one({
             'lat': lat,
             'lon': lon,
             'loadTypeId': loadTypeId,
@@ -139,7 +188,228 @@ class Database:
         },
         {
             '$set': {
-                'reliabilityFrontiers.'+r: reliabilityFrontiers[r] for r in reliabilityFrontiers
+                'reliabilitySurface': reliabilitySurface
             }
         },
         upsert=True)
+
+    def loadLoadProfile(self,loadTypeId):
+        #Returns None if no profile has been saved for loadTypeId
+        c = self.db[loadProfileCollection].find_one({'loadTypeId': loadTypeId})
+        return c['loadProfile'] if c is not None else None
+
+    def saveLoadProfile(self,loadProfile,loadTypeId):
+        self.db[loadProfileCollection].update_one({
+            'loadTypeId': loadTypeId
+        },
+        {
+            '$set': {
+                'loadProfile': _asList(loadProfile)
+            }
+        },
+        upsert=True)
+
+    #Bulk versions of the methods above, for loading and saving a whole region
+    #in a few round trips. Sites are given as (lat,lon) tuples and results are
+    #returned in dicts keyed by them; sites that are not stored are left out.
+
+    def loadDailySolarMany(self,latLons,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        return self._loadSolarMany('dailyInsolation',latLons,startYear,endYear,
+            startMonth,endMonth,startDay,endDay)
+
+    def loadHourlySolarMany(self,latLons,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        return self._loadSolarMany('hourlyInsolation',latLons,startYear,endYear,
+            startMonth,endMonth,startDay,endDay)
+
+    def loadDailySolarIdsMany(self,latLons,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        #Ids of the stored daily series, without transferring the series
+        return {k: solarId for k,(_,solarId) in self._loadSolarMany('dailyInsolation',latLons,
+            startYear,endYear,startMonth,endMonth,startDay,endDay,loadData=False).items()}
+
+    def loadHourlySolarIdsMany(self,latLons,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        #Ids of the stored hourly series, without transferring the series
+        return {k: solarId for k,(_,solarId) in self._loadSolarMany('hourlyInsolation',latLons,
+            startYear,endYear,startMonth,endMonth,startDay,endDay,loadData=False).items()}
+
+    def loadReliabilityFrontiersMany(self,keys,loadTypeId):
+        #keys is a list of (lat,lon,solarId) tuples. Returns a dict keyed by them.
+        #Each key is matched in full, so that the unique index is used.
+        toRtn = {}
+        for chunk in _chunks(keys):
+            cursor = self.db[reliabilityCollection].find({'$or': [
+                {'lat': lat,'lon': lon,'loadTypeId': loadTypeId,'solarId': solarId}
+                for (lat,lon,solarId) in chunk]})
+            for c in cursor:
+                toRtn[(c['lat'],c['lon'],c['solarId'])] = c['reliabilityFrontiers']
+        return toRtn
+
+    def saveDailySolarMany(self,data,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        #data is a dict of series keyed by (lat,lon). Returns their ids.
+        return self._saveSolarMany('dailyInsolation',data,startYear,endYear,
+            startMonth,endMonth,startDay,endDay)
+
+    def saveHourlySolarMany(self,data,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        return self._saveSolarMany('hourlyInsolation',data,startYear,endYear,
+            startMonth,endMonth,startDay,endDay)
+
+    def saveReliabilityFrontiersMany(self,items):
+        #items is a list of (reliabilityFrontiers,lat,lon,loadTypeId,solarId)
+        #tuples, the arguments of saveReliabilityFrontiers
+        requests = [pymongo.UpdateOne({
+            'lat': lat,
+            'lon': lon,
+            'loadTypeId': loadTypeId,
+            'solarId': solarId
+        },
+        {
+            '$set': {
+                'reliabilityFrontiers.'+r: reliabilityFrontiers[r] for r in reliabilityFrontiers
+            }
+        },
+        upsert=True) for (reliabilityFrontiers,lat,lon,loadTypeId,solarId) in items]
+        if len(requests) > 0:
+            self.db[reliabilityCollection].bulk_write(requests,ordered=False)
+
+    def _loadSolarMany(self,field,latLons,startYear,endYear,startMonth,endMonth,
+        startDay,endDay,loadData=True):
+        toRtn = {}
+        for chunk in _chunks(list(set(latLons))):
+            cursor = self.db[solarCollection].find({
+                '$or': _siteFilters(chunk),
+                'startYear': startYear,
+                'endYear': endYear,
+                'startMonth': startMonth,
+                'endMonth': endMonth,
+                'startDay': startDay,
+                'endDay': endDay,
+                field: {'$exists': True}
+            },
+            {field: 1, 'lat': 1, 'lon': 1} if loadData else {'lat': 1, 'lon': 1})
+            for solarData in cursor:
+                toRtn[(solarData['lat'],solarData['lon'])] = (solarData.get(field),solarData['_id'])
+        return toRtn
+
+    def _saveSolarMany(self,field,data,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        dateRange = {
+            'startYear': startYear,
+            'endYear': endYear,
+            'startMonth': startMonth,
+            'endMonth': endMonth,
+            'startDay': startDay,
+            'endDay': endDay
+        }
+        requests = [pymongo.UpdateOne(dict(lat=lat,lon=lon,**dateRange),
+            {'$set': {field: _asList(d)}},upsert=True) for ((lat,lon),d) in data.items()]
+        if len(requests) > 0:
+            self.db[solarCollection].bulk_write(requests,ordered=False)
+        #Upserted ids are only reported for new documents, so look them all up
+        toRtn = {}
+        for chunk in _chunks(list(data)):
+            cursor = self.db[solarCollection].find(dict({'$or': _siteFilters(chunk)},**dateRange),
+                {'lat': 1, 'lon': 1})
+            for x in cursor:
+                toRtn[(x['lat'],x['lon'])] = x['_id']
+        return toRtn
+
+class WorkQueue:
+    #Queue of (lat, lon, reliability, loadTypeId) frontier units in the Mongo
+    #database, shared by any number of worker processes on any number of
+    #machines. A unit is pending, leased, done or failed. Leasing is a single
+    #atomic find_one_and_update, so each unit goes to one worker at a time;
+    #a lease that is not completed or released before it expires (e.g. the
+    #worker crashed) can be taken by another worker. Lease times are taken
+    #from the workers' clocks, which are assumed to agree to well within the
+    #lease. Units are identified by the same unique key as their frontiers,
+    #so enqueueing again is idempotent.
+
+    def __init__(self,db):
+        self.collection = db.db[queueCollection]
+
+    def enqueue(self,units,loadTypeId):
+        #units are (lat,lon,reliability) tuples. New units are added as pending
+        #and done or failed ones are made pending again, since the caller
+        #found their frontiers missing; pending and leased units are left as
+        #they are. Returns the number of units added or made pending again.
+        requests = []
+        for (lat,lon,r) in units:
+            key = {'lat': lat,'lon': lon,'loadTypeId': loadTypeId,'reliabilityKey': _reliabilityKey(r)}
+            requests.append(pymongo.UpdateOne(dict(key,state={'$in': ['done','failed']}),
+                {'$set': {'state': 'pending','attempts': 0},'$unset': {'error': ''}}))
+            requests.append(pymongo.UpdateOne(key,
+                {'$setOnInsert': {'reliability': r,'state': 'pending','attempts': 0}},upsert=True))
+        if len(requests) < 1:
+            return 0
+        result = self.collection.bulk_write(requests,ordered=True)
+        return result.modified_count+result.upserted_count
+
+    def lease(self,worker,leaseSeconds,maxAttempts):
+        #Leases a pending or expired unit to worker, fewest attempts first.
+        #Expired units that have been leased maxAttempts times are marked
+        #failed instead, so that a unit that kills its workers is not leased
+        #forever. Returns the unit as a dict, or None if there is nothing to
+        #lease.
+        now = time.time()
+        self.collection.update_many({'state': 'leased','leaseExpires': {'$lt': now},
+            'attempts': {'$gte': maxAttempts}},
+            {'$set': {'state': 'failed','error': 'Lease expired on attempt {0}'.format(maxAttempts)},
+            '$unset': {'leaseExpires': '','worker': ''}})
+        return self.collection.find_one_and_update({
+            '$or': [
+                {'state': 'pending'},
+                {'state': 'leased','leaseExpires': {'$lt': now},'attempts': {'$lt': maxAttempts}}
+            ]
+        },
+        {
+            '$set': {'state': 'leased','worker': worker,'leaseExpires': now+leaseSeconds},
+            '$inc': {'attempts': 1}
+        },
+        sort=[('attempts',pymongo.ASCENDING)],
+        return_document=pymongo.ReturnDocument.AFTER)
+
+    def complete(self,unit):
+        #The frontier is saved by then, so the unit is done even if its lease
+        #was lost in the meantime
+        self.collection.update_one({'_id': unit['_id']},
+            {'$set': {'state': 'done'},'$unset': {'leaseExpires': '','worker': ''}})
+
+    def release(self,unit,error,maxAttempts):
+        #Returns a failed unit to the queue, or marks it failed once it has
+        #been attempted maxAttempts times. Nothing changes if another worker
+        #has leased it since. Returns True if it is marked failed.
+        failed = unit['attempts'] >= maxAttempts
+        result = self.collection.update_one({'_id': unit['_id'],'worker': unit['worker'],'state': 'leased'},
+            {'$set': {'state': 'failed' if failed else 'pending','error': str(error)},
+            '$unset': {'leaseExpires': '','worker': ''}})
+        return failed and result.matched_count > 0
+
+    def counts(self):
+        #Number of units in each state
+        toRtn = {'pending': 0,'leased': 0,'done': 0,'failed': 0}
+        for x in self.collection.aggregate([{'$group': {'_id': '$state','n': {'$sum': 1}}}]):
+            toRtn[x['_id']] = x['n']
+        return toRtn
+
+def _reliabilityKey(r):
+    #Same key as frontiers are stored under
+    return ('%.6f' % r).replace('.','_')
+
+def _siteFilters(latLons):
+    #Matches exactly the given sites. Separate $in lists on lat and lon would
+    #match every combination of them.
+    return [{'lat': lat,'lon': lon} for (lat,lon) in latLons]
+
+def _chunks(x,size=1000):
+    #Keeps $in and $or lists and returned batches to a manageable size
+    for i in range(0,len(x),size):
+        yield x[i:i+size]
+
+def _asList(data):
+    #BSON stores lists; series may arrive as numpy arrays
+    return data.tolist() if hasattr(data,'tolist') else data
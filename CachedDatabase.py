@@ -0,0 +1,182 @@
+from collections import OrderedDict
+import numpy as np
+
+#Memoising wrapper around a database backend (AppDatabase.Database or
+#FileDatabase.Database). Hourly solar series, frontier documents and
+#reliability surfaces are held in an in-process LRU cache bounded by an
+#estimate of their size in bytes, so repeated lookups of the same site do
+#not touch the backend. Saves made through the wrapper invalidate the
+#affected entries. Everything else is passed straight through to the wrapped
+#backend.
+
+defaultMaxBytes = 256*2**20
+
+class Database:
+
+    def __init__(self,db,maxBytes=defaultMaxBytes):
+        self.db = db
+        self.maxBytes = maxBytes
+        self.clear()
+
+    def __getattr__(self,name):
+        if name == 'db':
+            raise AttributeError(name)
+        return getattr(self.db,name)
+
+    def clear(self):
+        self.entries = OrderedDict()
+        self.nBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self.nBytes,
+            'maxBytes': self.maxBytes
+        }
+
+    def loadHourlySolar(self,lat,lon,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        key = ('hourlySolar',lat,lon,startYear,endYear,startMonth,endMonth,startDay,endDay)
+        return self._lookup(key,lambda: self._hourlyEntry(*self.db.loadHourlySolar(lat,lon,
+            startYear,endYear,startMonth,endMonth,startDay,endDay)))
+
+    def loadReliabilityFrontiers(self,lat,lon,loadTypeId,solarId):
+        #The returned dicts are copies as callers may add keys to them; the
+        #series in them are shared read-only arrays
+        key = ('reliabilityFrontiers',lat,lon,loadTypeId,solarId)
+        return self._frontiersCopy(self._lookup(key,lambda: self._frontiersEntry(
+            self.db.loadReliabilityFrontiers(lat,lon,loadTypeId,solarId))))
+
+    def loadReliabilitySurface(self,lat,lon,loadTypeId,solarId):
+        key = ('reliabilitySurface',lat,lon,loadTypeId,solarId)
+        if key not in self.entries:
+            surface = self.db.loadReliabilitySurface(lat,lon,loadTypeId,solarId)
+            if surface is None: #Not cached, so a later save and load see the new surface
+                self.misses += 1
+                return None
+            return self._lookup(key,lambda: self._surfaceEntry(surface))
+        return self._lookup(key,None)
+
+    def saveHourlySolar(self,data,lat,lon,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        solarId = self.db.saveHourlySolar(data,lat,lon,startYear,endYear,startMonth,
+            endMonth,startDay,endDay)
+        self.invalidate(('hourlySolar',lat,lon,startYear,endYear,startMonth,endMonth,startDay,endDay))
+        return solarId
+
+    def saveReliabilityFrontiers(self,reliabilityFrontiers,lat,lon,loadTypeId,solarId):
+        self.db.saveReliabilityFrontiers(reliabilityFrontiers,lat,lon,loadTypeId,solarId)
+        self.invalidate(('reliabilityFrontiers',lat,lon,loadTypeId,solarId))
+
+    def saveReliabilitySurface(self,reliabilitySurface,lat,lon,loadTypeId,solarId):
+        self.db.saveReliabilitySurface(reliabilitySurface,lat,lon,loadTypeId,solarId)
+        self.invalidate(('reliabilitySurface',lat,lon,loadTypeId,solarId))
+
+    def loadHourlySolarMany(self,latLons,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        dateRange = (startYear,endYear,startMonth,endMonth,startDay,endDay)
+        toRtn = {}
+        toLoad = []
+        for (lat,lon) in set(latLons):
+            key = ('hourlySolar',lat,lon)+dateRange
+            if key in self.entries:
+                toRtn[(lat,lon)] = self._lookup(key,None)
+            else:
+                toLoad.append((lat,lon))
+        if len(toLoad) > 0:
+            loaded = self.db.loadHourlySolarMany(toLoad,*dateRange)
+            for (lat,lon),(data,solarId) in loaded.items():
+                toRtn[(lat,lon)] = self._lookup(('hourlySolar',lat,lon)+dateRange,
+                    lambda: self._hourlyEntry(data,solarId))
+        return toRtn
+
+    def loadReliabilityFrontiersMany(self,keys,loadTypeId):
+        toRtn = {}
+        toLoad = []
+        for (lat,lon,solarId) in set(keys):
+            key = ('reliabilityFrontiers',lat,lon,loadTypeId,solarId)
+            if key in self.entries:
+                toRtn[(lat,lon,solarId)] = self._frontiersCopy(self._lookup(key,None))
+            else:
+                toLoad.append((lat,lon,solarId))
+        if len(toLoad) > 0:
+            loaded = self.db.loadReliabilityFrontiersMany(toLoad,loadTypeId)
+            for (lat,lon,solarId),rf in loaded.items():
+                toRtn[(lat,lon,solarId)] = self._frontiersCopy(self._lookup(
+                    ('reliabilityFrontiers',lat,lon,loadTypeId,solarId),lambda: self._frontiersEntry(rf)))
+        return toRtn
+
+    def saveHourlySolarMany(self,data,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        solarIds = self.db.saveHourlySolarMany(data,startYear,endYear,startMonth,
+            endMonth,startDay,endDay)
+        for (lat,lon) in data:
+            self.invalidate(('hourlySolar',lat,lon,startYear,endYear,startMonth,endMonth,startDay,endDay))
+        return solarIds
+
+    def saveReliabilityFrontiersMany(self,items):
+        self.db.saveReliabilityFrontiersMany(items)
+        for (_,lat,lon,loadTypeId,solarId) in items:
+            self.invalidate(('reliabilityFrontiers',lat,lon,loadTypeId,solarId))
+
+    def invalidate(self,key):
+        if key in self.entries:
+            _,nBytes = self.entries.pop(key)
+            self.nBytes -= nBytes
+
+    def _lookup(self,key,load):
+        #Missing documents raise from the backend and are not cached, so a
+        #later save and load see the new data
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key][0]
+
+        self.misses += 1
+        value,nBytes = load()
+        if nBytes <= self.maxBytes:
+            self.entries[key] = (value,nBytes)
+            self.nBytes += nBytes
+            while self.nBytes > self.maxBytes:
+                _,(_,evictedBytes) = self.entries.popitem(last=False)
+                self.nBytes -= evictedBytes
+                self.evictions += 1
+        return value
+
+    def _hourlyEntry(self,data,solarId):
+        if isinstance(data,np.ndarray) and not data.flags.writeable:
+            data = np.asarray(data,dtype=np.float64)
+        else: #Cached arrays are shared between callers, so keep a read-only copy
+            data = np.array(data,dtype=np.float64)
+            data.flags.writeable = False
+        return (data,solarId),data.nbytes
+
+    def _frontiersEntry(self,rf):
+        #Series are stored as read-only arrays, so that callers cannot change
+        #the cached frontiers through them
+        toRtn = {}
+        for rKey,f in rf.items():
+            toRtn[rKey] = {}
+            for k,v in f.items():
+                if np.ndim(v) > 0:
+                    v = np.array(v,dtype=np.float64)
+                    v.flags.writeable = False
+                toRtn[rKey][k] = v
+        return toRtn,sum(8*np.size(v) for f in toRtn.values() for v in f.values())
+
+    def _frontiersCopy(self,rf):
+        return {rKey: dict(f) for rKey,f in rf.items()}
+
+    def _surfaceEntry(self,surface):
+        #Stored as read-only arrays, which reliabilityFrontierFromSurface
+        #accepts without copying
+        surface = {k: np.array(v) for k,v in surface.items()}
+        for v in surface.values():
+            v.flags.writeable = False
+        return surface,sum(v.nbytes for v in surface.values())
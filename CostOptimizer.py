@@ -0,0 +1,157 @@
+import math
+import numpy as np
+
+import SolarData
+
+#Least-cost sizing on stored reliability frontiers. For every frontier and
+#every (solar price, storage price) scenario, the cheapest point of the
+#frontier is the one minimising solarPrice*solCap + storagePrice*storCap.
+#Frontiers are packed into padded arrays and searched for all scenarios at
+#once. Capacities are in the units
+#of the frontiers, i.e. per unit of daily load for the 'constant' load type,
+#so costs are per unit of daily load too.
+
+defaultDiscountRate = 0.05
+defaultLifetime = 20 #years
+convexTol = 1e-9
+maxChunkElements = 2**16 #Bound on frontiers*scenarios*points when searching point by point
+
+def capitalRecoveryFactor(discountRate=defaultDiscountRate,lifetime=defaultLifetime):
+    #Fraction of the capital cost paid each year to repay it over the lifetime
+    #at the discount rate. Accepts arrays.
+    discountRate = np.asarray(discountRate,dtype=np.float64)
+    growth = (1+discountRate)**lifetime
+    with np.errstate(divide='ignore',invalid='ignore'):
+        crf = discountRate*growth/(growth-1)
+    return np.where(discountRate == 0,1/np.asarray(lifetime,dtype=np.float64),crf)
+
+def packFrontiers(frontiers):
+    #Pads a list of frontiers (dicts with 'solCap' and 'storCap' lists, as
+    #stored) into two (frontiers, points) arrays. Missing frontiers (None)
+    #and padding are NaN.
+    lengths = [len(f['solCap']) if f is not None else 0 for f in frontiers]
+    solCap = np.full((len(frontiers),max(lengths,default=0)),np.nan)
+    storCap = np.full(solCap.shape,np.nan)
+    for i,f in enumerate(frontiers):
+        solCap[i,:lengths[i]] = f['solCap'] if lengths[i] > 0 else []
+        storCap[i,:lengths[i]] = f['storCap'] if lengths[i] > 0 else []
+    return solCap,storCap
+
+def leastCost(frontiers,solarPrices,storagePrices):
+    #Cheapest point of each frontier for each price scenario. frontiers is a
+    #list of frontier dicts or the (solCap, storCap) arrays of packFrontiers.
+    #solarPrices ($/kW) and storagePrices ($/kWh) are broadcast together to
+    #the shape of the scenarios. Returns a dict of arrays of shape
+    #(frontiers,)+scenarios: the optimal 'solCap' and 'storCap', their
+    #'capitalCost', the point 'index', and 'interior', which is False where the
+    #optimum is an end point of the frontier and may lie beyond its range.
+    #Frontiers with no points give NaN costs and capacities and index -1.
+
+    if isinstance(frontiers,tuple):
+        solCap,storCap = frontiers
+    else:
+        solCap,storCap = packFrontiers(frontiers)
+    solarPrices,storagePrices = np.broadcast_arrays(np.asarray(solarPrices,dtype=np.float64),
+        np.asarray(storagePrices,dtype=np.float64))
+    shape = solarPrices.shape
+    pSol = solarPrices.ravel()
+    pStor = storagePrices.ravel()
+    F,N = solCap.shape
+    M = len(pSol)
+
+    #Only the ratio of the prices matters, so weights summing to 1 are used
+    valid = np.logical_not(np.logical_or(np.isnan(solCap),np.isnan(storCap)))
+    nPoints = valid.sum(axis=1)
+    total = pSol+pStor
+    wSol = np.where(total > 0,pSol/np.where(total > 0,total,1),0.5)
+    wStor = 1-wSol
+
+    #On a convex frontier (storage increasing, dSolCap/dStorCap increasing)
+    #cost falls along each segment before the optimum and not after. Segment
+    #j falls when wSol exceeds dStor/(dStor-dSol), which increases with j, so
+    #the optimal point is the number of segment thresholds below wSol. These
+    #are counted for all scenarios at once by placing the thresholds among
+    #the sorted scenario weights. Slopes may decrease by convexTol (relative)
+    #where points are collinear.
+    dSol = np.diff(solCap,axis=1)
+    dStor = np.diff(storCap,axis=1)
+    segment = np.arange(max(N-1,0))[None,:] < nPoints[:,None]-1
+    convex = np.all(np.logical_or(np.logical_not(segment),dStor > 0),axis=1)
+    bends = np.logical_and(segment[:,1:],segment[:,:-1])
+    convex = np.logical_and(convex,np.all(np.logical_or(np.logical_not(bends),
+        dSol[:,:-1]*dStor[:,1:]-dSol[:,1:]*dStor[:,:-1] <=
+        convexTol*(np.abs(dSol[:,:-1]*dStor[:,1:])+np.abs(dSol[:,1:]*dStor[:,:-1]))),axis=1))
+
+    falling = np.logical_and(segment,dSol < 0)
+    threshold = np.ones(dSol.shape)
+    threshold[falling] = dStor[falling]/(dStor[falling]-dSol[falling])
+    order = np.argsort(wSol)
+    position = np.searchsorted(wSol[order],threshold,side='right')
+    counts = np.bincount((np.arange(F)[:,None]*(M+1)+position).ravel(),minlength=F*(M+1))
+    index = np.empty((F,M),dtype=np.int64)
+    index[:,order] = np.cumsum(counts.reshape(F,M+1),axis=1)[:,:M]
+
+    #Frontiers that are not convex are searched point by point, in chunks.
+    #Padding is set to a large finite capacity that is never cheapest.
+    other = np.flatnonzero(np.logical_and(np.logical_not(convex),nPoints > 0))
+    pad = np.finfo(np.float64).max/4
+    chunk = max(1,maxChunkElements//max(M*N,1))
+    for i in range(0,len(other),chunk):
+        f = other[i:i+chunk]
+        cost = np.where(valid[f],solCap[f],pad)[:,None,:]*wSol[None,:,None]
+        cost += np.where(valid[f],storCap[f],pad)[:,None,:]*wStor[None,:,None]
+        index[f] = np.argmin(cost,axis=2)
+    index[nPoints == 0] = -1
+
+    rows = np.arange(F)[:,None]
+    found = index >= 0
+    safeIndex = np.maximum(index,0)
+    optSol = np.where(found,solCap[rows,safeIndex] if N > 0 else np.nan,np.nan)
+    optStor = np.where(found,storCap[rows,safeIndex] if N > 0 else np.nan,np.nan)
+    capitalCost = optSol*pSol[None,:]+optStor*pStor[None,:]
+    interior = np.logical_and(index > 0,index < nPoints[:,None]-1)
+
+    outShape = (F,)+shape
+    return {
+        'solCap': optSol.reshape(outShape),
+        'storCap': optStor.reshape(outShape),
+        'capitalCost': capitalCost.reshape(outShape),
+        'index': index.reshape(outShape),
+        'interior': interior.reshape(outShape)
+    }
+
+def levelizedCost(capitalCost,reliability,discountRate=defaultDiscountRate,lifetime=defaultLifetime,
+    fixedCostFraction=0,dailyLoad=1):
+    #Cost per unit of load served: the annualised capital cost plus fixed
+    #yearly costs (as a fraction of the capital cost), divided by the load
+    #served in a year. reliability is the fraction of the load served.
+    #Arguments broadcast against each other.
+    annualCost = np.asarray(capitalCost)*(capitalRecoveryFactor(discountRate,lifetime)+fixedCostFraction)
+    return annualCost/(365*dailyLoad*np.asarray(reliability))
+
+def leastCostMap(db,latLonArray,reliabilities,solarPrices,storagePrices,loadTypeId='constant',
+    discountRate=defaultDiscountRate,lifetime=defaultLifetime,fixedCostFraction=0):
+    #Least-cost sizing for every site, reliability and price scenario from the
+    #frontiers stored in db, looked up in bulk. Nothing is calculated; sites
+    #or reliabilities without a stored frontier give NaN. Returns the dict of
+    #leastCost with arrays of shape (sites, reliabilities)+scenarios and a
+    #'levelizedCost' array of the same shape.
+
+    sites = [(math.floor(lat),math.floor(lon)) for (lat,lon) in latLonArray] #Round reflects NASA data, round to ones
+    unique = list(dict.fromkeys(sites))
+    solarIds = db.loadHourlySolarIdsMany(unique,SolarData.defaultStartYear,2005,1,12,1,31)
+    stored = db.loadReliabilityFrontiersMany([(lat,lon,solarIds[(lat,lon)]) for (lat,lon) in unique
+        if (lat,lon) in solarIds],loadTypeId)
+
+    frontiers = []
+    for (lat,lon) in sites:
+        rf = stored.get((lat,lon,solarIds.get((lat,lon))),{})
+        for r in reliabilities:
+            frontiers.append(rf.get(('%.6f' % r).replace('.','_')))
+
+    toRtn = leastCost(frontiers,solarPrices,storagePrices)
+    shape = (len(sites),len(reliabilities))+toRtn['solCap'].shape[1:]
+    toRtn = {k: v.reshape(shape) for k,v in toRtn.items()}
+    r = np.asarray(reliabilities,dtype=np.float64).reshape((1,len(reliabilities))+(1,)*(len(shape)-2))
+    toRtn['levelizedCost'] = levelizedCost(toRtn['capitalCost'],r,discountRate,lifetime,fixedCostFraction)
+    return toRtn
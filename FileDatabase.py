@@ -0,0 +1,334 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+
+#File-backed alternative to AppDatabase.Database with the same load*/save*
+#interface, for running without a Mongo server. Solar series are stored as
+#.npy files that are memory-mapped on load, so reads do not copy and several
+#worker processes can share the same pages. Frontiers are stored as one .npz
+#file of arrays per reliability, reliability surfaces as one .npz file per
+#site and load profiles as one .npy file per load type. WorkQueue is a
+#stand-in for AppDatabase.WorkQueue on a shared file system.
+
+path = 'data'
+solarDirectory = 'solar'
+reliabilityDirectory = 'reliabilityFrontiers'
+surfaceDirectory = 'reliabilitySurfaces'
+loadProfileDirectory = 'loadProfiles'
+queueDirectory = 'queue'
+queueStates = ['pending','leased','done','failed']
+
+def install(root=path):
+    db = Database(root)
+    db.connect()
+
+def uninstall(root=path):
+    shutil.rmtree(root,ignore_errors=True)
+
+class Database:
+
+    def __init__(self,root=path):
+        self.root = root
+
+    def connect(self):
+        os.makedirs(os.path.join(self.root,solarDirectory),exist_ok=True)
+        os.makedirs(os.path.join(self.root,reliabilityDirectory),exist_ok=True)
+        os.makedirs(os.path.join(self.root,surfaceDirectory),exist_ok=True)
+        os.makedirs(os.path.join(self.root,loadProfileDirectory),exist_ok=True)
+
+    def disconnect(self):
+        pass
+
+    def loadDailySolar(self,lat,lon,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        solarId = self._solarId(lat,lon,startYear,endYear,startMonth,endMonth,startDay,endDay)
+        return self._loadArray(self._solarFile(solarId,'daily')),solarId
+
+    def loadHourlySolar(self,lat,lon,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        solarId = self._solarId(lat,lon,startYear,endYear,startMonth,endMonth,startDay,endDay)
+        return self._loadArray(self._solarFile(solarId,'hourly')),solarId
+
+    def loadReliabilityFrontiers(self,lat,lon,loadTypeId,solarId):
+        #Raises FileNotFoundError if nothing has been saved for the key, like
+        #the Mongo backend raises when find_one returns None
+        directory = self._frontierDirectory(lat,lon,loadTypeId,solarId)
+        toRtn = {}
+        for fileName in os.listdir(directory):
+            if not fileName.endswith('.npz'):
+                continue
+            with np.load(os.path.join(directory,fileName)) as f:
+                toRtn[fileName[:-4]] = {k: f[k] if f[k].ndim > 0 else f[k].item() for k in f.files}
+        return toRtn
+
+    def saveDailySolar(self,data,lat,lon,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        solarId = self._solarId(lat,lon,startYear,endYear,startMonth,endMonth,startDay,endDay)
+        self._saveArray(self._solarFile(solarId,'daily'),data)
+        return solarId
+
+    def saveHourlySolar(self,data,lat,lon,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        solarId = self._solarId(lat,lon,startYear,endYear,startMonth,endMonth,startDay,endDay)
+        self._saveArray(self._solarFile(solarId,'hourly'),data)
+        return solarId
+
+    def saveReliabilityFrontiers(self,reliabilityFrontiers,lat,lon,loadTypeId,solarId):
+        #One file per reliability, so saving never rewrites other reliabilities
+        #and concurrent writers for the same site cannot lose each other's work
+        directory = self._frontierDirectory(lat,lon,loadTypeId,solarId)
+        os.makedirs(directory,exist_ok=True)
+        for r in reliabilityFrontiers:
+            arrays = {k: np.asarray(v,dtype=np.float64) for k,v in reliabilityFrontiers[r].items()}
+            self._replace(os.path.join(directory,r+'.npz'),lambda f: np.savez(f,**arrays))
+
+    def loadReliabilitySurface(self,lat,lon,loadTypeId,solarId):
+        #Returns None if no surface has been saved for the key
+        fileName = self._surfaceFile(lat,lon,loadTypeId,solarId)
+        if not os.path.exists(fileName):
+            return None
+        with np.load(fileName) as f:
+            return {k: f[k] if f[k].ndim > 0 else f[k].item() for k in f.files}
+
+    def saveReliabilitySurface(self,reliabilitySurface,lat,lon,loadTypeId,solarId):
+        arrays = {k: np.asarray(v,dtype=np.float64) for k,v in reliabilitySurface.items()}
+        arrays['rowStart'] = np.asarray(reliabilitySurface['rowStart'],dtype=np.int64)
+        self._replace(self._surfaceFile(lat,lon,loadTypeId,solarId),lambda f: np.savez(f,**arrays))
+
+    def loadLoadProfile(self,loadTypeId):
+        #Returns None if no profile has been saved for loadTypeId
+        fileName = self._loadProfileFile(loadTypeId)
+        if not os.path.exists(fileName):
+            return None
+        return self._loadArray(fileName)
+
+    def saveLoadProfile(self,loadProfile,loadTypeId):
+        self._saveArray(self._loadProfileFile(loadTypeId),loadProfile)
+
+    #Bulk versions of the methods above with the same signatures as in
+    #AppDatabase.Database. Each file is still read or written separately.
+
+    def loadDailySolarMany(self,latLons,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        return self._loadMany(self.loadDailySolar,latLons,startYear,endYear,
+            startMonth,endMonth,startDay,endDay)
+
+    def loadHourlySolarMany(self,latLons,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        return self._loadMany(self.loadHourlySolar,latLons,startYear,endYear,
+            startMonth,endMonth,startDay,endDay)
+
+    def loadDailySolarIdsMany(self,latLons,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        return self._solarIdsMany('daily',latLons,startYear,endYear,startMonth,endMonth,
+            startDay,endDay)
+
+    def loadHourlySolarIdsMany(self,latLons,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        return self._solarIdsMany('hourly',latLons,startYear,endYear,startMonth,endMonth,
+            startDay,endDay)
+
+    def loadReliabilityFrontiersMany(self,keys,loadTypeId):
+        toRtn = {}
+        for (lat,lon,solarId) in keys:
+            try:
+                toRtn[(lat,lon,solarId)] = self.loadReliabilityFrontiers(lat,lon,loadTypeId,solarId)
+            except FileNotFoundError:
+                pass
+        return toRtn
+
+    def saveDailySolarMany(self,data,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        return {(lat,lon): self.saveDailySolar(d,lat,lon,startYear,endYear,startMonth,
+            endMonth,startDay,endDay) for ((lat,lon),d) in data.items()}
+
+    def saveHourlySolarMany(self,data,startYear,endYear,startMonth,endMonth,
+        startDay,endDay):
+        return {(lat,lon): self.saveHourlySolar(d,lat,lon,startYear,endYear,startMonth,
+            endMonth,startDay,endDay) for ((lat,lon),d) in data.items()}
+
+    def saveReliabilityFrontiersMany(self,items):
+        for (reliabilityFrontiers,lat,lon,loadTypeId,solarId) in items:
+            self.saveReliabilityFrontiers(reliabilityFrontiers,lat,lon,loadTypeId,solarId)
+
+    def _loadMany(self,load,latLons,*dateRange):
+        toRtn = {}
+        for (lat,lon) in set(latLons):
+            try:
+                toRtn[(lat,lon)] = load(lat,lon,*dateRange)
+            except FileNotFoundError:
+                pass
+        return toRtn
+
+    def _solarIdsMany(self,resolution,latLons,*dateRange):
+        toRtn = {}
+        for (lat,lon) in set(latLons):
+            solarId = self._solarId(lat,lon,*dateRange)
+            if os.path.exists(self._solarFile(solarId,resolution)):
+                toRtn[(lat,lon)] = solarId
+        return toRtn
+
+    def _solarId(self,lat,lon,startYear,endYear,startMonth,endMonth,startDay,endDay):
+        return '{0}_{1}_{2}-{3}-{4}_{5}-{6}-{7}'.format(lat,lon,startYear,startMonth,
+            startDay,endYear,endMonth,endDay)
+
+    def _solarFile(self,solarId,resolution):
+        return os.path.join(self.root,solarDirectory,'{0}_{1}.npy'.format(solarId,resolution))
+
+    def _frontierDirectory(self,lat,lon,loadTypeId,solarId):
+        return os.path.join(self.root,reliabilityDirectory,
+            '{0}_{1}_{2}_{3}'.format(lat,lon,loadTypeId,solarId))
+
+    def _surfaceFile(self,lat,lon,loadTypeId,solarId):
+        return os.path.join(self.root,surfaceDirectory,
+            '{0}_{1}_{2}_{3}.npz'.format(lat,lon,loadTypeId,solarId))
+
+    def _loadProfileFile(self,loadTypeId):
+        return os.path.join(self.root,loadProfileDirectory,'{0}.npy'.format(loadTypeId))
+
+    def _loadArray(self,fileName):
+        return np.load(fileName,mmap_mode='r')
+
+    def _saveArray(self,fileName,data):
+        data = np.asarray(data,dtype=np.float64)
+        self._replace(fileName,lambda f: np.save(f,data))
+
+    def _replace(self,fileName,write):
+        #Write to a temporary file and rename it into place so that readers
+        #never see a partially written file
+        fd,tmpName = tempfile.mkstemp(dir=os.path.dirname(fileName),suffix='.tmp')
+        try:
+            with os.fdopen(fd,'wb') as f:
+                write(f)
+            os.replace(tmpName,fileName)
+        except:
+            os.remove(tmpName)
+            raise
+
+class WorkQueue:
+    #Same interface as AppDatabase.WorkQueue, with one JSON file per unit in a
+    #directory per state. Moving between states is an os.rename, which is
+    #atomic, so of several workers renaming the same pending file only one
+    #succeeds. A leased file's name carries the lease expiry and the worker.
+    #Needs a file system with atomic renames that all workers share, and
+    #worker clocks that agree to well within the lease.
+
+    def __init__(self,db):
+        self.root = os.path.join(db.root,queueDirectory)
+        for state in queueStates:
+            os.makedirs(os.path.join(self.root,state),exist_ok=True)
+
+    def enqueue(self,units,loadTypeId):
+        #As AppDatabase.WorkQueue.enqueue
+        leased = set(self._unitName(x) for x in self._list('leased'))
+        n = 0
+        for (lat,lon,r) in units:
+            name = self._name(lat,lon,loadTypeId,r)
+            if name in leased or os.path.exists(self._file('pending',name)):
+                continue
+            unit = {'lat': lat,'lon': lon,'reliability': r,'loadTypeId': loadTypeId,'attempts': 0}
+            self._write(self._file('pending',name),unit)
+            for state in ['done','failed']:
+                try:
+                    os.remove(self._file(state,name))
+                except FileNotFoundError:
+                    pass
+            n += 1
+        return n
+
+    def lease(self,worker,leaseSeconds,maxAttempts):
+        #As AppDatabase.WorkQueue.lease, but without ordering by attempts
+        self._reclaim(maxAttempts)
+        for fileName in self._list('pending'):
+            name = fileName[:-5]
+            leasedName = '{0}@{1:.3f}@{2}.json'.format(name,time.time()+leaseSeconds,worker)
+            try:
+                os.rename(os.path.join(self.root,'pending',fileName),os.path.join(self.root,'leased',leasedName))
+            except FileNotFoundError:
+                #Taken by another worker
+                continue
+            with open(os.path.join(self.root,'leased',leasedName)) as f:
+                unit = json.load(f)
+            unit['attempts'] += 1
+            unit['worker'] = worker
+            unit['_file'] = leasedName
+            return unit
+        return None
+
+    def complete(self,unit):
+        #The frontier is saved by then, so the unit is done even if its lease
+        #expired and it was put back in the queue
+        name = self._unitName(unit['_file'])
+        for source in [os.path.join(self.root,'leased',unit['_file']),self._file('pending',name)]:
+            try:
+                os.rename(source,self._file('done',name))
+                return
+            except FileNotFoundError:
+                pass
+
+    def release(self,unit,error,maxAttempts):
+        #As AppDatabase.WorkQueue.release
+        failed = unit['attempts'] >= maxAttempts
+        if self._claim(unit['_file']) is None:
+            return False
+        state = 'failed' if failed else 'pending'
+        record = {k: unit[k] for k in ['lat','lon','reliability','loadTypeId','attempts']}
+        record['error'] = str(error)
+        self._write(self._file(state,self._unitName(unit['_file'])),record)
+        return failed
+
+    def counts(self):
+        return {state: len(self._list(state)) for state in queueStates}
+
+    def _reclaim(self,maxAttempts):
+        #Expired leases go back to pending with the attempt counted, or are
+        #marked failed once that makes maxAttempts
+        now = time.time()
+        for fileName in self._list('leased'):
+            if float(fileName.split('@',2)[1]) >= now:
+                continue
+            unit = self._claim(fileName)
+            if unit is not None:
+                unit['attempts'] += 1
+                state = 'pending'
+                if unit['attempts'] >= maxAttempts:
+                    state = 'failed'
+                    unit['error'] = 'Lease expired on attempt {0}'.format(unit['attempts'])
+                self._write(self._file(state,self._unitName(fileName)),unit)
+
+    def _claim(self,leasedName):
+        #Takes a leased file out of the queue by renaming it to a name of its
+        #own, so that only one worker acts on it. Returns its contents or
+        #None if another worker got there first.
+        fd,tmpName = tempfile.mkstemp(dir=self.root,suffix='.tmp')
+        os.close(fd)
+        try:
+            os.replace(os.path.join(self.root,'leased',leasedName),tmpName)
+        except FileNotFoundError:
+            os.remove(tmpName)
+            return None
+        with open(tmpName) as f:
+            unit = json.load(f)
+        os.remove(tmpName)
+        return unit
+
+    def _write(self,fileName,unit):
+        fd,tmpName = tempfile.mkstemp(dir=self.root,suffix='.tmp')
+        with os.fdopen(fd,'w') as f:
+            json.dump(unit,f)
+        os.replace(tmpName,fileName)
+
+    def _list(self,state):
+        return sorted(x for x in os.listdir(os.path.join(self.root,state)) if x.endswith('.json'))
+
+    def _name(self,lat,lon,loadTypeId,r):
+        return '{0}_{1}_{2}_{3}'.format(lat,lon,loadTypeId,('%.6f' % r).replace('.','_'))
+
+    def _unitName(self,fileName):
+        return fileName.split('@',1)[0].replace('.json','')
+
+    def _file(self,state,name):
+        return os.path.join(self.root,state,name+'.json')
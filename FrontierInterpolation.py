@@ -0,0 +1,159 @@
+import math
+import numpy as np
+from scipy.spatial import cKDTree
+
+import ReliabilityCalculator
+import SolarData
+
+#Spatial interpolation of stored frontiers across the 1 degree grid. Frontiers
+#of neighbouring cells are usually close, so a new cell's frontier can often
+#be estimated from them instead of fetching its solar data and tracing it.
+#FrontierIndex is a KD-tree over the cell centres of the stored frontiers of
+#one load type and reliability. A query resamples the nearest frontiers onto
+#a common storage grid, averages them with inverse distance weights and
+#estimates the error from how much they disagree.
+#loadInterpolatedReliabilityFrontiers calculates only the cells whose
+#estimate is not good enough.
+
+defaultRadius = 2 #degrees of great circle distance between cell centres
+defaultNeighbours = 4
+defaultMaxError = 0.02 #Relative error in solar capacity
+
+def _cellCentres(sites):
+    #Stored frontiers are keyed by floored lat/lon, i.e. by cell
+    return [(math.floor(lat)+0.5,math.floor(lon)+0.5) for (lat,lon) in sites]
+
+def _neighbourhood(sites,margin):
+    #Cells within margin cells of the given cells, wrapping longitude across
+    #the antimeridian into [-180, 180) and stopping latitude at the poles
+    return list(dict.fromkeys((min(max(lat+i,-90),89),(lon+j+180)%360-180) for (lat,lon) in sites
+        for i in range(-margin,margin+1) for j in range(-margin,margin+1)))
+
+def _unitVectors(latLons):
+    #Points on the unit sphere, so that distances are chords whatever the
+    #latitude and across the antimeridian
+    latLons = np.radians(np.asarray(latLons,dtype=np.float64).reshape(-1,2))
+    lat = latLons[:,0]
+    lon = latLons[:,1]
+    return np.column_stack((np.cos(lat)*np.cos(lon),np.cos(lat)*np.sin(lon),np.sin(lat)))
+
+class FrontierIndex:
+    #frontiers is a dict of frontier dicts (solCap, storCap and solCapD, as
+    #stored) keyed by (lat,lon) cell
+
+    def __init__(self,frontiers):
+        self.sites = [(math.floor(lat),math.floor(lon)) for (lat,lon) in frontiers]
+        self.frontiers = list(frontiers.values())
+        self.tree = cKDTree(_unitVectors(_cellCentres(self.sites))) if len(self.sites) > 0 else None
+
+    @classmethod
+    def fromStored(cls,stored,reliability):
+        #Index of one reliability's frontiers in the documents returned by
+        #loadStoredFrontiers
+        rKey = ('%.6f' % reliability).replace('.','_')
+        return cls({site: rf[rKey] for site,rf in stored.items() if rKey in rf and len(rf[rKey]['solCap']) > 1})
+
+    def __len__(self):
+        return len(self.sites)
+
+    def query(self,lat,lon,k=defaultNeighbours,radius=defaultRadius):
+        #Frontier of the cell of (lat,lon) interpolated from the k nearest
+        #stored cells within radius degrees. Returns the frontier dict and an
+        #estimate of its relative error in solar capacity: the weighted mean
+        #relative deviation of the neighbours from the interpolated frontier,
+        #at the storage where it is largest. A stored cell is returned as it is
+        #with error 0. Returns (None, inf) without at least two neighbours with
+        #overlapping storage ranges.
+        if self.tree is None:
+            return None,math.inf
+        cell = (math.floor(lat),math.floor(lon))
+        chord = 2*math.sin(math.radians(radius)/2)
+        distances,indices = self.tree.query(_unitVectors(_cellCentres([cell]))[0],
+            k=min(k,len(self.sites)),distance_upper_bound=chord)
+        distances = np.atleast_1d(distances)
+        indices = np.atleast_1d(indices)
+        found = np.isfinite(distances)
+        distances = distances[found]
+        indices = indices[found]
+        if len(indices) > 0 and self.sites[indices[0]] == cell:
+            return self.frontiers[indices[0]],0.0
+        if len(indices) < 2:
+            return None,math.inf
+
+        return interpolateFrontiers([self.frontiers[i] for i in indices],1/distances**2)
+
+def loadStoredFrontiers(db,latLons,loadTypeId='constant'):
+    #Stored frontier documents (dicts of frontiers keyed by reliability key)
+    #of the given sites, keyed by (lat,lon) cell, looked up in bulk. Nothing
+    #is calculated or fetched.
+    sites = list(dict.fromkeys((math.floor(lat),math.floor(lon)) for (lat,lon) in latLons))
+    solarIds = db.loadHourlySolarIdsMany(sites,SolarData.defaultStartYear,2005,1,12,1,31)
+    stored = db.loadReliabilityFrontiersMany([(lat,lon,solarId) for (lat,lon),solarId in solarIds.items()],
+        loadTypeId)
+    return {(lat,lon): stored[(lat,lon,solarId)] for (lat,lon),solarId in solarIds.items()
+        if (lat,lon,solarId) in stored}
+
+def interpolateFrontiers(frontiers,weights):
+    #Weighted average of frontiers at common storage capacities: those of the
+    #first (most heavily weighted) frontier within the storage range of all
+    #of them. Returns the frontier dict and the error estimate of
+    #FrontierIndex.query, or (None, inf) if the ranges do not overlap.
+    storCaps = [np.asarray(f['storCap'],dtype=np.float64) for f in frontiers]
+    solCaps = [np.asarray(f['solCap'],dtype=np.float64) for f in frontiers]
+    weights = np.asarray(weights,dtype=np.float64)/np.sum(weights)
+    low = max(x[0] for x in storCaps)
+    high = min(x[-1] for x in storCaps)
+    storCap = storCaps[0][np.logical_and(storCaps[0] >= low,storCaps[0] <= high)]
+    if len(storCap) < 2:
+        return None,math.inf
+
+    resampled = np.array([np.interp(storCap,x,y) for (x,y) in zip(storCaps,solCaps)])
+    solCap = weights @ resampled
+    error = float(np.max(weights @ np.abs(resampled-solCap)/solCap))
+
+    #Derivatives against the point with less storage, as in the engines
+    dSol = np.diff(solCap)/np.diff(storCap)
+    solCapD = np.concatenate(([dSol[0]],dSol))
+    frontier = {
+        'solCap': solCap.tolist(),
+        'storCap': storCap.tolist(),
+        'solCapD': solCapD.tolist()
+    }
+    return frontier,error
+
+def loadInterpolatedReliabilityFrontiers(db,latLonArray,reliabilities,loadTypeId='constant',
+    maxError=defaultMaxError,radius=defaultRadius,k=defaultNeighbours,**kwargs):
+    #Frontiers for every site and reliability: stored ones where they exist,
+    #interpolated from stored neighbours where the error estimate is at most
+    #maxError, and otherwise calculated and saved with
+    #ReliabilityCalculator.loadHourlyReliabilityFrontiers (which is passed the
+    #other keyword arguments). Interpolated frontiers are not saved, so they
+    #are never used to interpolate others. Returns a dict keyed by
+    #(lat,lon,reliability) of (frontier, error) tuples, where error is 0 for
+    #stored and calculated frontiers.
+
+    sites = list(dict.fromkeys((math.floor(lat),math.floor(lon)) for (lat,lon) in latLonArray))
+    stored = loadStoredFrontiers(db,_neighbourhood(sites,math.ceil(radius)),loadTypeId)
+    toRtn = {}
+    missing = {}
+    for r in reliabilities:
+        index = FrontierIndex.fromStored(stored,r)
+        for (lat,lon) in sites:
+            frontier,error = index.query(lat,lon,k,radius)
+            if frontier is not None and error <= maxError:
+                toRtn[(lat,lon,r)] = (frontier,error)
+            else:
+                missing.setdefault((lat,lon),[]).append(r)
+
+    #Sites missing the same reliabilities are calculated in one call, then
+    #their frontiers are looked up in bulk
+    groups = {}
+    for site,rs in missing.items():
+        groups.setdefault(tuple(rs),[]).append(site)
+    for rs,group in groups.items():
+        ReliabilityCalculator.loadHourlyReliabilityFrontiers(db,group,list(rs),loadTypeId,**kwargs)
+        calculated = loadStoredFrontiers(db,group,loadTypeId)
+        for (lat,lon) in group:
+            for r in rs:
+                toRtn[(lat,lon,r)] = (calculated[(lat,lon)][('%.6f' % r).replace('.','_')],0.0)
+    return toRtn
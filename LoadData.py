@@ -0,0 +1,113 @@
+import numpy as np
+
+#Electric load profiles by loadTypeId. A profile is one period of hourly
+#average power that is repeated over the series: 24 values for a daily shape,
+#or 8760 for a year with seasonal variation. Yearly profiles follow the
+#calendar, so building a series from one needs its start date (see
+#loadSeries). Profiles are normalised to a daily energy of 1 (a mean of
+#1/24), so capacities stay per unit of daily load as for the 'constant'
+#load. Built-in profiles need no database; others are saved to the database
+#with saveProfile.
+#
+#Profiles and the series built from them are held per process as read-only
+#contiguous 1-D arrays, so all sites, reliabilities and tasks in a process
+#share one series per (loadTypeId, length, start date) instead of building
+#their own.
+
+def normaliseProfile(profile):
+    profile = np.asarray(profile,dtype=np.float64).ravel()
+    if len(profile) < 1 or np.any(profile < 0) or not np.all(np.isfinite(profile)):
+        raise ValueError('A load profile must be a non-empty series of non-negative numbers')
+    if np.sum(profile) <= 0:
+        raise ValueError('A load profile must have some load')
+    return profile/(24*np.mean(profile))
+
+hoursPerYear = 8760 #Length of a yearly profile, a year without Feb 29
+
+def seasonalProfile(dailyProfile,monthlyScale):
+    #Builds a year (8760 hours, non leap) from a daily shape scaled by 12
+    #monthly factors, e.g. for cooling or heating dominated loads
+    days = np.repeat(np.asarray(monthlyScale,dtype=np.float64),
+        [31,28,31,30,31,30,31,31,30,31,30,31])
+    return normaliseProfile(np.outer(days,np.asarray(dailyProfile,dtype=np.float64)).ravel())
+
+def _dayOfYear(startDate,nDays):
+    #Day of a non leap year, from 0, of nDays consecutive dates from
+    #startDate. Feb 29 takes the day of Feb 28.
+    days = np.datetime64(startDate,'D')+np.arange(nDays)
+    years = days.astype('datetime64[Y]')
+    dayOfYear = (days-years).astype(np.int64)
+    year = years.astype(np.int64)+1970
+    leap = (year%4 == 0) & ((year%100 != 0) | (year%400 == 0))
+    return dayOfYear-(leap & (dayOfYear >= 59))
+
+builtinProfiles = {
+    'constant': normaliseProfile(np.ones(24)),
+    #Household lighting and appliances: low overnight, small morning peak,
+    #main peak after sunset
+    'residential': normaliseProfile([0.5,0.4,0.4,0.4,0.4,0.6,0.9,1.0,0.8,0.6,0.6,0.6,
+        0.6,0.6,0.6,0.7,0.9,1.3,1.9,2.2,2.0,1.6,1.1,0.7]),
+    #Productive use (milling, workshops, irrigation) during working hours on
+    #top of a small base load
+    'productive': normaliseProfile([0.2,0.2,0.2,0.2,0.2,0.2,0.3,0.8,1.6,1.8,1.8,1.8,
+        1.4,1.8,1.8,1.8,1.6,1.0,0.4,0.3,0.2,0.2,0.2,0.2])
+}
+
+_profiles = {}
+_series = {}
+
+def loadProfile(db,loadTypeId):
+    #Returns the normalised profile of loadTypeId as a read-only array.
+    #Raises KeyError if it is neither built in nor saved in db.
+    if loadTypeId not in _profiles:
+        if loadTypeId in builtinProfiles:
+            profile = builtinProfiles[loadTypeId].copy()
+        else:
+            profile = db.loadLoadProfile(loadTypeId) if db is not None else None
+            if profile is None:
+                raise KeyError('Unknown load type: {0}'.format(loadTypeId))
+            profile = np.array(profile,dtype=np.float64)
+        profile.flags.writeable = False
+        _profiles[loadTypeId] = profile
+    return _profiles[loadTypeId]
+
+def loadSeries(db,loadTypeId,nHours,startDate=None):
+    #The profile of loadTypeId repeated over nHours as a read-only contiguous
+    #1-D array, built once per process. Series start at midnight, so a daily
+    #profile is repeated from its first hour. A yearly profile is instead
+    #read by the calendar date of each day from startDate (a datetime.date,
+    #see SolarData.hourlyStartDate), which it requires; leap days repeat
+    #Feb 28.
+    profile = loadProfile(db,loadTypeId)
+    if len(profile) != hoursPerYear:
+        startDate = None #Profiles that do not follow the calendar share one series
+    elif startDate is None:
+        raise ValueError('The yearly load profile {0} needs the start date of the series'.format(loadTypeId))
+    key = (loadTypeId,nHours,startDate)
+    if key not in _series:
+        if startDate is None:
+            series = np.tile(profile,-(-nHours//len(profile)))[:nHours]
+        else:
+            dayOfYear = _dayOfYear(startDate,-(-nHours//24))
+            series = profile.reshape(-1,24)[dayOfYear].ravel()[:nHours]
+        series = np.ascontiguousarray(series)
+        series.flags.writeable = False
+        _series[key] = series
+    return _series[key]
+
+def saveProfile(db,loadTypeId,profile):
+    #Normalises and saves a custom profile. Frontiers are stored by
+    #loadTypeId, so changing a saved profile does not update frontiers that
+    #were calculated with the old one; save it under a new id instead.
+    if loadTypeId in builtinProfiles:
+        raise ValueError('Cannot replace the built-in load type: {0}'.format(loadTypeId))
+    profile = normaliseProfile(profile)
+    db.saveLoadProfile(profile,loadTypeId)
+    clearCache(loadTypeId)
+    return profile
+
+def clearCache(loadTypeId=None):
+    for cache in (_profiles,_series):
+        for key in [k for k in cache if loadTypeId is None or k == loadTypeId or
+            (isinstance(k,tuple) and k[0] == loadTypeId)]:
+            del cache[key]
@@ -1,68 +1,219 @@
 from collections import deque
-import itertools
+import concurrent.futures
+import contextlib
 import math
+import os
+import socket
 import numpy as np
-import numpy.matlib
 from numpy import mean
-from scipy.optimize import fsolve
+from scipy.optimize import brentq
 
+import LoadData
 import SolarData
 
+try:
+    import numba
+except ImportError: #numba is optional and only needed for backend='numba'
+    numba = None
+
+defaultChunkSize = 2**16 #Periods per chunk in iterChunks
+defaultMaxDer = -0.05 #Bounds of dSolCap/dStorCap for stopping.  The stopping criterion is to be negative and close to zero
+defaultMinDer = -2 #Lower bound for stopping.  Based on an upper bound of storage prices ($/kWh) being twice solar prices ($/kW).
+minFrontierPoints = 10
+defaultLeaseSeconds = 3600 #Longer than any one frontier takes, or it is calculated twice
+defaultIdleWait = 10 #Seconds a worker waits before looking for work again
+
 #For debuggin and profiling
 import time
 
+class Instrumentation:
+    #Collects counters and per-phase timers from the frontier engines, and
+    #passes events to an optional callback, called as callback(name,fields),
+    #and/or a logging.Logger at debug level. Engines take it through their
+    #instrumentation argument and skip all of this when it is None.
+    #Counters:
+    #   simulations: linear passes over the series (dispatch simulations or
+    #       storage sizing passes)
+    #   solves: root finding or storage sizing calls
+    #   repairs: repair rounds of calculateReliabilityFrontier
+    #   points: points in the returned frontiers
+    #   screenSimulations: simulations on aggregated blocks (screenHours)
+    #Timers (seconds): startPoint, forwardSweep, backwardSweep, repair and
+    #refine, and total for whole tasks in loadHourlyReliabilityFrontiers
+    #Events: phase (phase, seconds), repair (reliability, reason, points),
+    #frontier (reliability, points, and repairs for calculateReliabilityFrontier),
+    #extend (reliability, points) and screening (reliability, points, maxError)
+
+    def __init__(self,callback=None,logger=None):
+        self.callback = callback
+        self.logger = logger
+        self.counters = {}
+        self.timers = {}
+
+    def count(self,name,n=1):
+        self.counters[name] = self.counters.get(name,0)+n
+
+    @contextlib.contextmanager
+    def timer(self,name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter()-start
+            self.timers[name] = self.timers.get(name,0)+elapsed
+            self.event('phase',phase=name,seconds=elapsed)
+
+    def event(self,name,**fields):
+        if self.callback is not None:
+            self.callback(name,fields)
+        if self.logger is not None:
+            self.logger.debug('%s %s',name,fields)
+
+    def summary(self):
+        return {'counters': dict(self.counters),'timers': dict(self.timers)}
+
+    def merge(self,summary):
+        #Adds the counters and timers of another instance's summary()
+        for k,v in summary['counters'].items():
+            self.count(k,v)
+        for k,v in summary['timers'].items():
+            self.timers[k] = self.timers.get(k,0)+v
+
+def _timer(instrumentation,name):
+    return instrumentation.timer(name) if instrumentation is not None else contextlib.nullcontext()
+
 def calculateReliabilityFrontier(reliability,insolation,load,
-    stepSizeConst = 0.01,maxTolConst = 100, recursDepth = 0):
+    stepSizeConst = 0.01,maxTolConst = 100, maxRepairs = 10, backend = 'python',
+    full_output = False, instrumentation = None, screenHours = None,
+    minDer = defaultMinDer, maxDer = defaultMaxDer):
+    #Traces the iso-reliability curve of solar capacity against storage
+    #capacity where minDer <= dSolCap/dStorCap <= maxDer. Returns solCap,
+    #storCap and solCapD (dSolCap/dStorCap). With full_output, also returns a
+    #dict with the number of simulations each returned point cost
+    #('simulations') and the total number of simulations including the start
+    #point search and any repairs ('totalSimulations').
+    #instrumentation is an optional Instrumentation.
+    #A curve that comes out non-convex or with fewer than minFrontierPoints
+    #points is repaired in place by _repairFrontier, in up to maxRepairs
+    #rounds, rather than traced again.
+    #With screenHours, the curve is traced with simulateReliabilityAggregated
+    #on blocks of screenHours periods, and only the returned points are then
+    #solved again with the hourly simulation, starting from the screened
+    #solar capacity. solCapD is recalculated from the refined points.
+    #'simulations' and 'totalSimulations' then count hourly simulations only;
+    #full_output adds the number of screening simulations
+    #('screenSimulations') and the difference between the refined and
+    #screened solar capacity of each point ('screenErrors').
 
-    tolX = min(stepSizeConst,(1-reliability))/maxTolConst;
+    tolX = max(min(stepSizeConst,(1-reliability))/maxTolConst,1e-12); #brentq needs a positive tolerance, including for reliability = 1
+    totalSimulations = 0
+    screenSimulations = 0
 
-    startSolar = 2*mean(load)/mean(insolation); #pick a starting point. Mostly arbitrary as we do a forward and backward sweep from this point
+    if screenHours is None:
+        simulate = lambda solCap,storCap: simulateReliability(insolation,load,solCap,storCap,backend)
+    else:
+        simulate = lambda solCap,storCap: simulateReliabilityAggregated(insolation,load,solCap,storCap,
+            screenHours,backend)
 
-    try:
-        f = lambda storCap: reliability - simulateReliability(insolation,load,startSolar,storCap)
-        #s = time.time()
-        startStorage = fsolve(f,0,xtol=tolX)
-        #e = time.time()
-        #print('fsolve took {0} seconds'.format(e-s))
-        if (startStorage <= 0): #Storage has to be at least >= 0 physically. Also has to be >0 if reliability requires power at night
-            startStorage = 0.001
-            f = lambda solCap: reliability - simulateReliability(insolation,load,solCap,startStorage)
-            startSolar = fsolve(f,startSolar,xtol=tolX)
-    except:
-        raise Exception('Could not calculate start storage')
+    def solve(f,x0,xtol=tolX,step=None):
+        nonlocal totalSimulations,screenSimulations
+        x,nSim = solveMonotone(f,x0,xtol,step=step)
+        if screenHours is None:
+            totalSimulations += nSim
+        else:
+            screenSimulations += nSim
+        if instrumentation is not None:
+            instrumentation.count('solves')
+            instrumentation.count('simulations' if screenHours is None else 'screenSimulations',nSim)
+        return x,nSim
+
+    startSolar = 2*mean(load)/mean(insolation); #pick a starting point. Mostly arbitrary as we do a forward and backward sweep from this point
 
-    maxDer = -0.05 #Bounds of dSolCap/dStorCap for stopping.  The stopping criterion is to be negative and close to zero
-    minDer = -2 #Lower bound for stopping.  Based on an upper bound of storage prices ($/kWh) being twice solar prices ($/kW).
+    with _timer(instrumentation,'startPoint'):
+        try:
+            f = lambda storCap: simulate(startSolar,storCap) - reliability
+            startStorage,_ = solve(f,0)
+            if (startStorage <= 0): #Storage has to be at least >= 0 physically. Also has to be >0 if reliability requires power at night
+                startStorage = 0.001
+                f = lambda solCap: simulate(solCap,startStorage) - reliability
+                startSolar,_ = solve(f,startSolar)
+        except:
+            raise Exception('Could not calculate start storage')
 
-    f = lambda storCap: reliability - simulateReliability(insolation,load,100*mean(load)/mean(insolation),storCap)
-    minStorage = max(0,fsolve(f,0))
+        f = lambda storCap: simulate(100*mean(load)/mean(insolation),storCap) - reliability
+        minStorage,_ = solve(f,0)
     r = stepSizeConst/startStorage #Step size for storage capacity iteration so that the step size is 0.01 around startStorage, storCap(i) = storCap(i-1)*(1+r) in forward sweep and storCap(i) = storCap(i-1)*(1-r) in backward sweep
 
-    i = 0;
     storCap = deque([startStorage])
     solCap = deque([startSolar])
     solCapD = deque([maxDer])
+    simCount = deque([0])
     #Do forward sweep until reaching the max derivative.  We start somewhere in
     #the middle so as not to bother calculating values for solar capacity close
     #to the minStorage level (which will likely be cost prohibitive).
-    while solCapD[i] <= maxDer:
-        deltaStor = r*storCap[i];
-        i = i+1;
-        storCap.append(storCap[i-1]+deltaStor)
-        f = lambda solCap: reliability - simulateReliability(insolation,load,solCap,storCap[i])
-        solCapVal,_,exitFlag,mesg = fsolve(f,solCap[i-1]+deltaStor*solCapD[i-1],xtol=tolX,full_output=True) #use taylor estimate for guess of x0
-        solCap.append(solCapVal)
-        if exitFlag != 1:
-            raise Exception('fsolve did not converge. Exit flag was {0}.'+
-                ' Message: {1}'.format(exitFlag,mesg))
-        solCapD.append((solCap[i]-solCap[i-1])/deltaStor)
+    with _timer(instrumentation,'forwardSweep'):
+        _sweepForward(solve,simulate,reliability,solCap,storCap,solCapD,simCount,r,maxDer)
 
     #Trim the first element where derivative was not defined
-    solCap = deque(itertools.islice(solCap,1,len(solCap)))
-    solCapD = deque(itertools.islice(solCapD,1,len(solCapD)))
-    storCap = deque(itertools.islice(storCap,1,len(storCap)))
+    solCap.popleft()
+    storCap.popleft()
+    solCapD.popleft()
+    simCount.popleft()
+    nForward = len(solCap)
 
     #Do backward sweep until reaching the min derivative or min storage
+    with _timer(instrumentation,'backwardSweep'):
+        _sweepBackward(solve,simulate,reliability,solCap,storCap,solCapD,simCount,r,minDer,minStorage)
+
+    #Backward sweep points take the derivative of the segment after them,
+    #forward sweep points of the segment before them
+    left = [False]*(len(solCap)-nForward)+[True]*nForward
+    with _timer(instrumentation,'repair'):
+        solCap,storCap,solCapD,simCount,repairs = _repairFrontier(solve,simulate,reliability,
+            list(solCap),list(storCap),list(solCapD),list(simCount),left,tolX,minDer,maxDer,
+            maxRepairs,instrumentation)
+
+    if np.any(np.array(solCapD) > 0):
+        raise Exception('Calculated dSol/dStor > 0')
+    if instrumentation is not None:
+        instrumentation.count('points',len(solCap))
+        instrumentation.event('frontier',reliability=reliability,points=len(solCap),repairs=repairs)
+
+    screenErrors = None
+    if screenHours is not None:
+        with _timer(instrumentation,'refine'):
+            solCap,solCapD,refineCount,screenErrors = _refineScreenedFrontier(reliability,insolation,load,
+                solCap,storCap,solCapD,tolX,backend,instrumentation)
+        totalSimulations += sum(refineCount)
+        simCount = refineCount
+
+    info = {'simulations': simCount,'totalSimulations': totalSimulations}
+    if screenHours is not None:
+        info['screenSimulations'] = screenSimulations
+        info['screenErrors'] = screenErrors
+
+    if full_output:
+        return solCap,storCap,solCapD,info
+    return solCap,storCap,solCapD
+
+def _sweepForward(solve,simulate,reliability,solCap,storCap,solCapD,simCount,r,maxDer):
+    #Appends points to the deques with storage growing by a factor of 1+r
+    #until dSolCap/dStorCap is above maxDer
+    while solCapD[-1] <= maxDer:
+        deltaStor = r*storCap[-1]
+        storCap.append(storCap[-1]+deltaStor)
+        f = lambda solCap: simulate(solCap,storCap[-1]) - reliability
+        try:
+            solCapVal,nSim = solve(f,solCap[-1]+deltaStor*solCapD[-1]) #use taylor estimate for guess of x0
+        except Exception as e:
+            raise Exception('Could not solve for solar capacity at storage {0}: {1}'.format(storCap[-1],e))
+        solCap.append(solCapVal)
+        simCount.append(nSim)
+        solCapD.append((solCap[-1]-solCap[-2])/deltaStor)
+
+def _sweepBackward(solve,simulate,reliability,solCap,storCap,solCapD,simCount,r,minDer,minStorage):
+    #Prepends points to the deques with storage shrinking by a factor of 1-r
+    #until dSolCap/dStorCap is below minDer or storage reaches minStorage
     while solCapD[0] >= minDer and storCap[0] > minStorage:
         if storCap[0]-minStorage > 0.001:
             storCap.appendleft(max(storCap[0]*(1-r),minStorage)) #Going backwards, so add new point to front of array
@@ -70,130 +221,1436 @@ def calculateReliabilityFrontier(reliability,insolation,load,
             storCap.appendleft(minStorage)
 
         deltaStor = storCap[1]-storCap[0]
-        f = lambda solCap: reliability - simulateReliability(insolation,load,solCap,storCap[0])
-        solCapVal,_,exitFlag,mesg = fsolve(f,solCap[0]-deltaStor*solCapD[0],xtol=tolX,full_output=True)
-        if exitFlag !=1:
-            raise Exception('Fzero did not converge. Exit flag was ' + str(exitFlag))
+        f = lambda solCap: simulate(solCap,storCap[0]) - reliability
+        try:
+            solCapVal,nSim = solve(f,solCap[0]-deltaStor*solCapD[0])
+        except Exception as e:
+            raise Exception('Could not solve for solar capacity at storage {0}: {1}'.format(storCap[0],e))
 
         solCap.appendleft(solCapVal)
+        simCount.appendleft(nSim)
         solCapD.appendleft((solCap[1]-solCap[0])/deltaStor)
 
-    #Only return elements within the derivative range (filters out cases where
-    #the forward sweep started with a very negative derivative, or backward
-    #sweep started with a very flat derivative.
-    #Also transpose into column vectors
-    solCap = np.array(solCap) #Convert to np array for logical indexing
-    storCap = np.array(storCap)
-    solCapD = np.array(solCapD)
-    t = np.logical_and(solCapD >= minDer, solCapD <= maxDer)
-    solCap =  solCap[t]
-    storCap = storCap[t]
-    solCapD = solCapD[t]
-
-    if np.any(solCapD > 0):
-        raise Exception('Calculated dSol/dStor > 0')
-    solCapD2 = np.diff(solCapD)
-    solCap = solCap.tolist()
-    storCap = storCap.tolist()
-    solCapD = solCapD.tolist()
-    print('solCap')
-    print(solCap)
-    print('solCapD')
-    print(solCapD)
-    print('storCap')
-    print(storCap)
-    print(np.logical_and(np.divide(solCapD2,np.diff(storCap)) < -0.1, solCapD2 < -0.05))
-    print(np.divide(solCapD2,np.diff(storCap)))
-    print('---------------------------------')
-    if any(np.logical_and(np.divide(solCapD2,np.diff(storCap)) < -0.1, solCapD2 < -0.05)):
-        if recursDepth < 10:
-            maxTolConst = maxTolConst*10
-            solCap,storCap,solCapD = calculateReliabilityFrontier(reliability,insolation,load,stepSizeConst,maxTolConst,recursDepth+1); #Recurse with a tighter tolerance to smooth numerical oscillations
-        else:
-            raise Exception('Calculated d^2Sol/dStor^2 < 0; i.e. significantly non-convex and recurse limit of 10 exceeded')
+def _repairFrontier(solve,simulate,reliability,solCap,storCap,solCapD,simCount,left,tolX,minDer,maxDer,
+    maxRepairs,instrumentation):
+    #Fixes a swept frontier locally instead of tracing it again. Where the
+    #derivative drops sharply (non-convexity from root finding noise), the
+    #points around the drop are solved again with a tolerance 10 times tighter
+    #each round. If fewer than minFrontierPoints points are in the derivative
+    #range, a point is added midway along each segment that touches the
+    #range, and the tolerance of those segments is halved with their length
+    #so that their slopes stay as accurate. The lists hold every swept point;
+    #left[i] is True where solCapD[i] is the slope of the segment before point
+    #i rather than after it. Returns the points in the derivative range, their
+    #simulation counts and the number of repair rounds.
+
+    pointTol = [tolX]*len(solCap)
+    def resolve(i,tol):
+        #The current solution is within pointTol[i] of the root
+        f = lambda x: simulate(x,storCap[i]) - reliability
+        solCap[i],nSim = solve(f,solCap[i],tol,pointTol[i])
+        simCount[i] += nSim
+        pointTol[i] = tol
 
-    if len(solCap) < 10:
-        if recursDepth < 10:
-            solCap,storCap,solCapD = calculateReliabilityFrontier(reliability,insolation,load,stepSizeConst/2,maxTolConst,recursDepth+1);
+    for repairs in range(maxRepairs+1):
+        t = np.flatnonzero(np.logical_and(np.array(solCapD) >= minDer,np.array(solCapD) <= maxDer))
+        D = np.array(solCapD)[t]
+        solCapD2 = np.diff(D)
+        bad = np.flatnonzero(np.logical_and(np.divide(solCapD2,np.diff(np.array(storCap)[t])) < -0.1,
+            solCapD2 < -0.05))
+        if len(bad) > 0:
+            reason = 'nonConvex'
+            if repairs == maxRepairs:
+                raise Exception('Calculated d^2Sol/dStor^2 < 0; i.e. significantly non-convex and repair limit of {0} exceeded'.format(maxRepairs))
+            #Points whose solutions set the two derivatives either side of each drop
+            points = sorted(set(i+k for j in bad for i in (t[j],t[j+1]) for k in (-1,0,1)
+                if 0 <= i+k < len(solCap)))
+            for i in points:
+                resolve(i,pointTol[i]/10)
+        elif len(t) < minFrontierPoints:
+            reason = 'tooFewPoints'
+            if repairs == maxRepairs:
+                raise Exception('Too few (less than {0}) points returned in frontier and repair limit of {1} exceeded'.format(
+                    minFrontierPoints,maxRepairs))
+            inRange = lambda d: minDer <= d <= maxDer
+            segments = [i for i in range(len(solCap)-1) if inRange(solCapD[i]) or inRange(solCapD[i+1]) or
+                (solCapD[i] < minDer and solCapD[i+1] > maxDer)]
+            if len(segments) < 1:
+                raise Exception('Too few (less than {0}) points returned in frontier and no segment to refine'.format(
+                    minFrontierPoints))
+            points = []
+            for i in reversed(segments):
+                tol = min(pointTol[i],pointTol[i+1])/2
+                for j in (i,i+1):
+                    if pointTol[j] > tol:
+                        resolve(j,tol)
+                midStor = (storCap[i]+storCap[i+1])/2
+                f = lambda x: simulate(x,midStor) - reliability
+                midSol,nSim = solve(f,(solCap[i]+solCap[i+1])/2,tol)
+                solCap.insert(i+1,midSol)
+                storCap.insert(i+1,midStor)
+                solCapD.insert(i+1,solCapD[i+1])
+                simCount.insert(i+1,nSim)
+                left.insert(i+1,left[i+1])
+                pointTol.insert(i+1,tol)
+                points.append(i+1)
         else:
-            raise Exception('Too few (less than 10) points returned in frontier and recurse limit of 10 exceeded');
+            break
+
+        if instrumentation is not None:
+            instrumentation.count('repairs')
+            instrumentation.event('repair',reliability=reliability,reason=reason,points=len(points))
+        #Derivatives from the updated neighbours. The first forward sweep
+        #point keeps its slope to the trimmed start point.
+        for i in range(len(solCap)):
+            j = i-1 if left[i] else i+1
+            if 0 <= j < len(solCap):
+                solCapD[i] = (solCap[max(i,j)]-solCap[min(i,j)])/(storCap[max(i,j)]-storCap[min(i,j)])
+
+    return ([solCap[i] for i in t],[storCap[i] for i in t],[solCapD[i] for i in t],
+        [simCount[i] for i in t],repairs)
+
+def extendReliabilityFrontier(frontier,reliability,insolation,load,minDer=defaultMinDer,
+    maxDer=defaultMaxDer,stepSizeConst=0.01,maxTolConst=100,backend='python',full_output=False,
+    instrumentation=None):
+    #Extends a frontier, as stored (a dict of solCap, storCap and solCapD
+    #lists, and the minDer and maxDer it was calculated for, which default to
+    #defaultMinDer and defaultMaxDer), to cover minDer <= dSolCap/dStorCap <=
+    #maxDer. The sweeps of
+    #calculateReliabilityFrontier are continued from its ends with its own
+    #storage step; the existing points are kept as they are. Returns the
+    #merged frontier as a new dict. With full_output, also returns the total
+    #number of simulations.
+
+    solCap = deque(frontier['solCap'])
+    storCap = deque(frontier['storCap'])
+    solCapD = deque(frontier['solCapD'])
+    simCount = deque([0]*len(solCap))
+    oldMinDer = frontier.get('minDer',defaultMinDer)
+    oldMaxDer = frontier.get('maxDer',defaultMaxDer)
+    if len(solCap) < 1:
+        raise ValueError('Cannot extend a frontier with no points')
+
+    tolX = max(min(stepSizeConst,(1-reliability))/maxTolConst,1e-12);
+    totalSimulations = 0
+    simulate = lambda solCap,storCap: simulateReliability(insolation,load,solCap,storCap,backend)
+    def solve(f,x0):
+        nonlocal totalSimulations
+        x,nSim = solveMonotone(f,x0,tolX)
+        totalSimulations += nSim
+        if instrumentation is not None:
+            instrumentation.count('solves')
+            instrumentation.count('simulations',nSim)
+        return x,nSim
+
+    nOld = len(solCap)
+    nBefore = 0
+    if maxDer > oldMaxDer:
+        r = storCap[-1]/storCap[-2]-1 if nOld > 1 else stepSizeConst/storCap[-1]
+        with _timer(instrumentation,'forwardSweep'):
+            _sweepForward(solve,simulate,reliability,solCap,storCap,solCapD,simCount,r,maxDer)
+    if minDer < oldMinDer:
+        r = 1-storCap[0]/storCap[1] if nOld > 1 else stepSizeConst/storCap[0]
+        with _timer(instrumentation,'backwardSweep'):
+            f = lambda storCap: simulate(100*mean(load)/mean(insolation),storCap) - reliability
+            minStorage,_ = solve(f,0)
+            n = len(solCap)
+            _sweepBackward(solve,simulate,reliability,solCap,storCap,solCapD,simCount,r,minDer,minStorage)
+            nBefore = len(solCap)-n
+
+    #Keep the old points and the new ones within the derivative range
+    D = np.array(solCapD)
+    t = np.logical_and(D >= minDer,D <= maxDer)
+    t[nBefore:nBefore+nOld] = True
+    toRtn = {
+        'solCap': np.array(solCap)[t].tolist(),
+        'storCap': np.array(storCap)[t].tolist(),
+        'solCapD': D[t].tolist(),
+        'minDer': min(minDer,oldMinDer),
+        'maxDer': max(maxDer,oldMaxDer)
+    }
+    if instrumentation is not None:
+        instrumentation.count('points',len(toRtn['solCap'])-nOld)
+        instrumentation.event('extend',reliability=reliability,points=len(toRtn['solCap'])-nOld)
+
+    if full_output:
+        return toRtn,{'totalSimulations': totalSimulations}
+    return toRtn
+
+def _refineScreenedFrontier(reliability,insolation,load,solCap,storCap,solCapD,tolX,backend,instrumentation):
+    #Solves each screened point again with the hourly simulation at the same
+    #storage. The first bracketing step is twice the largest correction so
+    #far, so that once the screening error is known most points are
+    #bracketed by their first two simulations. Returns the refined solCap and
+    #solCapD, the simulations per point and the corrections.
+    refined = []
+    simCount = []
+    errors = []
+    for (x0,storCap0) in zip(solCap,storCap):
+        f = lambda x: simulateReliability(insolation,load,x,storCap0,backend) - reliability
+        step = 2*max(map(abs,errors)) if len(errors) > 0 else None
+        x,nSim = solveMonotone(f,x0,tolX,step=step)
+        refined.append(x)
+        simCount.append(nSim)
+        errors.append(x-x0)
+    if instrumentation is not None:
+        instrumentation.count('solves',len(refined))
+        instrumentation.count('simulations',sum(simCount))
+        instrumentation.event('screening',reliability=reliability,points=len(refined),
+            maxError=max(map(abs,errors),default=0))
+
+    #Backward differences as in the sweeps. The first point's neighbour was
+    #filtered out, so it keeps its screened derivative.
+    solCapD = solCapD[:1]+[(refined[i]-refined[i-1])/(storCap[i]-storCap[i-1]) for i in range(1,len(refined))]
+    return refined,solCapD,simCount,errors
+
+def calculateReliabilityFrontierScreened(reliability,insolation,load,screenHours=3,**kwargs):
+    #calculateReliabilityFrontier traced on screenHours blocks and refined
+    #hourly; see its screenHours argument
+    return calculateReliabilityFrontier(reliability,insolation,load,screenHours=screenHours,**kwargs)
+
+def solveMonotone(f,x0,xtol,lowerBound=0,maxExpansions=100,step=None):
+    #Finds a root of f, which must be nondecreasing in x (e.g. reliability
+    #minus target as a function of solar or storage capacity). The root is
+    #bracketed by stepping away from the guess x0 with doubling steps, the
+    #first of which is step (default 1% of x0), then refined with Brent's
+    #method. If f(lowerBound) >= 0 then lowerBound is returned. Returns the
+    #root and the number of distinct evaluations of f.
+
+    values = {}
+    def g(x):
+        x = float(x)
+        if x not in values:
+            values[x] = _asScalar(f(x))
+        return values[x]
+
+    x0 = max(_asScalar(x0),lowerBound)
+    step = max(xtol,0.01*abs(x0) if step is None else step)
+    if g(x0) < 0:
+        lo = x0
+        hi = x0+step
+        n = 0
+        while g(hi) < 0:
+            n = n+1
+            if n > maxExpansions:
+                raise Exception('Could not bracket root above x={0}'.format(x0))
+            lo = hi
+            step = 2*step
+            hi = hi+step
+    else:
+        hi = x0
+        while True:
+            if hi <= lowerBound:
+                return lowerBound,len(values)
+            lo = max(lowerBound,hi-step)
+            if g(lo) < 0:
+                break
+            hi = lo
+            step = 2*step
 
+    if g(hi) == 0:
+        return hi,len(values)
+    x = brentq(g,lo,hi,xtol=xtol)
+    return x,len(values)
+
+def calculateReliabilityFrontierAnalytic(reliability,insolation,load,
+    stepSizeConst = 0.01, maxRepairs = 20, backend = 'python', full_output = False, instrumentation = None,
+    minDer = defaultMinDer, maxDer = defaultMaxDer):
+    #Alternative to calculateReliabilityFrontier that sweeps solar capacity and
+    #sizes the storage for each point directly with calculateMinimumStorage,
+    #rather than root finding on full simulations. Returns the same solCap,
+    #storCap and solCapD (dSolCap/dStorCap) lists, ordered by increasing
+    #storage. With full_output, also returns a dict with the number of linear
+    #passes over the series each returned point cost ('simulations') and in
+    #total ('totalSimulations'). instrumentation is an optional Instrumentation.
+    #Where the sweeps step over the bend of the curve, leaving fewer than
+    #minFrontierPoints points in the derivative range, segments are bisected
+    #in solar capacity in up to maxRepairs rounds (see _densifyFrontier).
+
+    maxPoints = 10000 #Guard against sweeps that never reach a stopping bound
+    totalSimulations = 0
+
+    def minimumStorage(solCap):
+        nonlocal totalSimulations
+        storCap,nPass = calculateMinimumStorage(reliability,insolation,load,solCap,backend)
+        totalSimulations += nPass
+        if instrumentation is not None:
+            instrumentation.count('solves')
+            instrumentation.count('simulations',nPass)
+        return storCap,nPass
+
+    #Start from the same point as calculateReliabilityFrontier, raising solar
+    #capacity if the target cannot be met with any amount of storage.
+    with _timer(instrumentation,'startPoint'):
+        startSolar = 2*mean(load)/mean(insolation)
+        startStorage,_ = minimumStorage(startSolar)
+        n = 0
+        while math.isinf(startStorage):
+            n = n+1
+            if n > 20:
+                raise Exception('Could not calculate start storage')
+            startSolar = 2*startSolar
+            startStorage,_ = minimumStorage(startSolar)
+        if startStorage <= 0: #Same floor as calculateReliabilityFrontier so the step size is defined
+            startStorage = 0.001
+            f = lambda solCap: simulateReliability(insolation,load,solCap,startStorage,backend) - reliability
+            startSolar,nSim = solveMonotone(f,startSolar,stepSizeConst/100)
+            totalSimulations += nSim
+            if instrumentation is not None:
+                instrumentation.count('solves')
+                instrumentation.count('simulations',nSim)
+
+        minStorage,_ = minimumStorage(100*mean(load)/mean(insolation))
+    r = stepSizeConst/startStorage #Aim for storage steps of the same geometric size as calculateReliabilityFrontier
+
+    #Forward sweep: lower solar capacity, so storage increases and the
+    #derivative flattens towards maxDer. The solar step is the Taylor estimate
+    #for a storage step of r*storCap, with the derivative clipped to the
+    #stopping range so the step stays finite.
+    storCap = deque([startStorage])
+    solCap = deque([startSolar])
+    solCapD = deque([maxDer])
+    passCount = deque([0])
+    with _timer(instrumentation,'forwardSweep'):
+        while solCapD[-1] <= maxDer and len(solCap) < maxPoints:
+            deltaSol = min(max(solCapD[-1],minDer),maxDer)*r*storCap[-1]
+            nextSol = solCap[-1]+deltaSol
+            nextStor,nPass = minimumStorage(nextSol)
+            if math.isinf(nextStor): #Solar too small to reach the target with any storage
+                break
+            solCap.append(nextSol)
+            storCap.append(nextStor)
+            passCount.append(nPass)
+            if nextStor > storCap[-2]:
+                solCapD.append(deltaSol/(nextStor-storCap[-2]))
+            else:
+                solCapD.append(-math.inf)
+
+    #Trim the start point where the derivative was not defined
+    solCap.popleft()
+    storCap.popleft()
+    solCapD.popleft()
+    passCount.popleft()
+    if len(solCap) < 1:
+        raise Exception('Forward sweep returned no points')
+    nForward = len(solCap)
+
+    #Backward sweep: raise solar capacity until reaching the min derivative
+    #or min storage. The derivative at the front is defined against the point
+    #after it, as in calculateReliabilityFrontier.
+    with _timer(instrumentation,'backwardSweep'):
+        while solCapD[0] >= minDer and storCap[0] > minStorage and len(solCap) < maxPoints:
+            deltaSol = -min(max(solCapD[0],minDer),maxDer)*r*storCap[0]
+            nextSol = solCap[0]+deltaSol
+            nextStor,nPass = minimumStorage(nextSol)
+            if nextStor >= storCap[0]: #Storage no longer decreases; dSol/dStor is unbounded
+                break
+            solCap.appendleft(nextSol)
+            storCap.appendleft(nextStor)
+            passCount.appendleft(nPass)
+            solCapD.appendleft((solCap[1]-solCap[0])/(storCap[1]-storCap[0]))
+
+    #Only return elements within the derivative range, adding points until
+    #there are at least minFrontierPoints of them. Backward sweep points take
+    #the derivative of the segment after them, forward sweep points of the
+    #segment before them.
+    left = [False]*(len(solCap)-nForward)+[True]*nForward
+    with _timer(instrumentation,'repair'):
+        solCap,storCap,solCapD,passCount = _densifyFrontier(minimumStorage,reliability,list(solCap),
+            list(storCap),list(solCapD),list(passCount),left,minDer,maxDer,maxRepairs,instrumentation)
+    if instrumentation is not None:
+        instrumentation.count('points',len(solCap))
+        instrumentation.event('frontier',reliability=reliability,points=len(solCap))
+
+    if full_output:
+        return solCap,storCap,solCapD,{'simulations': passCount,'totalSimulations': totalSimulations}
     return solCap,storCap,solCapD
 
-def loadHourlyReliabilityFrontiers(db,latLonArray,reliabilities,loadTypeId='constant'):
+def _densifyFrontier(size,reliability,solCap,storCap,solCapD,passCount,left,minDer,maxDer,
+    maxRounds,instrumentation):
+    #Adds points to a frontier swept in solar capacity until at least
+    #minFrontierPoints of them are in the derivative range. Each round
+    #bisects, in solar capacity, every segment that touches the range or
+    #steps over it, and sizes the storage of the new points exactly with
+    #size(solCap), which returns the storage and the passes it took. The lists
+    #hold every swept point ordered by increasing storage; left[i] is True
+    #where solCapD[i] is the slope of the segment before point i rather than
+    #after it. Returns the points in the derivative range and their pass
+    #counts.
+
+    inRange = lambda d: minDer <= d <= maxDer
+    for rounds in range(maxRounds+1):
+        t = [i for i in range(len(solCap)) if inRange(solCapD[i])]
+        if len(t) >= minFrontierPoints:
+            break
+        if rounds == maxRounds:
+            raise Exception('Too few (less than {0}) points returned in frontier and repair limit of {1} exceeded'.format(
+                minFrontierPoints,maxRounds))
+        segments = [i for i in range(len(solCap)-1) if inRange(solCapD[i]) or inRange(solCapD[i+1]) or
+            (solCapD[i] < minDer and solCapD[i+1] > maxDer)]
+        if len(segments) < 1:
+            raise Exception('Too few (less than {0}) points returned in frontier and no segment to refine'.format(
+                minFrontierPoints))
+        for i in reversed(segments):
+            midSol = (solCap[i]+solCap[i+1])/2
+            midStor,nPass = size(midSol)
+            solCap.insert(i+1,midSol)
+            storCap.insert(i+1,midStor)
+            solCapD.insert(i+1,solCapD[i+1])
+            passCount.insert(i+1,nPass)
+            left.insert(i+1,left[i+1])
+        if instrumentation is not None:
+            instrumentation.count('repairs')
+            instrumentation.event('repair',reliability=reliability,reason='tooFewPoints',points=len(segments))
+        #Derivatives from the updated neighbours; storage that does not
+        #increase gives an unbounded slope as in the sweeps
+        for i in range(len(solCap)):
+            j = i-1 if left[i] else i+1
+            if 0 <= j < len(solCap):
+                a,b = min(i,j),max(i,j)
+                solCapD[i] = (solCap[b]-solCap[a])/(storCap[b]-storCap[a]) if storCap[b] > storCap[a] else -math.inf
+
+    return ([solCap[i] for i in t],[storCap[i] for i in t],[solCapD[i] for i in t],
+        [passCount[i] for i in t])
+
+def calculateReliabilityFrontiers(reliabilities,insolation,load,
+    stepSizeConst = 0.01, maxRepairs = 20, backend = 'python', full_output = False, instrumentation = None,
+    minDer = defaultMinDer, maxDer = defaultMaxDer):
+    #Traces the frontiers of several reliabilities together. Like
+    #calculateReliabilityFrontierAnalytic it sweeps solar capacity and sizes
+    #storage exactly, but each solar capacity costs a single pass over the
+    #series (calculateDeficitStructure) whatever the number of reliabilities,
+    #and that pass gives the required storage of every curve. The curves
+    #share one solar grid, stepped by whichever active curve needs the
+    #smallest step. Stopping rules and filtering are those of
+    #calculateReliabilityFrontier. backend selects the pass from
+    #structureBackends. Curves left with fewer than minFrontierPoints points
+    #in the derivative range are densified on their own with _densifyFrontier,
+    #one pass per added point, in up to maxRepairs rounds.
+    #Returns a dict of (solCap, storCap, solCapD) keyed by reliability. With
+    #full_output, also returns a dict with the number of passes over the
+    #series shared by all reliabilities ('totalSimulations'). instrumentation
+    #is an optional Instrumentation; each pass counts as one simulation and
+    #sizing the storage of every curve as one solve.
+
+    targets = sorted(set(reliabilities))
+    K = len(targets)
+    maxPoints = 10000 #Guard against sweeps that never reach a stopping bound
+    totalLoad = len(insolation)*mean(load)
+    targetUnmet = [(1-r)*totalLoad for r in targets]
+    insolation = _asFlatArray(insolation)
+    load = _asFlatArray(load)
+    nPasses = 0
+
+    def minimumStorage(solCap,idx):
+        nonlocal nPasses
+        nPasses += 1
+        if instrumentation is not None:
+            instrumentation.count('simulations')
+            instrumentation.count('solves')
+        structure = calculateDeficitStructure(solCap*insolation-load,backend)
+        return {k: minimumStorageFromStructure(structure,targetUnmet[k],totalLoad) for k in idx}
+
+    with _timer(instrumentation,'startPoint'):
+        startSolar = 2*mean(load)/mean(insolation)
+        startStorage = minimumStorage(startSolar,range(K))
+        minStorage = minimumStorage(100*mean(load)/mean(insolation),range(K))
+    #Storage steps of r*storCap for each curve, as in calculateReliabilityFrontier,
+    #with the same floor on the start storage so the step size is defined
+    r = [stepSizeConst/max(startStorage[k],0.001) for k in range(K)]
+
+    def solarStep(k,point):
+        #Solar step that moves curve k by about r*storCap along storage
+        _,storCap,solCapD = point
+        return -min(max(solCapD,minDer),maxDer)*r[k]*max(storCap,0.001)
+
+    #Forward sweep: lower solar capacity until every curve reaches the max derivative
+    points = [deque() for k in range(K)]
+    last = {k: (startSolar,startStorage[k],maxDer) for k in range(K)}
+    active = [k for k in range(K)]
+    solCap = startSolar
+    with _timer(instrumentation,'forwardSweep'):
+        while len(active) > 0 and len(points[active[0]]) < maxPoints:
+            solCap = solCap-min(solarStep(k,last[k]) for k in active)
+            if solCap <= 0:
+                break
+            storCap = minimumStorage(solCap,active)
+            for k in active:
+                prevSol,prevStor,_ = last[k]
+                if storCap[k] > prevStor:
+                    last[k] = (solCap,storCap[k],(solCap-prevSol)/(storCap[k]-prevStor))
+                else:
+                    last[k] = (solCap,storCap[k],-math.inf)
+                points[k].append(last[k])
+            active = [k for k in active if last[k][2] <= maxDer]
+
+    #Backward sweep from the first forward point (the start point has no
+    #derivative) until reaching the min derivative or min storage
+    for k in range(K):
+        if len(points[k]) < 1:
+            raise Exception('Forward sweep returned no points for reliability {0}'.format(targets[k]))
+    nForward = [len(points[k]) for k in range(K)]
+    active = [k for k in range(K) if points[k][0][2] >= minDer and points[k][0][1] > minStorage[k]]
+    solCap = points[0][0][0]
+    with _timer(instrumentation,'backwardSweep'):
+        while len(active) > 0 and len(points[active[0]]) < maxPoints:
+            solCap = solCap+min(solarStep(k,points[k][0]) for k in active)
+            storCap = minimumStorage(solCap,active)
+            stillActive = []
+            for k in active:
+                nextSol,nextStor,_ = points[k][0]
+                if storCap[k] >= nextStor: #Storage no longer decreases; dSol/dStor is unbounded
+                    continue
+                points[k].appendleft((solCap,storCap[k],(nextSol-solCap)/(nextStor-storCap[k])))
+                if points[k][0][2] >= minDer and storCap[k] > minStorage[k]:
+                    stillActive.append(k)
+            active = stillActive
+
+    #Only return elements within the derivative range, densifying curves
+    #with too few. Backward sweep points take the derivative of the segment
+    #after them, forward sweep points of the segment before them.
+    toRtn = {}
+    for k in range(K):
+        solCap,storCap,solCapD = (list(v) for v in zip(*points[k]))
+        left = [False]*(len(solCap)-nForward[k])+[True]*nForward[k]
+        size = lambda x: (minimumStorage(x,[k])[k],1)
+        with _timer(instrumentation,'repair'):
+            solCap,storCap,solCapD,_ = _densifyFrontier(size,targets[k],solCap,storCap,solCapD,
+                [1]*len(solCap),left,minDer,maxDer,maxRepairs,instrumentation)
+        toRtn[targets[k]] = (solCap,storCap,solCapD)
+        if instrumentation is not None:
+            instrumentation.count('points',len(solCap))
+            instrumentation.event('frontier',reliability=targets[k],points=len(solCap))
+
+    if full_output:
+        return toRtn,{'totalSimulations': nPasses}
+    return toRtn
+
+def calculateDeficitStructure(excessPower,backend='python'):
+    #Summarises the net energy series so that the unmet load of a battery of
+    #any capacity (starting full) can be found without simulating it again.
+    #The battery's state of charge is a play operator on the cumulative net
+    #energy, which only depends on its turning points. Rainflow counting then
+    #splits those into closed cycles, each of which leaves the battery state
+    #unchanged and adds max(0, range-C) of unmet load, and a short residue
+    #that is simulated directly. Returns the sorted cycle ranges, the sums of
+    #the ranges above each index, and the residue's net energy per step.
+    #backend selects the pass over the series from structureBackends.
+
+    try:
+        deficitStructure = structureBackends[backend]
+    except KeyError:
+        raise ValueError('Unknown simulation backend: {0}'.format(backend))
+
+    excessPower = _asFlatArray(excessPower)
+    ranges = np.empty(len(excessPower)+2)
+    stack = np.empty(len(excessPower)+2)
+    nRanges,nStack = deficitStructure(excessPower,ranges,stack)
+    ranges = np.sort(ranges[:nRanges])
+    sumAbove = np.concatenate((np.cumsum(ranges[::-1])[::-1],[0.0]))
+    return ranges,sumAbove,np.diff(stack[:nStack])
+
+def _deficitStructureKernel(excessPower,ranges,stack):
+    #One pass over the series that finds the turning points of the
+    #cumulative net energy (its start, every change of direction and its end)
+    #and rainflow counts them on a stack as they are found. Closed cycle
+    #ranges are written to ranges and the residue to stack; returns how many
+    #of each.
+    N = excessPower.shape[0]
+    W = 0.0
+    direction = 0
+    nStack = 0
+    nRanges = 0
+    for i in range(N+2):
+        if i == 0:
+            p = 0.0
+        elif i == N+1:
+            p = W
+        else:
+            x = excessPower[i-1]
+            if x == 0:
+                continue
+            d = 1 if x > 0 else -1
+            turn = direction != 0 and d != direction
+            direction = d
+            p = W
+            W = W+x
+            if not turn:
+                continue
+        stack[nStack] = p
+        nStack = nStack+1
+        while nStack >= 4:
+            a = stack[nStack-4]
+            b = stack[nStack-3]
+            c = stack[nStack-2]
+            e = stack[nStack-1]
+            if abs(b-c) <= abs(a-b) and abs(b-c) <= abs(c-e):
+                ranges[nRanges] = abs(b-c)
+                nRanges = nRanges+1
+                stack[nStack-3] = e
+                nStack = nStack-2
+            else:
+                break
+    return nRanges,nStack
+
+def _deficitStructurePython(excessPower,ranges,stack):
+    #Reference form of _deficitStructureKernel: the turning points are found
+    #with numpy and only the stack runs in Python
+    W = np.concatenate(([0.0],np.cumsum(excessPower)))
+    d = np.diff(W)
+    moving = np.flatnonzero(d != 0)
+    direction = np.sign(d[moving])
+    turns = moving[1:][direction[1:] != direction[:-1]]
+    turningPoints = W[np.concatenate(([0],turns,[len(W)-1]))].tolist()
+
+    residue = []
+    cycles = []
+    for p in turningPoints:
+        residue.append(p)
+        while len(residue) >= 4:
+            a,b,c,e = residue[-4:]
+            if abs(b-c) <= abs(a-b) and abs(b-c) <= abs(c-e):
+                cycles.append(abs(b-c))
+                del residue[-3:-1]
+            else:
+                break
+
+    ranges[:len(cycles)] = cycles
+    stack[:len(residue)] = residue
+    return len(cycles),len(residue)
+
+def unmetLoadFromStructure(structure,storageCapacity):
+    #Total unmet load with the given storage capacity, and the number of
+    #full-to-empty cycles (minus its slope in storage capacity)
+    ranges,sumAbove,residue = structure
+    i = np.searchsorted(ranges,storageCapacity,side='right')
+    unmetLoad,cycles = _unmetLoadAndCyclesKernel(residue,storageCapacity)
+    return sumAbove[i]-storageCapacity*(len(ranges)-i)+unmetLoad,len(ranges)-i+cycles
+
+def minimumStorageFromStructure(structure,targetUnmet,totalLoad,relTol=1e-10,maxIter=200):
+    #Newton iteration of calculateMinimumStorage on the deficit structure
+    storCap = 0.0
+    for n in range(maxIter):
+        unmetLoad,cycles = unmetLoadFromStructure(structure,storCap)
+        if unmetLoad <= targetUnmet+relTol*totalLoad:
+            return storCap
+        if cycles == 0:
+            return math.inf
+        storCap = storCap+(unmetLoad-targetUnmet)/cycles
+    raise Exception('Storage sizing did not converge in {0} iterations'.format(maxIter))
+
+def calculateReliabilitySurface(insolation,load,reliabilityTol=1e-4,stepSizeConst=0.01,
+    minSolarRatio=0.25,maxSolarRatio=10,probeReliabilities=(0.5,0.8,0.9,0.95,0.98,0.99,0.995,0.999,1),
+    maxRows=1000,backend='python'):
+    #Tabulates reliability over solar and storage capacity so that the frontier
+    #of any reliability can be read off with reliabilityFrontierFromSurface
+    #instead of being calculated. The surface has one row per solar capacity,
+    #between minSolarRatio and maxSolarRatio times mean(load)/mean(insolation).
+    #Rows are added between neighbours until, for every probe reliability, the
+    #required storage at the new row is within stepSizeConst (relative) of the
+    #straight line between them. Within a row, storage capacities run from 0
+    #to the storage that meets all the load, and are added until linear
+    #interpolation of reliability is within reliabilityTol of the exact value;
+    #the bound is rigorous because unmet load is convex in storage capacity.
+    #Returns a dict of the row solar capacities, the offset of each row in the
+    #storage and reliability lists ('rowStart', with a final end offset),
+    #those lists and reliabilityTol. backend selects the pass over the series
+    #from structureBackends.
+
+    totalLoad = len(insolation)*mean(load)
+    insolation = _asFlatArray(insolation)
+    load = _asFlatArray(load)
+    targetUnmet = [(1-r)*totalLoad for r in probeReliabilities]
+    ratio = mean(load)/mean(insolation)
+
+    rows = {}
+    def addRow(solCap):
+        structure = calculateDeficitStructure(solCap*insolation-load,backend)
+        probes = [minimumStorageFromStructure(structure,u,totalLoad) for u in targetUnmet]
+        rows[solCap] = (_reliabilityRow(structure,totalLoad,reliabilityTol),probes)
+
+    def needsRow(a,b):
+        m = math.sqrt(a*b)
+        for (ca,cm,cb) in zip(rows[a][1],rows[m][1],rows[b][1]):
+            if abs(cm-(ca+cb)/2) > stepSizeConst*max(ca,cb,0.001):
+                return True
+        return False
+
+    #Start from a coarse geometric grid and split intervals at their geometric
+    #midpoint, so rows are densest where the frontiers bend
+    solCaps = (ratio*np.geomspace(minSolarRatio,maxSolarRatio,9)).tolist()
+    for solCap in solCaps:
+        addRow(solCap)
+    intervals = list(zip(solCaps[:-1],solCaps[1:]))
+    while len(intervals) > 0 and len(rows) < maxRows:
+        a,b = intervals.pop()
+        m = math.sqrt(a*b)
+        addRow(m)
+        if needsRow(a,b):
+            intervals.append((a,m))
+            intervals.append((m,b))
+
+    solCap = sorted(rows)
+    rowStart = np.cumsum([0]+[len(rows[x][0][0]) for x in solCap])
+    return {
+        'solCap': solCap,
+        'rowStart': rowStart.tolist(),
+        'storCap': np.concatenate([rows[x][0][0] for x in solCap]).tolist(),
+        'reliability': np.concatenate([rows[x][0][1] for x in solCap]).tolist(),
+        'reliabilityTol': reliabilityTol
+    }
+
+def _reliabilityRow(structure,totalLoad,reliabilityTol,maxNodes=100000):
+    #Storage capacities and reliabilities of one surface row. Intervals are
+    #split where the tangents at their ends cross, which is where the chord of
+    #the convex unmet load can be furthest from it, until that distance is
+    #within reliabilityTol.
+    def node(storCap):
+        unmetLoad,cycles = unmetLoadFromStructure(structure,storCap)
+        return storCap,unmetLoad,-cycles
+
+    nodes = [node(0.0)]
+    fullStorage = minimumStorageFromStructure(structure,0,totalLoad)
+    if fullStorage > 0:
+        nodes.append(node(fullStorage))
+    intervals = [(nodes[0],nodes[-1])] if len(nodes) > 1 else []
+    while len(intervals) > 0 and len(nodes) < maxNodes:
+        (a,ua,da),(b,ub,db) = intervals.pop()
+        if da == db:
+            continue
+        x = (ub-ua+da*a-db*b)/(da-db)
+        if not a < x < b:
+            continue
+        gap = ua+(ub-ua)*(x-a)/(b-a)-(ua+da*(x-a))
+        if gap <= reliabilityTol*totalLoad:
+            continue
+        nodes.append(node(x))
+        intervals.append(((a,ua,da),nodes[-1]))
+        intervals.append((nodes[-1],(b,ub,db)))
+
+    nodes.sort()
+    storCap = np.array([n[0] for n in nodes])
+    reliability = 1-np.array([n[1] for n in nodes])/totalLoad
+    return storCap,np.maximum.accumulate(reliability)
+
+def reliabilityFrontierFromSurface(surface,reliability,minDer=defaultMinDer,maxDer=defaultMaxDer):
+    #Frontier of any reliability 0 < r <= 1 from a surface made by
+    #calculateReliabilitySurface, as the solCap, storCap and solCapD lists
+    #returned by the frontier engines. Each point meets the reliability and
+    #exceeds it by at most surface['reliabilityTol']; between points the
+    #frontier is as accurate as the row spacing. Only the part of the frontier
+    #within the surface's solar range is returned.
+
+    if reliability <= 0 or reliability > 1:
+        raise ValueError('reliability must be 0 < r <=1')
+
+    solCap = np.asarray(surface['solCap'])
+    rowStart = np.asarray(surface['rowStart'])
+    storCaps = np.asarray(surface['storCap'])
+    reliabilities = np.asarray(surface['reliability'])
+
+    #First node of each row that meets the reliability, or the row's last
+    #node where rounding leaves it just short of 1
+    met = np.flatnonzero(reliabilities >= reliability)
+    j = np.searchsorted(met,rowStart[:-1])
+    j = np.where(j < len(met),met[np.minimum(j,len(met)-1)],rowStart[1:]-1)
+    j = np.minimum(j,rowStart[1:]-1)
+
+    #Interpolate back from that node to where the row crosses the reliability
+    i = np.maximum(j-1,rowStart[:-1])
+    r0 = reliabilities[i]
+    r1 = reliabilities[j]
+    w = np.where(np.logical_and(j > i,r1 > r0),(reliability-r0)/np.where(r1 > r0,r1-r0,1),1)
+    storCap = storCaps[i]+np.clip(w,0,1)*(storCaps[j]-storCaps[i])
+
+    #Order by increasing storage and take the derivative against the point
+    #with more solar, as in the forward sweep of the frontier engines
+    solCap = solCap[::-1]
+    storCap = storCap[::-1]
+    dSol = np.diff(solCap)
+    dStor = np.diff(storCap)
+    solCapD = np.full(len(dSol),-np.inf)
+    t = dStor > 0
+    solCapD[t] = dSol[t]/dStor[t]
+    t = np.logical_and(solCapD >= minDer,solCapD <= maxDer)
+    return solCap[1:][t].tolist(),storCap[1:][t].tolist(),solCapD[t].tolist()
+
+def calculateMinimumStorage(reliability,insolation,load,solarCapacity,
+    backend = 'python', relTol = 1e-10, maxIter = 200):
+    #Minimum storage capacity with which a system of the given solar capacity
+    #reaches the target reliability, starting with a full battery as in
+    #simulateReliabilityAndUnmetLoad. Returns the storage capacity (inf if no
+    #amount of storage is enough) and the number of linear passes it took.
+    #
+    #Total unmet load U(C) is convex, nonincreasing and piecewise linear in
+    #storage capacity C. Its right derivative is minus the number of deficit
+    #events that follow a period in which the battery was full (or the start),
+    #because each of those is the end of a full-to-empty cycle that one more
+    #unit of storage would have shortened. One pass gives both U(C) and that
+    #slope, and Newton steps from C=0 approach the root from below without
+    #overshooting, landing on it exactly once on its linear piece.
+
+    try:
+        unmetLoadAndCycles = sizingBackends[backend]
+    except KeyError:
+        raise ValueError('Unknown simulation backend: {0}'.format(backend))
+
+    excessPower = _asScalar(solarCapacity)*_asFlatArray(insolation)-_asFlatArray(load)
+    totalLoad = len(excessPower)*mean(load)
+    targetUnmet = (1-reliability)*totalLoad
+    storCap = 0.0
+    for n in range(maxIter):
+        unmetLoad,cycles = unmetLoadAndCycles(excessPower,storCap)
+        if unmetLoad <= targetUnmet+relTol*totalLoad:
+            return storCap,n+1
+        if cycles == 0: #More storage does not help; there is not enough energy
+            return math.inf,n+1
+        storCap = storCap+(unmetLoad-targetUnmet)/cycles
+
+    raise Exception('Storage sizing did not converge in {0} passes'.format(maxIter))
+
+def loadHourlyReliabilityFrontiers(db,latLonArray,reliabilities,loadTypeId='constant',backend='python',
+    engine='simulate',workers=1,saveBatchSize=100,progress=None,siteStats=None,
+    minDer=defaultMinDer,maxDer=defaultMaxDer):
     #Loads the frontiers from memory if they exist, and calculates and saves if they don't
     #latLonArray is an array of (lat,lon) tuples
+    #loadTypeId is a load profile that is built into LoadData or saved with
+    #LoadData.saveProfile
+    #engine selects the frontier calculation from frontierEngines, or from
+    #multiFrontierEngines to calculate all missing reliabilities of a site in
+    #one task
+    #With workers > 1, missing frontiers are calculated in a process pool with
+    #one task per (site, reliability). A failed task does not stop the others;
+    #an exception listing the failures is raised once every task has finished.
+    #Inputs are loaded in bulk for batches of sites, and new frontiers are
+    #saved in bulk once saveBatchSize of them are done (and on exit).
+    #progress, if given, is called as progress(lat,lon,reliability,ok) after
+    #each missing frontier is calculated or fails.
+    #siteStats, if given, is a dict that is filled with an Instrumentation
+    #per (lat,lon) holding the counters and timers of the site's calculations
+    #plus the wall time of each task ('total'). Without it the engines run
+    #uninstrumented.
+    #Frontiers cover minDer <= dSolCap/dStorCap <= maxDer. Stored frontiers
+    #that cover a narrower range are extended with extendReliabilityFrontier
+    #and saved again in place of the old ones, whatever the engine. Stored
+    #frontiers with fewer than minFrontierPoints points are calculated again,
+    #and no frontier with fewer is saved.
 
-    electricLoad = []
+    if engine not in frontierEngines and engine not in multiFrontierEngines:
+        raise ValueError('Unknown frontier engine: {0}'.format(engine))
+    for r in reliabilities:
+        if r <= 0 or r > 1:
+            raise ValueError('reliability must be 0 < r <=1')
+    LoadData.loadProfile(db,loadTypeId) #Fail before any work for an unknown load type
 
-    for (lat,lon) in latLonArray:
-        lat = math.floor(lat) #Round reflects NASA data, round to ones
-        lon = math.floor(lon)
+    toRtn = {}
+    toSave = []
+    def save(lat,lon,solarId,r,rKey,frontier,isLast):
+        toSave.append(({rKey: frontier},lat,lon,loadTypeId,solarId))
+        if len(toSave) >= saveBatchSize:
+            flush()
+        if isLast:
+            toRtn[r] = frontier
+        if progress is not None:
+            progress(lat,lon,r,True)
+    def flush():
+        if len(toSave) > 0:
+            db.saveReliabilityFrontiersMany(toSave)
+            del toSave[:]
 
-        insolation,solarId = SolarData.loadHourly(db,lat,lon)
-        toSave = {}
-        toRtn = {}
+    instrument = siteStats is not None
+    def addStats(lat,lon,summary):
+        if instrument:
+            siteStats.setdefault((lat,lon),Instrumentation()).merge(summary)
 
-        try:
-            rf = db.loadReliabilityFrontiers(lat,lon,loadTypeId,solarId)
-        except:
-            rf = {}
+    units = _missingFrontierUnits(db,latLonArray,reliabilities,loadTypeId,toRtn,minDer,maxDer)
+    if engine in multiFrontierEngines:
+        units = _siteFrontierUnits(units)
+    else:
+        units = ((lat,lon,solarId,[r],[rKey],[stored],insolation,electricLoad,isLast) for
+            (lat,lon,solarId,r,rKey,stored,insolation,electricLoad,isLast) in units)
+    derRange = (minDer,maxDer)
 
-        for r in reliabilities:
-            if r <= 0 or r > 1:
-                raise ValueError('reliability must be 0 < r <=1')
-            rKey = ('%.6f' % r).replace('.','_')
-            if rKey in rf:
-                toRtn[r] = rf[rKey]
-                continue
+    try:
+        if workers <= 1:
+            for (lat,lon,solarId,rs,rKeys,stored,insolation,electricLoad,isLast) in units:
+                try:
+                    frontiers,summary = _calculateFrontierTask(engine,rs,insolation,electricLoad,backend,instrument,
+                        stored,derRange)
+                except Exception as e:
+                    print(e)
+                    print('-----------------')
+                    raise e
+                    raise Exception(('Could not calculate reliability for lat={},lon={}'
+                        ',reliability={}. Inner Exception: {}').format(lat,lon,rs,e))
+                addStats(lat,lon,summary)
+                for (r,rKey,frontier) in zip(rs,rKeys,frontiers):
+                    save(lat,lon,solarId,r,rKey,frontier,isLast)
+            return toRtn
+
+        failures = []
+        pending = {}
+        def collect(future):
+            (lat,lon,solarId,rs,rKeys,isLast) = pending.pop(future)
             try:
-                if len(electricLoad) < 1:
-                    createLoad = lambda x: np.matlib.repmat(x,round(len(insolation)/24),1)
-                    if(loadTypeId == 'constant'):
-                        electricLoad = createLoad(np.ones((24,1))/24)
-                    else:
-                        raise NotImplementedError('Custom load lookup not implemented')
-                        #electricLoad = lookUpTheOtherLoadProfile()
-                toRtn[r] = {}
-                toRtn[r]['solCap'],toRtn[r]['storCap'],toRtn[r]['solCapD'] = calculateReliabilityFrontier(r,insolation,electricLoad)
+                frontiers,summary = future.result()
             except Exception as e:
-                print(e)
-                print('-----------------')
-                raise e
-                raise Exception(('Could not calculate reliability for lat={},lon={}'
-                    ',reliability={}. Inner Exception: {}').format(lat,lon,r,e))
-            db.saveReliabilityFrontiers({rKey: toRtn[r]},lat,lon,loadTypeId,solarId)
+                for r in rs:
+                    print(('Could not calculate reliability for lat={},lon={}'
+                        ',reliability={}. Inner Exception: {}').format(lat,lon,r,e))
+                    failures.append((lat,lon,r,e))
+                    if progress is not None:
+                        progress(lat,lon,r,False)
+                return
+            addStats(lat,lon,summary)
+            for (r,rKey,frontier) in zip(rs,rKeys,frontiers):
+                save(lat,lon,solarId,r,rKey,frontier,isLast)
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            for (lat,lon,solarId,rs,rKeys,stored,insolation,electricLoad,isLast) in units:
+                while len(pending) >= 2*workers: #Bound the number of series held in memory
+                    done,_ = concurrent.futures.wait(pending,return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        collect(future)
+                future = pool.submit(_calculateFrontierTask,engine,rs,insolation,electricLoad,backend,instrument,
+                    stored,derRange)
+                pending[future] = (lat,lon,solarId,rs,rKeys,isLast)
+            for future in concurrent.futures.as_completed(list(pending)):
+                collect(future)
+    finally:
+        flush()
+
+    if failures:
+        raise Exception('Could not calculate {0} of the requested frontiers: {1}'.format(
+            len(failures),', '.join('lat={},lon={},reliability={}'.format(lat,lon,r) for (lat,lon,r,_) in failures)))
 
     return toRtn
 
-def simulateReliability(insolation,load,solarCapacity,storageCapacity):
-    r,_ = simulateReliabilityAndUnmetLoad(insolation,load,solarCapacity,storageCapacity)
-    return r
+def planHourlyReliabilityFrontiers(db,latLonArray,reliabilities,loadTypeId='constant',
+    minDer=defaultMinDer,maxDer=defaultMaxDer):
+    #Returns the (lat,lon,reliability) units that loadHourlyReliabilityFrontiers
+    #would have to calculate or extend, without fetching or calculating
+    #anything. Sites whose solar data is not stored yet have all their units
+    #missing.
+
+    sites = list(dict.fromkeys((math.floor(lat),math.floor(lon)) for (lat,lon) in latLonArray))
+    solarIds = db.loadHourlySolarIdsMany(sites,SolarData.defaultStartYear,2005,1,12,1,31)
+    stored = db.loadReliabilityFrontiersMany([(lat,lon,solarIds[(lat,lon)]) for (lat,lon) in sites
+        if (lat,lon) in solarIds],loadTypeId)
+
+    missing = []
+    for (lat,lon) in sites:
+        rf = stored.get((lat,lon,solarIds.get((lat,lon))),{})
+        for r in reliabilities:
+            rKey = ('%.6f' % r).replace('.','_')
+            if rKey not in rf or not _isComplete(rf[rKey],minDer,maxDer):
+                missing.append((lat,lon,r))
+    return missing
+
+def enqueueHourlyReliabilityFrontiers(db,queue,latLonArray,reliabilities,loadTypeId='constant',
+    minDer=defaultMinDer,maxDer=defaultMaxDer):
+    #Adds the units that planHourlyReliabilityFrontiers finds missing to
+    #queue (an AppDatabase.WorkQueue or FileDatabase.WorkQueue) for
+    #runFrontierWorker processes on any number of machines. Returns the
+    #number of units planned and the number added to the queue.
+
+    LoadData.loadProfile(db,loadTypeId) #Fail before any work for an unknown load type
+    missing = planHourlyReliabilityFrontiers(db,latLonArray,reliabilities,loadTypeId,minDer,maxDer)
+    return len(missing),queue.enqueue(missing,loadTypeId)
 
-def simulateReliabilityAndUnmetLoad(insolation,load,solarCapacity,storageCapacity):
+def runFrontierWorker(db,queue,worker=None,backend='python',engine='simulate',
+    leaseSeconds=defaultLeaseSeconds,maxAttempts=3,idleWait=defaultIdleWait,exitWhenIdle=True,
+    progress=None,minDer=defaultMinDer,maxDer=defaultMaxDer):
+    #Leases units from queue one at a time, calculates and saves their
+    #frontiers with loadHourlyReliabilityFrontiers and marks them done.
+    #Workers share nothing but the database, so throughput scales with the
+    #number of them. A unit that fails goes back to the queue until it has
+    #been attempted maxAttempts times; a unit whose worker dies is leased
+    #again once its lease of leaseSeconds expires, until it too has been
+    #leased maxAttempts times. Saves are upserts of the frontier under its
+    #reliability key, so a unit calculated twice after a lost lease is simply
+    #saved twice.
+    #When there is nothing to lease the worker waits idleWait seconds, and
+    #with exitWhenIdle returns once no unit is pending or leased.
+    #progress, if given, is called as progress(lat,lon,reliability,ok).
+    #Returns the number of units done and failed by this worker.
+
+    if worker is None:
+        worker = '{0}:{1}'.format(socket.gethostname(),os.getpid())
+    counts = {'done': 0,'failed': 0}
+    while True:
+        unit = queue.lease(worker,leaseSeconds,maxAttempts)
+        if unit is None:
+            if exitWhenIdle:
+                remaining = queue.counts()
+                if remaining['pending']+remaining['leased'] < 1:
+                    return counts
+            time.sleep(idleWait)
+            continue
+
+        lat,lon,r = unit['lat'],unit['lon'],unit['reliability']
+        try:
+            loadHourlyReliabilityFrontiers(db,[(lat,lon)],[r],unit['loadTypeId'],backend=backend,
+                engine=engine,minDer=minDer,maxDer=maxDer)
+        except Exception as e:
+            print(('Could not calculate reliability for lat={},lon={}'
+                ',reliability={} (attempt {}). Inner Exception: {}').format(lat,lon,r,unit['attempts'],e))
+            if queue.release(unit,e,maxAttempts):
+                counts['failed'] += 1
+            if progress is not None:
+                progress(lat,lon,r,False)
+            continue
+        queue.complete(unit)
+        counts['done'] += 1
+        if progress is not None:
+            progress(lat,lon,r,True)
+
+def loadHourlyReliabilitySurface(db,lat,lon,loadTypeId='constant',**kwargs):
+    #Loads the site's reliability surface if it exists, and calculates and
+    #saves it if it doesn't. Other keyword arguments are passed to
+    #calculateReliabilitySurface. Query it with reliabilityFrontierFromSurface.
+
+    lat = math.floor(lat) #Round reflects NASA data, round to ones
+    lon = math.floor(lon)
+    insolation,solarId = SolarData.loadHourly(db,lat,lon)
+    surface = db.loadReliabilitySurface(lat,lon,loadTypeId,solarId)
+    if surface is None:
+        surface = calculateReliabilitySurface(insolation,LoadData.loadSeries(db,loadTypeId,len(insolation),
+            SolarData.hourlyStartDate()),**kwargs)
+        db.saveReliabilitySurface(surface,lat,lon,loadTypeId,solarId)
+    return surface
+
+def _missingFrontierUnits(db,latLonArray,reliabilities,loadTypeId,toRtn,minDer,maxDer,siteBatchSize=100):
+    #Yields a work unit for every (site, reliability) whose frontier is not yet
+    #stored or does not cover the derivative range, loading solar data and
+    #stored frontiers in bulk for batches of sites. Units carry the stored
+    #frontier to extend, or None. Stored frontiers of the last site are put
+    #into toRtn, matching what loadHourlyReliabilityFrontiers has always
+    #returned; units of the last site are flagged so that their results can
+    #be added too.
+
+    sites = [(math.floor(lat),math.floor(lon)) for (lat,lon) in latLonArray] #Round reflects NASA data, round to ones
+    lastSite = sites[-1] if len(sites) > 0 else None
+    yielded = set()
+
+    for i in range(0,len(sites),siteBatchSize):
+        batch = list(dict.fromkeys(sites[i:i+siteBatchSize]))
+        solar = SolarData.loadHourlyMany(db,batch)
+        stored = db.loadReliabilityFrontiersMany([(lat,lon,solar[(lat,lon)][1]) for (lat,lon) in batch],
+            loadTypeId)
+
+        for (lat,lon) in batch:
+            isLast = (lat,lon) == lastSite
+            insolation,solarId = solar[(lat,lon)]
+            rf = stored.get((lat,lon,solarId),{})
+
+            for r in reliabilities:
+                rKey = ('%.6f' % r).replace('.','_')
+                if rKey in rf and _isComplete(rf[rKey],minDer,maxDer):
+                    if isLast:
+                        toRtn[r] = rf[rKey]
+                    continue
+                if (lat,lon,rKey) in yielded: #Site repeated in latLonArray
+                    continue
+                yielded.add((lat,lon,rKey))
+                electricLoad = LoadData.loadSeries(db,loadTypeId,len(insolation),SolarData.hourlyStartDate())
+                #Frontiers with too few points (saved before that was checked)
+                #are calculated again rather than extended
+                toExtend = rf.get(rKey)
+                if toExtend is not None and len(toExtend['solCap']) < minFrontierPoints:
+                    toExtend = None
+                yield (lat,lon,solarId,r,rKey,toExtend,insolation,electricLoad,isLast)
+
+def _isComplete(frontier,minDer,maxDer):
+    #Has enough points and covers the derivative range. Frontiers saved
+    #before the range was recorded used the defaults.
+    return (len(frontier['solCap']) >= minFrontierPoints and
+        frontier.get('minDer',defaultMinDer) <= minDer and
+        frontier.get('maxDer',defaultMaxDer) >= maxDer)
+
+def _siteFrontierUnits(units):
+    #Merges the consecutive units of each site into one unit with lists of
+    #reliabilities and keys, for the engines in multiFrontierEngines
+    site = None
+    for (lat,lon,solarId,r,rKey,stored,insolation,electricLoad,isLast) in units:
+        if site is not None and site[:3] != (lat,lon,solarId):
+            yield site
+            site = None
+        if site is None:
+            site = (lat,lon,solarId,[],[],[],insolation,electricLoad,isLast)
+        site[3].append(r)
+        site[4].append(rKey)
+        site[5].append(stored)
+    if site is not None:
+        yield site
+
+def _calculateFrontierTask(engine,reliabilities,insolation,load,backend,instrument=False,stored=None,
+    derRange=(defaultMinDer,defaultMaxDer)):
+    #Module level so that it can be sent to worker processes. Returns the
+    #frontiers of the given reliabilities in the same order, and the summary
+    #of an Instrumentation if instrument is True (else None). stored, if
+    #given, holds a stored frontier to extend (or None) per reliability.
+    instrumentation = Instrumentation() if instrument else None
+    minDer,maxDer = derRange
+    if stored is None:
+        stored = [None]*len(reliabilities)
+    new = [r for (r,f) in zip(reliabilities,stored) if f is None]
+    with _timer(instrumentation,'total'):
+        if len(new) < 1:
+            frontiers = {}
+        elif engine in multiFrontierEngines:
+            frontiers = multiFrontierEngines[engine](new,insolation,load,backend=backend,
+                instrumentation=instrumentation,minDer=minDer,maxDer=maxDer)
+        else:
+            frontiers = {r: frontierEngines[engine](r,insolation,load,backend=backend,
+                instrumentation=instrumentation,minDer=minDer,maxDer=maxDer) for r in new}
+        frontiers = {r: {'solCap': f[0],'storCap': f[1],'solCapD': f[2],'minDer': minDer,'maxDer': maxDer}
+            for r,f in frontiers.items()}
+        for (r,f) in zip(reliabilities,stored):
+            if f is not None:
+                frontiers[r] = extendReliabilityFrontier(f,r,insolation,load,minDer,maxDer,backend=backend,
+                    instrumentation=instrumentation)
+    for r in reliabilities: #Never save a frontier that looks complete but is not
+        if len(frontiers[r]['solCap']) < minFrontierPoints:
+            raise Exception('Too few (less than {0}) points in the frontier of reliability {1}'.format(
+                minFrontierPoints,r))
+    return [frontiers[r] for r in reliabilities],instrumentation.summary() if instrument else None
+
+def simulateReliability(insolation,load,solarCapacity,storageCapacity,backend='python'):
+    #Accumulates only the total unmet load, so nothing of the length of the
+    #series is allocated. Agrees with simulateReliabilityAndUnmetLoad to
+    #rounding (the totals are summed in time order rather than pairwise).
+    return simulateReliabilityStream([(insolation,load)],solarCapacity,storageCapacity,backend)
+
+def simulateReliabilityAndUnmetLoad(insolation,load,solarCapacity,storageCapacity,backend='python'):
     #Calculates the fraction of demand served given arguments
     #Insolation and load are vectors over time with the same period and have
     #units of power (average power over period). Storage capacity has units
     #P*(period length). solarCapacity has units P.
+    #backend selects the dispatch kernel from simulationBackends. All backends
+    #return bit-for-bit identical results; 'python' is the reference.
+
+    try:
+        simulateUnmetLoad = simulationBackends[backend]
+    except KeyError:
+        raise ValueError('Unknown simulation backend: {0}'.format(backend))
+
+    unmetLoad = simulateUnmetLoad(insolation,load,solarCapacity,storageCapacity)
+    reliability = 1-mean(unmetLoad)/mean(load)
+
+    return reliability,unmetLoad
+
+def simulateReliabilityStream(chunks,solarCapacity,storageCapacity,backend='python',trajectory=None,
+    full_output=False):
+    #Streaming form of simulateReliability for series too long to hold in
+    #memory, e.g. decades at sub-hourly resolution in a memory-mapped file.
+    #chunks is an iterable of (insolation,load) array pairs in time order, for
+    #example from iterChunks. The state of charge is carried from one chunk to
+    #the next, so the result does not depend on how the series is split, and
+    #only totals are accumulated. trajectory is an optional callable that is
+    #passed the unmet load and end of period state of charge of each chunk;
+    #the arrays are reused for the next chunk, so copy them to keep them.
+    #With full_output, also returns a dict with the total 'unmetLoad' and
+    #'load', the number of 'periods' and the final 'stateOfCharge'.
+
+    try:
+        dispatchChunk = streamBackends[backend]
+    except KeyError:
+        raise ValueError('Unknown simulation backend: {0}'.format(backend))
+
+    solarCapacity = _asScalar(solarCapacity)
+    storageCapacity = _asScalar(storageCapacity)
+    prevSOC = storageCapacity
+    unmetLoad = 0.0
+    totalLoad = 0.0
+    periods = 0
+    unmetLoadBuffer = endPeriodSOCBuffer = np.empty(0)
+    for (insolation,load) in chunks:
+        insolation = _asFlatArray(insolation)
+        load = _asFlatArray(load)
+        N = len(insolation)
+        if trajectory is not None and len(unmetLoadBuffer) < N:
+            unmetLoadBuffer = np.empty(N)
+            endPeriodSOCBuffer = np.empty(N)
+        u,prevSOC = dispatchChunk(insolation,load,solarCapacity,storageCapacity,prevSOC,
+            unmetLoadBuffer,endPeriodSOCBuffer,trajectory is not None)
+        if trajectory is not None:
+            trajectory(unmetLoadBuffer[:N],endPeriodSOCBuffer[:N])
+        unmetLoad += u
+        totalLoad += np.sum(load)
+        periods += N
+
+    reliability = 1-unmetLoad/totalLoad
+    if full_output:
+        return reliability,{'unmetLoad': float(unmetLoad),'load': float(totalLoad),'periods': periods,
+            'stateOfCharge': float(prevSOC)}
+    return reliability
+
+def iterChunks(insolation,load,chunkSize=defaultChunkSize):
+    #Splits aligned insolation and load series into chunks for
+    #simulateReliabilityStream. Slices are views, so memory-mapped series are
+    #only read as the chunks are simulated.
+    for i in range(0,len(insolation),chunkSize):
+        yield insolation[i:i+chunkSize],load[i:i+chunkSize]
+
+def simulateReliabilityBatch(insolation,load,solarCaps,storCaps):
+    #Simulates many candidate systems at once. solarCaps and storCaps are
+    #broadcast against each other; one state of charge and one running total
+    #of unmet load is carried per candidate and all candidates advance through
+    #the time series together, so memory does not grow with the series length.
+    #Returns an array of reliabilities with the broadcast shape. Each value is
+    #identical to simulateReliability for the same (solar, storage) pair.
+
+    solarCaps,storCaps = np.broadcast_arrays(np.asarray(solarCaps,dtype=np.float64),
+        np.asarray(storCaps,dtype=np.float64))
+    shape = solarCaps.shape
+    solarCaps = solarCaps.ravel()
+    storCaps = storCaps.ravel()
+
+    N = len(insolation)
+    K = len(solarCaps)
+    insolation = _asFlatArray(insolation)
+    load = _asFlatArray(load)
+    prevSOC = storCaps.copy()
+    nextSOC = np.empty(K)
+    excessPower = np.empty(K)
+    u = np.empty(K)
+    unmetLoad = np.zeros(K) #Summed in time order, as in simulateReliability
+    for i in range(N):
+        np.multiply(solarCaps,insolation[i],out=excessPower)
+        np.subtract(excessPower,load[i],out=excessPower)
+        np.add(prevSOC,excessPower,out=nextSOC)
+        np.minimum(storCaps,nextSOC,out=nextSOC)
+        np.maximum(0,nextSOC,out=nextSOC)
+        np.subtract(nextSOC,prevSOC,out=u)
+        np.subtract(u,excessPower,out=u)
+        np.maximum(u,0,out=u)
+        np.add(unmetLoad,u,out=unmetLoad)
+        prevSOC,nextSOC = nextSOC,prevSOC
+
+    reliability = 1-unmetLoad/np.sum(load)
+
+    return reliability.reshape(shape)
+
+def simulateReliabilityAggregated(insolation,load,solarCapacity,storageCapacity,hoursPerStep=3,
+    backend='python'):
+    #Screening approximation of simulateReliability that steps the battery
+    #once per block of hoursPerStep periods. Each block is summarised by the
+    #lowest and highest cumulative net energy reached within it and the net
+    #energy within it is taken to move monotonically from the block start to
+    #its first extreme, to its other extreme and then to its end. This is
+    #exact unless the battery would run empty and fill up again more than
+    #once within a block, so it is exact for storage larger than the swings
+    #of net energy within a block and overestimates reliability for smaller
+    #storage. backend selects the kernel from aggregatedBackends.
+
+    try:
+        unmetLoadKernel = aggregatedBackends[backend]
+    except KeyError:
+        raise ValueError('Unknown simulation backend: {0}'.format(backend))
+
+    load = _asFlatArray(load)
+    unmetLoad = unmetLoadKernel(_asFlatArray(insolation),load,_asScalar(solarCapacity),
+        _asScalar(storageCapacity),int(hoursPerStep))
+    return 1-unmetLoad/len(load)/mean(load)
+
+def _unmetLoadBlockKernel(insolation,load,solarCapacity,storageCapacity,hoursPerStep):
+    #Dispatch of simulateReliabilityAggregated in one pass over the periods.
+    #Each block is summarised as it is read by the lowest and highest
+    #cumulative net energy reached within it (relative to the block start,
+    #so low <= 0 <= high), whether the lowest is reached first and the block
+    #total, and the battery then makes three monotone moves. Returns the
+    #total unmet load. Indexing only, so that it runs on lists in Python and
+    #on arrays under numba.
+    N = len(insolation)
+    prevSOC = storageCapacity
+    unmetLoad = 0.0
+    for start in range(0,N,hoursPerStep):
+        total = 0.0
+        low = 0.0
+        high = 0.0
+        lowAt = 0
+        highAt = 0
+        for i in range(start,min(N,start+hoursPerStep)):
+            total = total+(solarCapacity*insolation[i]-load[i])
+            if total < low:
+                low = total
+                lowAt = i+1
+            elif total > high:
+                high = total
+                highAt = i+1
+        if lowAt < highAt:
+            nextSOC = prevSOC+low
+            if nextSOC < 0:
+                unmetLoad = unmetLoad-nextSOC
+                nextSOC = 0.0
+            nextSOC = min(storageCapacity,nextSOC+high-low)
+            nextSOC = nextSOC+total-high
+            if nextSOC < 0:
+                unmetLoad = unmetLoad-nextSOC
+                nextSOC = 0.0
+        else:
+            nextSOC = min(storageCapacity,prevSOC+high)
+            nextSOC = nextSOC+low-high
+            if nextSOC < 0:
+                unmetLoad = unmetLoad-nextSOC
+                nextSOC = 0.0
+            nextSOC = min(storageCapacity,nextSOC+total-low)
+        prevSOC = nextSOC
+    return unmetLoad
+
+def _unmetLoadBlockPython(insolation,load,solarCapacity,storageCapacity,hoursPerStep):
+    #Python floats and lists index much faster than numpy scalars
+    return _unmetLoadBlockKernel(insolation.tolist(),load.tolist(),solarCapacity,storageCapacity,hoursPerStep)
+
+def simulateUnmetLoadPython(insolation,load,solarCapacity,storageCapacity):
+    #Reference dispatch loop. Returns the unmet load in each period.
 
     N = len(insolation)
     endPeriodSOC = np.zeros(N+1)
     endPeriodSOC[0] = storageCapacity
     prevSOC = storageCapacity
     unmetLoad = np.zeros(N)
-    #s = time.time()
     for i in range(N):
         excessPower = solarCapacity*insolation[i]-load[i]
         nextSOC = max(0,min(storageCapacity,prevSOC+excessPower))
         endPeriodSOC[i+1] = nextSOC
-        #endPeriodSOC.append(max(0,min(storageCapacity,endPeriodSOC[i]+excessPower)))
         unmetLoad[i] = max(nextSOC-prevSOC-excessPower,0)
         prevSOC = nextSOC
-        #unmetLoad.append(max(endPeriodSOC[i+1]-endPeriodSOC[i]-excessPower,0))
 
+    return unmetLoad
 
-    #e = time.time()
-    #print('Loop took {0} seconds'.format(e-s))
-    reliability = 1-mean(unmetLoad)/mean(load)
+def _unmetLoadKernel(insolation,load,solarCapacity,storageCapacity):
+    #Same recursion as simulateUnmetLoadPython on flat float64 arrays, written
+    #so that it can be compiled by numba. Operation order must match the
+    #reference exactly to keep results bit-for-bit equal.
+    N = insolation.shape[0]
+    unmetLoad = np.zeros(N)
+    prevSOC = storageCapacity
+    for i in range(N):
+        excessPower = solarCapacity*insolation[i]-load[i]
+        nextSOC = max(0.0,min(storageCapacity,prevSOC+excessPower))
+        unmetLoad[i] = max(nextSOC-prevSOC-excessPower,0.0)
+        prevSOC = nextSOC
+    return unmetLoad
 
-    return reliability,unmetLoad
+def _dispatchChunkKernel(insolation,load,solarCapacity,storageCapacity,prevSOC,unmetLoad,
+    endPeriodSOC,record):
+    #Same recursion as _unmetLoadKernel from the state of charge prevSOC,
+    #accumulating the unmet load. With record, the unmet load and end of
+    #period state of charge are also written to the given arrays. Returns the
+    #total unmet load and the final state of charge.
+    totalUnmet = 0.0
+    for i in range(insolation.shape[0]):
+        excessPower = solarCapacity*insolation[i]-load[i]
+        nextSOC = max(0.0,min(storageCapacity,prevSOC+excessPower))
+        u = max(nextSOC-prevSOC-excessPower,0.0)
+        totalUnmet += u
+        if record:
+            unmetLoad[i] = u
+            endPeriodSOC[i] = nextSOC
+        prevSOC = nextSOC
+    return totalUnmet,prevSOC
+
+def _unmetLoadAndCyclesKernel(excessPower,storageCapacity):
+    #One pass of the dispatch recursion that returns the total unmet load and
+    #the number of deficit events preceded by a full battery. See
+    #calculateMinimumStorage.
+    prevSOC = storageCapacity
+    unmetLoad = 0.0
+    wasFull = True
+    cycles = 0
+    for i in range(excessPower.shape[0]):
+        nextSOC = prevSOC+excessPower[i]
+        if nextSOC > storageCapacity:
+            nextSOC = storageCapacity
+            wasFull = True
+        elif nextSOC < 0:
+            unmetLoad = unmetLoad-nextSOC
+            nextSOC = 0.0
+            if wasFull:
+                cycles = cycles+1
+                wasFull = False
+        prevSOC = nextSOC
+    return unmetLoad,cycles
+
+if numba is not None:
+    _unmetLoadKernelNumba = numba.njit(cache=True)(_unmetLoadKernel)
+    _unmetLoadAndCyclesKernelNumba = numba.njit(cache=True)(_unmetLoadAndCyclesKernel)
+    _unmetLoadBlockKernelNumba = numba.njit(cache=True)(_unmetLoadBlockKernel)
+    _dispatchChunkKernelNumba = numba.njit(cache=True)(_dispatchChunkKernel)
+    _deficitStructureKernelNumba = numba.njit(cache=True)(_deficitStructureKernel)
+else:
+    _unmetLoadKernelNumba = None
+    _unmetLoadAndCyclesKernelNumba = None
+    _unmetLoadBlockKernelNumba = None
+    _dispatchChunkKernelNumba = None
+    _deficitStructureKernelNumba = None
+
+def _asFlatArray(x):
+    return np.ascontiguousarray(x,dtype=np.float64).ravel()
+
+def _asScalar(x):
+    #Root finders may pass capacities as arrays of shape (1,)
+    return np.asarray(x,dtype=np.float64).item()
+
+def simulateUnmetLoadNumba(insolation,load,solarCapacity,storageCapacity):
+    if _unmetLoadKernelNumba is None:
+        raise ImportError('numba is required for the \'numba\' simulation backend')
+    return _unmetLoadKernelNumba(_asFlatArray(insolation),_asFlatArray(load),
+        _asScalar(solarCapacity),_asScalar(storageCapacity))
+
+simulationBackends = {
+    'python': simulateUnmetLoadPython,
+    'numba': simulateUnmetLoadNumba
+}
+
+def _dispatchChunkNumba(*args):
+    if _dispatchChunkKernelNumba is None:
+        raise ImportError('numba is required for the \'numba\' simulation backend')
+    return _dispatchChunkKernelNumba(*args)
+
+streamBackends = {
+    'python': _dispatchChunkKernel,
+    'numba': _dispatchChunkNumba
+}
+
+def _unmetLoadAndCyclesNumba(excessPower,storageCapacity):
+    if _unmetLoadAndCyclesKernelNumba is None:
+        raise ImportError('numba is required for the \'numba\' simulation backend')
+    return _unmetLoadAndCyclesKernelNumba(excessPower,storageCapacity)
+
+def _unmetLoadBlockNumba(*args):
+    if _unmetLoadBlockKernelNumba is None:
+        raise ImportError('numba is required for the \'numba\' simulation backend')
+    return _unmetLoadBlockKernelNumba(*args)
+
+aggregatedBackends = {
+    'python': _unmetLoadBlockPython,
+    'numba': _unmetLoadBlockNumba
+}
+
+def _deficitStructureNumba(excessPower,ranges,stack):
+    if _deficitStructureKernelNumba is None:
+        raise ImportError('numba is required for the \'numba\' simulation backend')
+    return _deficitStructureKernelNumba(excessPower,ranges,stack)
+
+structureBackends = {
+    'python': _deficitStructurePython,
+    'numba': _deficitStructureNumba
+}
+
+sizingBackends = {
+    'python': _unmetLoadAndCyclesKernel,
+    'numba': _unmetLoadAndCyclesNumba
+}
+
+frontierEngines = {
+    'simulate': calculateReliabilityFrontier,
+    'analytic': calculateReliabilityFrontierAnalytic,
+    'screened': calculateReliabilityFrontierScreened
+}
+
+multiFrontierEngines = {
+    'shared': calculateReliabilityFrontiers
+}
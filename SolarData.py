@@ -7,23 +7,49 @@ import urllib.request as request
 defaultStartYear = 1995
 #defaultStartYear = 2003
 
+#Daily insolation endpoint, formatted with lat, lon, startYear, endYear,
+#startMonth, endMonth, startDay and endDay in that order. Can be pointed at a
+#local stand-in such as SolarIngest.LocalSolarServer.
+dailyEndpoint = ('https://eosweb.larc.nasa.gov/cgi-bin/sse/homer.cgi?ye={3}&'
+    'lat={0}&submit=GetDailyDataasplaintext&me={5}&daily=swv_dwn&email='
+    'skip@larc.nasa.gov&step=1&p=&ms={4}&ys={2}&de={7}&lon={1}&ds={6}')
+
 def fetchDaily(lat,lon,startYear=defaultStartYear,endYear=2005,startMonth=1,endMonth=12,
-    startDay=1,endDay=31):
-    endpoint = ('https://eosweb.larc.nasa.gov/cgi-bin/sse/homer.cgi?ye={3}&'
-        'lat={0}&submit=GetDailyDataasplaintext&me={5}&daily=swv_dwn&email='
-        'skip@larc.nasa.gov&step=1&p=&ms={4}&ys={2}&de={7}&lon={1}&ds={6}'
-        ).format(lat,lon,startYear,endYear,startMonth,endMonth,startDay,
+    startDay=1,endDay=31,endpoint=None):
+    if endpoint is None:
+        endpoint = dailyEndpoint
+    url = endpoint.format(lat,lon,startYear,endYear,startMonth,endMonth,startDay,
         endDay)
 
     try:
-        resource = request.urlopen(endpoint)
-        stringData = resource.read().decode('utf-8')
-        numData = [float(x) for x in stringData.split(' ')]
+        resource = request.urlopen(url)
+        numData = parseDailyStream(resource).tolist()
     except:
         raise ValueError('Could not fetch data at lat={0}, lon={1}',lat,lon)
 
     return numData
 
+def parseDailyStream(resource,chunkSize=65536):
+    #Parses the whitespace separated numbers of a response into a numpy array
+    #chunk by chunk, so the whole body is never held as one string
+
+    chunks = []
+    tail = b''
+    while True:
+        block = resource.read(chunkSize)
+        if not block:
+            break
+        block = tail+block
+        cut = max(block.rfind(b' '),block.rfind(b'\n'))
+        if cut < 0:
+            tail = block
+            continue
+        tail = block[cut+1:]
+        chunks.append(np.array(block[:cut].split(),dtype=np.float64))
+    chunks.append(np.array(tail.split(),dtype=np.float64))
+
+    return np.concatenate(chunks)
+
 def calcIrradianceVectorOverDay(lat,lon,date,resolution,tOffset,flag='clearsky',flagVal=1):
     #date: A date object representing the day we are calculating the irradiance vector for
     #resolution: time period in hours of the vector to be returned
@@ -109,6 +135,101 @@ def calcIrradianceVectorOverDay(lat,lon,date,resolution,tOffset,flag='clearsky',
     }
 
 
+def calcIrradianceVectorOverDays(lat,lon,startDate,Ndays,resolution,tOffset,flag='clearsky',flagVals=1):
+    #Vectorised equivalent of calling calcIrradianceVectorOverDay for Ndays
+    #consecutive days starting at startDate. flagVals is a scalar or an array
+    #with one value per day. Returns arrays with one row per day; the
+    #irradiance values are identical to the per-day function, so the
+    #arithmetic below deliberately follows the same operation order.
+
+    if (resolution > 12):
+        raise ValueError('Cannot have a resolution greater than 12 hours')
+
+    days = np.datetime64(startDate,'D') + np.arange(Ndays)
+    dayOfYear = (days - days.astype('datetime64[Y]')).astype(np.int64)+1 #day of year in [1,365]
+
+    acosd = lambda x : math.degrees(math.acos(x))
+    tand = lambda x : math.tan(math.radians(x))
+    cosd = lambda x : np.cos(np.radians(x))
+    sind = lambda x : np.sin(np.radians(x))
+    cosLat = math.cos(math.radians(lat))
+    sinLat = math.sin(math.radians(lat))
+
+    decl = 23.45*sind(360*(284+dayOfYear)/365) #declination
+    Gon = 1.367*(1+0.033*cosd(360*dayOfYear/365)) #extraterrestrial normal radiation kW/m^2
+    cosLatCosDecl = cosLat*cosd(decl)
+    sinLatSinDecl = sinLat*sind(decl)
+
+    #Sunset is one value per day and uses math.tan/math.acos, which numpy
+    #does not reproduce to the last bit
+    sunset = np.array([acosd(-tand(lat)*tand(d)) for d in decl.tolist()])
+    sunrise = 360-sunset
+
+    def getClearSkyMeanIrradianceFromInterval(w1,w2):
+        #Average irradiance from integration kW/m^2. w1 and w2 hold one value
+        #per day, or one row per day. Interval must be during light!
+        c = cosLatCosDecl
+        g = Gon
+        s = sinLatSinDecl
+        if w1.ndim > 1:
+            c = c[:,None]
+            g = g[:,None]
+            s = s[:,None]
+        return g*(c*(sind(w2)-sind(w1))*180/math.pi/((w2-w1)%360)+s)
+
+    flagVals = np.broadcast_to(np.asarray(flagVals,dtype=np.float64),(Ndays,))
+    if flag == 'clearsky':
+        clearnessIndex = np.ones(Ndays)
+    elif flag == 'clearness':
+        clearnessIndex = flagVals.copy()
+    elif flag == 'mean' or flag == 'insolation':
+        if flag == 'mean':
+            meanIrradiance = flagVals
+        else:
+            meanIrradiance = flagVals/24
+        clearSkyInsolation = getClearSkyMeanIrradianceFromInterval(sunrise,sunset)*((sunset-sunrise)%360)/15
+        clearnessIndex = meanIrradiance/(clearSkyInsolation/24)
+    else:
+        raise ValueError('Invalid flag')
+
+    #Parameters for calculating solar hour given obliquity of orbit
+    B = 360*(dayOfYear-1)/365
+    E = 3.82*(0.000075+0.001868*cosd(B)-0.032077*sind(B)-0.014615*cosd(2*B)-0.04089*sind(2*B)) #Equation of time for obliquity
+
+    #Every day's periods start at the same local clock time
+    N = round(24/resolution)
+    stepMinutes = round(resolution*60)
+    coercedStart = datetime.datetime.combine(startDate,datetime.time.min)-tOffset
+    minutes = coercedStart.hour*60+coercedStart.minute+np.arange(N)*stepMinutes
+    hour = (minutes//60)%24
+    minute = minutes%60
+
+    solarHour = (hour+minute/60+lon/15)[None,:] + E[:,None]
+
+    #Calculate the beginning and end of the integration period
+    w1 = (solarHour-resolution/2-12)*15 % 360
+    w2 = (solarHour+resolution/2-12)*15 % 360
+
+    #Adjust the bounds of integration if period includes nighttime.
+    w1dark = np.logical_and(w1 >= sunset[:,None],w1 <= sunrise[:,None])
+    w2dark = np.logical_and(w2 >= sunset[:,None],w2 <= sunrise[:,None])
+    w1 = np.where(w1dark,(360-sunset)[:,None],w1)
+    w2 = np.where(w2dark,sunset[:,None],w2)
+
+    with np.errstate(divide='ignore',invalid='ignore'):
+        irradiance = getClearSkyMeanIrradianceFromInterval(w1,w2)*((w2-w1)%360)/(resolution*15) #scaling term is to compensate for when w2-w1 is not the even interval and weight accordingly
+    irradiance[np.logical_and(w1dark,w2dark)] = 0 # The entire period is dark, so irradiance = 0
+    irradiance = irradiance*clearnessIndex[:,None]
+
+    time = (np.datetime64(coercedStart,'us') + np.arange(Ndays)[:,None]*np.timedelta64(1,'D')
+        + (np.arange(N)*stepMinutes)[None,:]*np.timedelta64(1,'m'))
+
+    return {
+        'irradiance': irradiance,
+        'time': time,
+        'clearnessIndex': clearnessIndex
+    }
+
 def loadDaily(db,lat,lon,startYear=defaultStartYear,endYear=2005,startMonth=1,endMonth=12,
     startDay=1,endDay=31):
 
@@ -131,13 +252,52 @@ def loadHourly(db,lat,lon,startYear=defaultStartYear,endYear=2005,startMonth=1,e
         data,id = db.loadHourlySolar(lat,lon,startYear,endYear,startMonth,endMonth,
             startDay,endDay) #Try to load it
         if (len(data) < 1): #If it's not there, fetch it then save it
-            data = saveHourly(db,lat,lon,startYear,endYear,startMonth,endMonth,
+            data,id = saveHourly(db,lat,lon,startYear,endYear,startMonth,endMonth,
             startDay,endDay)
     except:
         data,id = saveHourly(db,lat,lon,startYear,endYear,startMonth,endMonth,
         startDay,endDay)
 
-    return np.array(data),id
+    return np.asarray(data),id #No copy if the backend returns an array (e.g. memory-mapped)
+
+def loadHourlyMany(db,latLons,startYear=defaultStartYear,endYear=2005,startMonth=1,endMonth=12,
+    startDay=1,endDay=31,**kwargs):
+    #Like loadHourly for a list of (lat,lon) sites, looking the stored ones up
+    #in bulk. For sites without a stored hourly series, stored daily series are
+    #loaded in bulk, the rest are fetched concurrently with SolarIngest (which
+    #is passed the other keyword arguments) and saved in bulk, and the hourly
+    #series are synthesised and saved in bulk. Sites that could not be fetched
+    #raise a ValueError once the others are saved.
+    #Returns a dict of (insolation,id) tuples keyed by (lat,lon).
+
+    dateRange = (startYear,endYear,startMonth,endMonth,startDay,endDay)
+    toRtn = {}
+    for (lat,lon),(data,id) in db.loadHourlySolarMany(latLons,*dateRange).items():
+        if len(data) > 0:
+            toRtn[(lat,lon)] = (np.asarray(data),id)
+    missing = [x for x in dict.fromkeys(latLons) if x not in toRtn]
+    if len(missing) < 1:
+        return toRtn
+
+    import SolarIngest #Imports this module
+    daily = {k: data for k,(data,_) in db.loadDailySolarMany(missing,*dateRange).items() if len(data) > 0}
+    fetched = SolarIngest.fetchDailyMany([x for x in missing if x not in daily],*dateRange,**kwargs)
+    failures = {k: v for k,v in fetched.items() if isinstance(v,BaseException)}
+    fetched = {k: v for k,v in fetched.items() if k not in failures}
+    if len(fetched) > 0:
+        db.saveDailySolarMany(fetched,*dateRange)
+        daily.update(fetched)
+
+    hourly = {(lat,lon): _hourlyFromDaily(lat,lon,d,startYear,startMonth,endMonth)
+        for (lat,lon),d in daily.items()}
+    if len(hourly) > 0:
+        ids = db.saveHourlySolarMany(hourly,*dateRange)
+        for k,data in hourly.items():
+            toRtn[k] = (data,ids[k])
+    if len(failures) > 0:
+        raise ValueError('Could not fetch data at {0}'.format(', '.join('lat={0}, lon={1}: {2}'.format(
+            lat,lon,e) for (lat,lon),e in failures.items())))
+    return toRtn
 
 def saveDaily(db,lat,lon,startYear=defaultStartYear,endYear=2005,startMonth=1,endMonth=12,
     startDay=1,endDay=31):
@@ -154,18 +314,25 @@ def saveHourly(db,lat,lon,startYear=defaultStartYear,endYear=2005,startMonth=1,e
     startDay=1,endDay=31):
     dailyInsolation,_ = loadDaily(db,lat,lon,startYear,endYear,startMonth,endMonth,startDay,
         endDay)
-    startDate = datetime.date(startYear,startMonth,endMonth)
-    Ndays = len(dailyInsolation)
-    Nhours = Ndays*24
-    hourlyInsolation = []
-    for i in range(Ndays):
-        d = startDate + datetime.timedelta(days=i)
-        x = calcIrradianceVectorOverDay(lat,lon,d,1,
-            datetime.timedelta(hours=lon/15),'insolation',dailyInsolation[i])
-        hourlyInsolation = hourlyInsolation + x['irradiance']
+    hourlyInsolation = _hourlyFromDaily(lat,lon,dailyInsolation,startYear,startMonth,endMonth)
 
     #Save the data
     id = db.saveHourlySolar(hourlyInsolation,lat,lon,startYear,endYear,startMonth,endMonth,
         startDay,endDay)
 
     return hourlyInsolation,id
+
+def hourlyStartDate(startYear=defaultStartYear,startMonth=1,endMonth=12):
+    #The date of the first day of the hourly series saved for a date range,
+    #in local solar time. Hourly series have always been synthesised from
+    #this date (the 12th of startMonth by default) rather than from startDay,
+    #and stored series keep it, so calendar-dependent inputs such as yearly
+    #load profiles are aligned to it.
+    return datetime.date(startYear,startMonth,endMonth)
+
+def _hourlyFromDaily(lat,lon,dailyInsolation,startYear,startMonth,endMonth):
+    startDate = hourlyStartDate(startYear,startMonth,endMonth)
+    Ndays = len(dailyInsolation)
+    x = calcIrradianceVectorOverDays(lat,lon,startDate,Ndays,1,
+        datetime.timedelta(hours=lon/15),'insolation',dailyInsolation)
+    return x['irradiance'].ravel() #Kept as an array; databases that need lists convert it
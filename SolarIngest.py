@@ -0,0 +1,156 @@
+import asyncio
+import http.server
+import threading
+import time
+import urllib.parse
+import urllib.request as request
+
+import SolarData
+
+#Concurrent bulk ingestion of daily NASA insolation for many sites. Requests
+#are issued from an asyncio event loop with a bound on how many are in flight
+#and an optional cap on how many start per second; failed requests are retried
+#with exponential backoff. The blocking urllib calls run in worker threads so
+#that no extra HTTP dependency is needed, and responses are parsed as they
+#stream in with SolarData.parseDailyStream.
+
+defaultConcurrency = 8
+defaultRetries = 3
+defaultBackoff = 1 #seconds before the first retry, doubled on each retry
+defaultTimeout = 60 #seconds without data before a request is abandoned and retried
+
+async def fetchDailyAsync(lat,lon,startYear=SolarData.defaultStartYear,endYear=2005,
+    startMonth=1,endMonth=12,startDay=1,endDay=31,endpoint=None,semaphore=None,
+    rateLimiter=None,retries=defaultRetries,backoff=defaultBackoff,timeout=defaultTimeout):
+    #Fetches one site's daily insolation as a numpy array.
+    if endpoint is None:
+        endpoint = SolarData.dailyEndpoint
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(1)
+    url = endpoint.format(lat,lon,startYear,endYear,startMonth,endMonth,startDay,endDay)
+
+    for attempt in range(retries+1):
+        try:
+            async with semaphore:
+                if rateLimiter is not None:
+                    await rateLimiter.wait()
+                return await asyncio.to_thread(_fetch,url,timeout)
+        except Exception as e:
+            if attempt == retries:
+                raise ValueError('Could not fetch data at lat={0}, lon={1}: {2}'.format(lat,lon,e))
+            await asyncio.sleep(backoff*2**attempt)
+
+async def fetchDailyManyAsync(latLons,startYear=SolarData.defaultStartYear,endYear=2005,
+    startMonth=1,endMonth=12,startDay=1,endDay=31,endpoint=None,
+    concurrency=defaultConcurrency,maxRate=None,retries=defaultRetries,backoff=defaultBackoff,
+    timeout=defaultTimeout):
+    #Fetches many sites concurrently. Returns a dict keyed by (lat,lon) of
+    #numpy arrays, or of the exception for sites that failed after retrying.
+    semaphore = asyncio.Semaphore(concurrency)
+    rateLimiter = RateLimiter(maxRate) if maxRate is not None else None
+    latLons = list(dict.fromkeys(latLons))
+    results = await asyncio.gather(*[fetchDailyAsync(lat,lon,startYear,endYear,startMonth,
+        endMonth,startDay,endDay,endpoint,semaphore,rateLimiter,retries,backoff,timeout)
+        for (lat,lon) in latLons],return_exceptions=True)
+    return dict(zip(latLons,results))
+
+def fetchDailyMany(latLons,*args,**kwargs):
+    #Blocking wrapper around fetchDailyManyAsync
+    return asyncio.run(fetchDailyManyAsync(latLons,*args,**kwargs))
+
+def saveDailyMany(db,latLons,startYear=SolarData.defaultStartYear,endYear=2005,startMonth=1,
+    endMonth=12,startDay=1,endDay=31,skipStored=True,**kwargs):
+    #Fetches daily insolation for many sites and saves it with one bulk write.
+    #Sites that are already stored are skipped unless skipStored is False.
+    #Returns the saved ids keyed by (lat,lon) and the failures keyed the same
+    #way. Other keyword arguments are passed to fetchDailyManyAsync.
+    dateRange = (startYear,endYear,startMonth,endMonth,startDay,endDay)
+    latLons = list(dict.fromkeys(latLons))
+    if skipStored:
+        stored = db.loadDailySolarIdsMany(latLons,*dateRange)
+        latLons = [x for x in latLons if x not in stored]
+
+    fetched = fetchDailyMany(latLons,*dateRange,**kwargs)
+    failures = {k: v for k,v in fetched.items() if isinstance(v,BaseException)}
+    data = {k: v.tolist() for k,v in fetched.items() if k not in failures}
+    ids = db.saveDailySolarMany(data,*dateRange) if len(data) > 0 else {}
+    return ids,failures
+
+def _fetch(url,timeout=defaultTimeout):
+    #timeout bounds each blocking socket operation, so a stalled connection
+    #fails and is retried instead of holding its slot forever
+    with request.urlopen(url,timeout=timeout) as resource:
+        return SolarData.parseDailyStream(resource)
+
+class RateLimiter:
+    #Spaces the start of requests at least 1/maxRate seconds apart
+
+    def __init__(self,maxRate):
+        self.interval = 1/maxRate
+        self.next = 0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            if self.next > now:
+                await asyncio.sleep(self.next-now)
+                now = self.next
+            self.next = now+self.interval
+
+class LocalSolarServer:
+    #Local HTTP stand-in for the NASA endpoint, for tests and benchmarks.
+    #data is called as data(lat,lon) and returns the daily series to serve.
+    #The first failFirst requests for each site get a 503 to exercise retries,
+    #and responses are held back for delay seconds to exercise timeouts.
+    #Use as a context manager and pass server.endpoint as the endpoint.
+
+    def __init__(self,data,failFirst=0,delay=0):
+        self.data = data
+        self.failFirst = failFirst
+        self.delay = delay
+        self.requests = 0
+        self.failures = {}
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self,*args):
+        self.stop()
+
+    def start(self):
+        server = self
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                lat = float(query['lat'][0])
+                lon = float(query['lon'][0])
+                with server.lock:
+                    server.requests += 1
+                    n = server.failures.get((lat,lon),0)
+                    server.failures[(lat,lon)] = n+1
+                if n < server.failFirst:
+                    self.send_error(503)
+                    return
+                if server.delay > 0:
+                    time.sleep(server.delay)
+                body = ' '.join(str(float(x)) for x in server.data(lat,lon)).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type','text/plain')
+                self.send_header('Content-Length',str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self,*args):
+                pass
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1',0),Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever,daemon=True)
+        self.thread.start()
+        self.endpoint = ('http://127.0.0.1:'+str(self.httpd.server_port)+
+            '/daily?lat={0}&lon={1}&ys={2}&ye={3}&ms={4}&me={5}&ds={6}&de={7}')
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
@@ -0,0 +1,159 @@
+import argparse
+import json
+import math
+import sys
+import time
+
+import ReliabilityCalculator
+
+#Batch entry point for calculating frontiers over a region or a list of
+#sites. Work is planned as (site, reliability) units and units whose frontier
+#is already stored are skipped, so an interrupted run can simply be started
+#again with the same arguments.
+#
+#Examples:
+#   python runBatch.py --bbox 0 10 30 40 --reliabilities 0.9 0.95 --workers 8
+#   python runBatch.py --sites sites.csv --reliabilities 0.99 --database file
+#   python runBatch.py --bbox 0 10 30 40 --reliabilities 0.9 --stats stats.json
+#   python runBatch.py --bbox 0 10 30 40 --reliabilities 0.9 --min-der -4
+#   python runBatch.py --bbox -60 60 -180 180 --reliabilities 0.9 --enqueue
+#
+#With --enqueue the missing units are only added to the work queue in the
+#database, to be calculated by runWorker.py processes on any number of
+#machines.
+
+def parseArgs(argv):
+    parser = argparse.ArgumentParser(description='Calculate and store reliability frontiers for many sites')
+    sites = parser.add_mutually_exclusive_group(required=True)
+    sites.add_argument('--bbox',nargs=4,type=float,metavar=('LATMIN','LATMAX','LONMIN','LONMAX'),
+        help='all 1 degree cells overlapping the box')
+    sites.add_argument('--sites',metavar='FILE',help='file with one "lat,lon" per line')
+    parser.add_argument('--reliabilities',nargs='+',type=float,required=True)
+    parser.add_argument('--load-type',default='constant')
+    parser.add_argument('--engine',default='simulate',choices=sorted(list(ReliabilityCalculator.frontierEngines)+
+        list(ReliabilityCalculator.multiFrontierEngines)))
+    parser.add_argument('--backend',default='python',choices=sorted(ReliabilityCalculator.simulationBackends))
+    parser.add_argument('--min-der',type=float,default=ReliabilityCalculator.defaultMinDer,
+        help='steepest dSolCap/dStorCap of the frontiers; stored frontiers are extended to it')
+    parser.add_argument('--max-der',type=float,default=ReliabilityCalculator.defaultMaxDer,
+        help='flattest dSolCap/dStorCap of the frontiers; stored frontiers are extended to it')
+    parser.add_argument('--workers',type=int,default=1)
+    parser.add_argument('--save-batch',type=int,default=10,
+        help='frontiers saved per bulk write; at most this many are lost if the process is killed')
+    parser.add_argument('--database',default='mongo',choices=['mongo','file'])
+    parser.add_argument('--path',default=None,help='root directory of the file database')
+    parser.add_argument('--dry-run',action='store_true',help='only report the remaining work')
+    parser.add_argument('--enqueue',action='store_true',
+        help='add the remaining work to the work queue for runWorker.py instead of running it')
+    parser.add_argument('--stats',metavar='FILE',default=None,
+        help='write per-site solver counters and phase timers to FILE as JSON')
+    return parser.parse_args(argv)
+
+def regionSites(latMin,latMax,lonMin,lonMax):
+    lats = range(math.floor(latMin),max(math.ceil(latMax),math.floor(latMin)+1))
+    lons = range(math.floor(lonMin),max(math.ceil(lonMax),math.floor(lonMin)+1))
+    return [(lat,lon) for lat in lats for lon in lons]
+
+def readSites(fileName):
+    sites = []
+    with open(fileName) as f:
+        for line in f:
+            line = line.strip()
+            if len(line) < 1 or line.startswith('#'):
+                continue
+            lat,lon = line.split(',')
+            sites.append((float(lat),float(lon)))
+    return sites
+
+def openDatabase(args):
+    if args.database == 'file':
+        import FileDatabase
+        db = FileDatabase.Database() if args.path is None else FileDatabase.Database(args.path)
+    else:
+        import AppDatabase
+        db = AppDatabase.Database()
+    db.connect()
+    return db
+
+def openQueue(args,db):
+    if args.database == 'file':
+        import FileDatabase
+        return FileDatabase.WorkQueue(db)
+    else:
+        import AppDatabase
+        return AppDatabase.WorkQueue(db)
+
+def formatDuration(seconds):
+    if math.isinf(seconds) or math.isnan(seconds):
+        return '--:--:--'
+    seconds = int(round(seconds))
+    return '{0}:{1:02d}:{2:02d}'.format(seconds//3600,(seconds//60)%60,seconds%60)
+
+def writeStats(fileName,siteStats):
+    #One entry per site, slowest first
+    stats = [dict(lat=lat,lon=lon,**s.summary()) for (lat,lon),s in siteStats.items()]
+    stats.sort(key=lambda x: x['timers'].get('total',0),reverse=True)
+    with open(fileName,'w') as f:
+        json.dump(stats,f,indent=2)
+
+def main(argv):
+    args = parseArgs(argv)
+    if args.bbox is not None:
+        sites = regionSites(*args.bbox)
+    else:
+        sites = readSites(args.sites)
+
+    db = openDatabase(args)
+    try:
+        missing = ReliabilityCalculator.planHourlyReliabilityFrontiers(db,sites,
+            args.reliabilities,args.load_type,args.min_der,args.max_der)
+        nSites = len(set((math.floor(lat),math.floor(lon)) for (lat,lon) in sites))
+        total = nSites*len(set(args.reliabilities))
+        print('{0} units planned for {1} sites, {2} already stored, {3} to run'.format(
+            total,nSites,total-len(missing),len(missing)))
+        if args.dry_run or len(missing) < 1:
+            return 0
+        if args.enqueue:
+            n = openQueue(args,db).enqueue(missing,args.load_type)
+            print('{0} units added to the work queue'.format(n))
+            return 0
+
+        todoSites = list(dict.fromkeys((lat,lon) for (lat,lon,_) in missing))
+        start = time.time()
+        counts = {'done': 0,'failed': 0}
+        def progress(lat,lon,r,ok):
+            counts['done' if ok else 'failed'] += 1
+            n = counts['done']+counts['failed']
+            elapsed = time.time()-start
+            rate = n/elapsed if elapsed > 0 else math.inf
+            eta = (len(missing)-n)/rate if rate > 0 else math.inf
+            print('[{0}/{1}] {2:.1f}% {3:.3f} units/s elapsed {4} ETA {5} lat={6} lon={7} r={8}{9}'.format(
+                n,len(missing),100*n/len(missing),rate,formatDuration(elapsed),formatDuration(eta),
+                lat,lon,r,'' if ok else ' FAILED'),flush=True)
+
+        siteStats = {} if args.stats is not None else None
+        try:
+            ReliabilityCalculator.loadHourlyReliabilityFrontiers(db,todoSites,args.reliabilities,
+                args.load_type,backend=args.backend,engine=args.engine,workers=args.workers,
+                saveBatchSize=args.save_batch,progress=progress,siteStats=siteStats,
+                minDer=args.min_der,maxDer=args.max_der)
+        except KeyboardInterrupt:
+            print('Interrupted after {0} units; completed units are saved, rerun to resume'.format(
+                counts['done']))
+            return 130
+        except Exception as e:
+            print(e)
+            return 1
+        finally:
+            elapsed = time.time()-start
+            print('{0} units done, {1} failed in {2} ({3:.3f} units/s)'.format(counts['done'],
+                counts['failed'],formatDuration(elapsed),counts['done']/elapsed if elapsed > 0 else 0))
+            if siteStats is not None:
+                writeStats(args.stats,siteStats)
+    finally:
+        db.disconnect()
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
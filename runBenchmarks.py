@@ -0,0 +1,278 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+
+import CachedDatabase
+import FileDatabase
+import ReliabilityCalculator
+import SolarData
+
+#Benchmarks of the hot paths: the dispatch simulation, frontier tracing for
+#each engine, hourly solar synthesis and database round trips. Everything runs
+#offline on synthetic insolation made with SolarData's clear sky model scaled
+#by a seeded random clearness index per day. The database benchmarks use
+#FileDatabase in a temporary directory, and AppDatabase only if --mongo names
+#a MongoDB server to run them against (in a throwaway database that is
+#dropped afterwards); without it the Mongo backend is not benchmarked and
+#the results say so.
+#Results are printed (or written to --output) as JSON so that runs can be
+#compared across commits and backends.
+#
+#Examples:
+#   python runBenchmarks.py
+#   python runBenchmarks.py --years 3 --backends numba --output bench.json
+#   python runBenchmarks.py --groups database --mongo localhost
+
+lat = 10
+lon = 10
+
+def parseArgs(argv):
+    parser = argparse.ArgumentParser(description='Benchmark simulation, frontier tracing, solar synthesis and database round trips')
+    parser.add_argument('--years',type=int,default=1,help='years of synthetic hourly data per site')
+    parser.add_argument('--reliabilities',nargs='+',type=float,default=[0.9,0.99])
+    parser.add_argument('--backends',nargs='+',default=None,choices=sorted(ReliabilityCalculator.simulationBackends),
+        help='simulation backends to compare (default: all that are installed)')
+    parser.add_argument('--groups',nargs='+',default=['simulation','frontier','synthesis','database'],
+        choices=['simulation','frontier','synthesis','database'])
+    parser.add_argument('--repeat',type=int,default=3,help='timed runs per benchmark; the fastest is reported')
+    parser.add_argument('--sites',type=int,default=20,help='sites in the bulk database benchmarks')
+    parser.add_argument('--mongo',metavar='HOST',default=None,
+        help='MongoDB server to benchmark AppDatabase against (default: AppDatabase is not benchmarked)')
+    parser.add_argument('--seed',type=int,default=0)
+    parser.add_argument('--output',default=None,help='file to write the JSON results to (default: stdout)')
+    return parser.parse_args(argv)
+
+def synthesizeHourly(lat,lon,years,seed=0):
+    #Hourly insolation for whole years from defaultStartYear, with a clearness
+    #index drawn uniformly from [0.3,0.75] for each day
+    rng = np.random.default_rng(seed)
+    startDate = datetime.date(SolarData.defaultStartYear,1,1)
+    Ndays = (datetime.date(SolarData.defaultStartYear+years,1,1)-startDate).days
+    x = SolarData.calcIrradianceVectorOverDays(lat,lon,startDate,Ndays,1,
+        datetime.timedelta(hours=lon/15),'clearness',rng.uniform(0.3,0.75,Ndays))
+    return x['irradiance'].ravel()
+
+def availableBackends():
+    backends = []
+    for backend in sorted(ReliabilityCalculator.simulationBackends):
+        try:
+            ReliabilityCalculator.simulateReliability(np.ones(24),np.ones(24)/24,1,1,backend)
+            backends.append(backend)
+        except ImportError:
+            pass
+    return backends
+
+def warmUp(results,backends):
+    #Compiles the numba kernels on a tiny input so that compilation is
+    #reported here rather than in the first timed run
+    insolation = np.tile(np.linspace(0,0.1,24),2)
+    load = np.ones(48)/24
+    for backend in backends:
+        start = time.perf_counter()
+        ReliabilityCalculator.simulateReliability(insolation,load,1,1,backend)
+        ReliabilityCalculator.simulateReliabilityAggregated(insolation,load,1,1,3,backend)
+        ReliabilityCalculator.calculateMinimumStorage(0.9,insolation,load,1,backend)
+        ReliabilityCalculator.calculateDeficitStructure(insolation-load,backend)
+        record(results,'simulation','warmUp['+backend+']',[time.perf_counter()-start],backend=backend)
+
+def timeRuns(f,repeat):
+    #Returns the durations of repeat calls of f and the last result
+    durations = []
+    for n in range(repeat):
+        start = time.perf_counter()
+        result = f()
+        durations.append(time.perf_counter()-start)
+    return durations,result
+
+def record(results,group,name,durations,**fields):
+    entry = {
+        'group': group,
+        'name': name,
+        'seconds': min(durations),
+        'median': statistics.median(durations),
+        'repeats': durations
+    }
+    entry.update(fields)
+    results.append(entry)
+    print('{0:<10} {1:<40} {2:10.4f} s'.format(group,name,min(durations)),file=sys.stderr,flush=True)
+
+def benchmarkSimulation(results,insolation,load,backends,repeat):
+    solarCap = 2*np.mean(load)/np.mean(insolation)
+    storCap = 0.5
+    N = len(insolation)
+    for backend in backends:
+        durations,_ = timeRuns(lambda: ReliabilityCalculator.simulateReliability(insolation,load,
+            solarCap,storCap,backend),repeat)
+        record(results,'simulation','simulateReliability['+backend+']',durations,backend=backend,
+            hours=N,nsPerHour=1e9*min(durations)/N)
+
+    K = 64
+    solarCaps = solarCap*np.linspace(0.5,1.5,K)
+    storCaps = np.linspace(0.1,1,K)
+    durations,_ = timeRuns(lambda: ReliabilityCalculator.simulateReliabilityBatch(insolation,load,
+        solarCaps,storCaps),repeat)
+    record(results,'simulation','simulateReliabilityBatch[{0}]'.format(K),durations,candidates=K,
+        hours=N,nsPerHour=1e9*min(durations)/(N*K))
+
+    for backend in backends:
+        durations,_ = timeRuns(lambda: ReliabilityCalculator.calculateDeficitStructure(solarCap*insolation-load,
+            backend),repeat)
+        record(results,'simulation','calculateDeficitStructure['+backend+']',durations,backend=backend,
+            hours=N,nsPerHour=1e9*min(durations)/N)
+
+def benchmarkFrontiers(results,insolation,load,reliabilities,backends,repeat):
+    for engine in sorted(ReliabilityCalculator.frontierEngines):
+        for backend in backends:
+            for r in reliabilities:
+                f = ReliabilityCalculator.frontierEngines[engine]
+                durations,frontier = timeRuns(lambda: f(r,insolation,load,backend=backend,
+                    full_output=True),repeat)
+                record(results,'frontier','{0}[{1}] r={2}'.format(engine,backend,r),durations,
+                    engine=engine,backend=backend,reliability=r,points=len(frontier[0]),
+                    simulations=frontier[3]['totalSimulations'])
+
+    for engine in sorted(ReliabilityCalculator.multiFrontierEngines):
+        f = ReliabilityCalculator.multiFrontierEngines[engine]
+        for backend in backends:
+            durations,(frontiers,info) = timeRuns(lambda: f(reliabilities,insolation,load,backend=backend,
+                full_output=True),repeat)
+            record(results,'frontier','{0}[{1}] r={2}'.format(engine,backend,','.join(str(r) for r in reliabilities)),
+                durations,engine=engine,backend=backend,reliabilities=reliabilities,
+                points=sum(len(v[0]) for v in frontiers.values()),simulations=info['totalSimulations'])
+
+    for backend in backends:
+        durations,surface = timeRuns(lambda: ReliabilityCalculator.calculateReliabilitySurface(insolation,load,
+            backend=backend),repeat)
+        record(results,'frontier','calculateReliabilitySurface['+backend+']',durations,backend=backend,
+            rows=len(surface['solCap']),nodes=len(surface['storCap']))
+    for r in reliabilities:
+        durations,frontier = timeRuns(lambda: ReliabilityCalculator.reliabilityFrontierFromSurface(surface,r),
+            max(repeat,10))
+        record(results,'frontier','reliabilityFrontierFromSurface r={0}'.format(r),durations,
+            reliability=r,points=len(frontier[0]))
+
+def benchmarkSynthesis(results,years,repeat):
+    startDate = datetime.date(SolarData.defaultStartYear,1,1)
+    Ndays = 365*years
+    tOffset = datetime.timedelta(hours=lon/15)
+    durations,_ = timeRuns(lambda: SolarData.calcIrradianceVectorOverDays(lat,lon,startDate,Ndays,1,
+        tOffset,'insolation',5),repeat)
+    record(results,'synthesis','calcIrradianceVectorOverDays',durations,days=Ndays,
+        secondsPerSiteYear=min(durations)/years)
+    Ndays = 365
+    durations,_ = timeRuns(lambda: [SolarData.calcIrradianceVectorOverDay(lat,lon,
+        startDate+datetime.timedelta(days=d),1,tOffset,'insolation',5) for d in range(Ndays)],repeat)
+    record(results,'synthesis','calcIrradianceVectorOverDay',durations,days=Ndays,
+        secondsPerSiteYear=min(durations))
+
+def benchmarkDatabase(results,insolation,frontiers,surface,nSites,repeat,mongoHost=None):
+    root = tempfile.mkdtemp()
+    try:
+        db = FileDatabase.Database(root)
+        db.connect()
+        benchmarkDatabaseBackends(results,[('file',db),('cached',CachedDatabase.Database(db))],
+            insolation,frontiers,surface,nSites,repeat)
+    finally:
+        shutil.rmtree(root,ignore_errors=True)
+
+    if mongoHost is None:
+        results.append({'group': 'database','name': 'mongo','skipped':
+            'AppDatabase (MongoDB) is not benchmarked; pass --mongo HOST to include it'})
+        print('{0:<10} {1:<40} skipped, pass --mongo HOST'.format('database','mongo'),file=sys.stderr,flush=True)
+        return
+    import AppDatabase
+    db = AppDatabase.Database(mongoHost,'{0}-benchmark-{1}'.format(AppDatabase.database,os.getpid()))
+    db.connect()
+    try:
+        benchmarkDatabaseBackends(results,[('mongo',db),('cachedMongo',CachedDatabase.Database(db))],
+            insolation,frontiers,surface,nSites,repeat)
+    finally:
+        db.client.drop_database(db.name)
+        db.disconnect()
+
+def benchmarkDatabaseBackends(results,backends,insolation,frontiers,surface,nSites,repeat):
+    dateRange = (SolarData.defaultStartYear,2005,1,12,1,31)
+    sites = [(lat+i,lon) for i in range(nSites)]
+    for (name,backend) in backends:
+        durations,solarId = timeRuns(lambda: backend.saveHourlySolar(insolation,lat,lon,*dateRange),repeat)
+        record(results,'database','{0} saveHourlySolar'.format(name),durations,hours=len(insolation))
+        durations,_ = timeRuns(lambda: np.asarray(backend.loadHourlySolar(lat,lon,*dateRange)[0]).sum(),repeat)
+        record(results,'database','{0} loadHourlySolar'.format(name),durations,hours=len(insolation))
+        durations,_ = timeRuns(lambda: backend.saveReliabilityFrontiers(frontiers,lat,lon,'constant',solarId),repeat)
+        record(results,'database','{0} saveReliabilityFrontiers'.format(name),durations,reliabilities=len(frontiers))
+        durations,_ = timeRuns(lambda: backend.loadReliabilityFrontiers(lat,lon,'constant',solarId),repeat)
+        record(results,'database','{0} loadReliabilityFrontiers'.format(name),durations,reliabilities=len(frontiers))
+        durations,_ = timeRuns(lambda: backend.saveReliabilitySurface(surface,lat,lon,'constant',solarId),repeat)
+        record(results,'database','{0} saveReliabilitySurface'.format(name),durations,nodes=len(surface['storCap']))
+        durations,_ = timeRuns(lambda: backend.loadReliabilitySurface(lat,lon,'constant',solarId),repeat)
+        record(results,'database','{0} loadReliabilitySurface'.format(name),durations,nodes=len(surface['storCap']))
+
+        data = {site: insolation for site in sites}
+        durations,solarIds = timeRuns(lambda: backend.saveHourlySolarMany(data,*dateRange),repeat)
+        record(results,'database','{0} saveHourlySolarMany'.format(name),durations,sites=nSites)
+        durations,_ = timeRuns(lambda: backend.loadHourlySolarMany(sites,*dateRange),repeat)
+        record(results,'database','{0} loadHourlySolarMany'.format(name),durations,sites=nSites)
+        items = [(frontiers,la,lo,'constant',solarIds[(la,lo)]) for (la,lo) in sites]
+        durations,_ = timeRuns(lambda: backend.saveReliabilityFrontiersMany(items),repeat)
+        record(results,'database','{0} saveReliabilityFrontiersMany'.format(name),durations,sites=nSites)
+        keys = [(la,lo,solarIds[(la,lo)]) for (la,lo) in sites]
+        durations,_ = timeRuns(lambda: backend.loadReliabilityFrontiersMany(keys,'constant'),repeat)
+        record(results,'database','{0} loadReliabilityFrontiersMany'.format(name),durations,sites=nSites)
+
+def environment(args):
+    try:
+        import numba
+        numbaVersion = numba.__version__
+    except ImportError:
+        numbaVersion = None
+    return {
+        'time': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'numba': numbaVersion,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'args': vars(args)
+    }
+
+def main(argv):
+    args = parseArgs(argv)
+    backends = args.backends if args.backends is not None else availableBackends()
+    insolation = synthesizeHourly(lat,lon,args.years,args.seed)
+    load = np.tile(np.ones(24)/24,len(insolation)//24)
+    results = []
+    warmUp(results,backends)
+
+    if 'simulation' in args.groups:
+        benchmarkSimulation(results,insolation,load,backends,args.repeat)
+    if 'frontier' in args.groups:
+        benchmarkFrontiers(results,insolation,load,args.reliabilities,backends,args.repeat)
+    if 'synthesis' in args.groups:
+        benchmarkSynthesis(results,args.years,args.repeat)
+    if 'database' in args.groups:
+        frontiers = ReliabilityCalculator.calculateReliabilityFrontiers(args.reliabilities,insolation,load,
+            backend=backends[-1])
+        frontiers = {('%.6f' % r).replace('.','_'): {'solCap': f[0],'storCap': f[1],'solCapD': f[2]}
+            for r,f in frontiers.items()}
+        surface = ReliabilityCalculator.calculateReliabilitySurface(insolation,load,backend=backends[-1])
+        benchmarkDatabase(results,insolation,frontiers,surface,args.sites,args.repeat,args.mongo)
+
+    output = json.dumps({'environment': environment(args),'results': results},indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output,'w') as f:
+            f.write(output+'\n')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
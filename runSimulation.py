@@ -1,13 +1,18 @@
+import sys
 import matplotlib.pyplot as plt
 
 import AppDatabase
+import FileDatabase
 import SolarData
 import ReliabilityCalculator
 
 #AppDatabase.uninstall()
 #AppDatabase.install()
 
-db = AppDatabase.Database()
+if '--file-database' in sys.argv[1:]: #Local file store instead of MongoDB
+    db = FileDatabase.Database()
+else:
+    db = AppDatabase.Database()
 db.connect()
 
 lat = 10
@@ -0,0 +1,77 @@
+import argparse
+import sys
+import time
+
+import ReliabilityCalculator
+import runBatch
+
+#Worker entry point for the work queue filled by runBatch.py --enqueue. Start
+#any number of these, on one machine or many, against the same database; each
+#leases one unit at a time and saves its frontier. A worker that is killed
+#loses at most its current unit, which is leased again once its lease expires.
+#Workers must see the same database (the same Mongo server, or the same file
+#system for --database file) and have clocks that agree to well within the
+#lease.
+#
+#Examples:
+#   python runWorker.py --backend numba
+#   python runWorker.py --database file --path /shared/data --processes 8
+#   python runWorker.py --keep-running --idle-wait 60
+
+def parseArgs(argv):
+    parser = argparse.ArgumentParser(description='Calculate reliability frontiers from the work queue')
+    parser.add_argument('--engine',default='simulate',choices=sorted(list(ReliabilityCalculator.frontierEngines)+
+        list(ReliabilityCalculator.multiFrontierEngines)))
+    parser.add_argument('--backend',default='python',choices=sorted(ReliabilityCalculator.simulationBackends))
+    parser.add_argument('--min-der',type=float,default=ReliabilityCalculator.defaultMinDer)
+    parser.add_argument('--max-der',type=float,default=ReliabilityCalculator.defaultMaxDer)
+    parser.add_argument('--processes',type=int,default=1,help='workers started by this command')
+    parser.add_argument('--lease',type=float,default=ReliabilityCalculator.defaultLeaseSeconds,
+        help='seconds before a unit whose worker has not finished it is leased to another')
+    parser.add_argument('--max-attempts',type=int,default=3,help='attempts before a unit is marked failed')
+    parser.add_argument('--idle-wait',type=float,default=ReliabilityCalculator.defaultIdleWait,
+        help='seconds to wait when there is nothing to lease')
+    parser.add_argument('--keep-running',action='store_true',
+        help='wait for new work instead of exiting once the queue is empty')
+    parser.add_argument('--database',default='mongo',choices=['mongo','file'])
+    parser.add_argument('--path',default=None,help='root directory of the file database')
+    return parser.parse_args(argv)
+
+def runWorker(args):
+    db = runBatch.openDatabase(args)
+    try:
+        queue = runBatch.openQueue(args,db)
+        start = time.time()
+        def progress(lat,lon,r,ok):
+            print('{0} lat={1} lon={2} r={3}{4}'.format(runBatch.formatDuration(time.time()-start),
+                lat,lon,r,'' if ok else ' FAILED'),flush=True)
+        return ReliabilityCalculator.runFrontierWorker(db,queue,backend=args.backend,engine=args.engine,
+            leaseSeconds=args.lease,maxAttempts=args.max_attempts,idleWait=args.idle_wait,
+            exitWhenIdle=not args.keep_running,progress=progress,minDer=args.min_der,maxDer=args.max_der)
+    finally:
+        db.disconnect()
+
+def main(argv):
+    args = parseArgs(argv)
+    start = time.time()
+    counts = {'done': 0,'failed': 0}
+    try:
+        if args.processes <= 1:
+            results = [runWorker(args)]
+        else:
+            import concurrent.futures
+            with concurrent.futures.ProcessPoolExecutor(max_workers=args.processes) as pool:
+                results = list(pool.map(runWorker,[args]*args.processes))
+        for c in results:
+            counts['done'] += c['done']
+            counts['failed'] += c['failed']
+    except KeyboardInterrupt:
+        print('Interrupted; leased units are calculated again once their leases expire')
+        return 130
+    elapsed = time.time()-start
+    print('{0} units done, {1} failed in {2} ({3:.3f} units/s)'.format(counts['done'],counts['failed'],
+        runBatch.formatDuration(elapsed),counts['done']/elapsed if elapsed > 0 else 0))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
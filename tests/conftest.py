@@ -0,0 +1,55 @@
+import datetime
+import os
+import sys
+import numpy as np
+import pytest
+
+#The modules live at the top of the repository rather than in a package
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import SolarData
+
+def synthesizeHourly(lat=10,lon=10,days=365,seed=0):
+    #Clear sky insolation scaled by a seeded random clearness index per day,
+    #as in runBenchmarks
+    rng = np.random.default_rng(seed)
+    startDate = datetime.date(SolarData.defaultStartYear,1,1)
+    x = SolarData.calcIrradianceVectorOverDays(lat,lon,startDate,days,1,
+        datetime.timedelta(hours=lon/15),'clearness',rng.uniform(0.3,0.75,days))
+    return x['irradiance'].ravel()
+
+@pytest.fixture(params=[0,1,2])
+def series(request):
+    #(insolation, load) pairs of different sites and weather
+    insolation = synthesizeHourly(10+5*request.param,10*request.param,days=120,seed=request.param)
+    return insolation,np.full(len(insolation),1/24)
+
+@pytest.fixture
+def mongoDatabase(monkeypatch):
+    #AppDatabase on an in-memory mongomock server, installed with its indexes
+    mongomock = pytest.importorskip('mongomock')
+    import pymongo
+    import AppDatabase
+    #pymongo 4.9+ passes a sort option to bulk updates that mongomock does not know
+    addUpdate = mongomock.collection.BulkOperationBuilder.add_update
+    monkeypatch.setattr(mongomock.collection.BulkOperationBuilder,'add_update',
+        lambda self,*args,sort=None,**kwargs: addUpdate(self,*args,**kwargs))
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(pymongo,'MongoClient',lambda host: client)
+    monkeypatch.setattr(pymongo.database,'Database',lambda client,name: client[name])
+    AppDatabase.install()
+    db = AppDatabase.Database()
+    db.connect()
+    return db
+
+@pytest.fixture
+def fileDatabase(tmp_path):
+    import FileDatabase
+    db = FileDatabase.Database(str(tmp_path))
+    db.connect()
+    return db
+
+@pytest.fixture(params=['fileDatabase','mongoDatabase'])
+def database(request):
+    #Each database backend in turn
+    return request.getfixturevalue(request.param)
@@ -0,0 +1,38 @@
+import numpy as np
+
+dateRange = (1995,2005,1,12,1,31)
+
+def testBulkSolarLoadsExactSites(mongoDatabase):
+    #Every combination of these lats and lons is stored; only the requested
+    #pairs must come back
+    db = mongoDatabase
+    data = {(lat,lon): np.full(24,lat+lon/10) for lat in [0,1,2] for lon in [5,6,7]}
+    ids = db.saveHourlySolarMany(data,*dateRange)
+    assert set(ids) == set(data)
+
+    wanted = [(0,5),(1,6),(2,7)]
+    loaded = db.loadHourlySolarMany(wanted+[(3,5)],*dateRange)
+    assert set(loaded) == set(wanted)
+    for site in wanted:
+        series,solarId = loaded[site]
+        assert np.array_equal(series,data[site])
+        assert solarId == ids[site]
+    assert db.loadHourlySolarIdsMany(wanted,*dateRange) == {site: ids[site] for site in wanted}
+
+def testBulkSolarSaveReturnsOwnIds(mongoDatabase):
+    db = mongoDatabase
+    ids = db.saveDailySolarMany({(0,5): [1.0],(1,6): [2.0]},*dateRange)
+    more = db.saveDailySolarMany({(0,6): [3.0]},*dateRange)
+    assert set(more) == {(0,6)}
+    assert more[(0,6)] not in ids.values()
+
+def testBulkFrontierLoadsExactKeys(mongoDatabase):
+    db = mongoDatabase
+    ids = db.saveHourlySolarMany({(lat,lon): np.ones(24) for lat in [0,1] for lon in [5,6]},*dateRange)
+    items = [({'0_900000': {'solCap': [lat+lon]}},lat,lon,loadTypeId,ids[(lat,lon)])
+        for (lat,lon) in ids for loadTypeId in ['constant','residential']]
+    db.saveReliabilityFrontiersMany(items)
+
+    wanted = [(0,5,ids[(0,5)]),(1,6,ids[(1,6)])]
+    loaded = db.loadReliabilityFrontiersMany(wanted+[(0,6,ids[(1,6)])],'residential')
+    assert loaded == {(lat,lon,solarId): {'0_900000': {'solCap': [lat+lon]}} for (lat,lon,solarId) in wanted}
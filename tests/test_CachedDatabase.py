@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+import CachedDatabase
+
+dateRange = (1995,2005,1,12,1,31)
+
+def frontiers(scale):
+    return {'0_900000': {'solCap': [scale,scale/2],'storCap': [1.0,2.0],'solCapD': [-0.5,-0.5],'minDer': -2}}
+
+@pytest.fixture
+def cached(database):
+    #Room for two days of hourly solar
+    return CachedDatabase.Database(database,maxBytes=2*24*8)
+
+def testHitsAndMisses(cached):
+    cached.saveHourlySolar(np.ones(24),0,0,*dateRange)
+    data,solarId = cached.loadHourlySolar(0,0,*dateRange)
+    again,sameId = cached.loadHourlySolar(0,0,*dateRange)
+    assert again is data and sameId == solarId
+    assert cached.loadHourlySolarMany([(0,0)],*dateRange)[(0,0)][0] is data
+    assert (cached.hits,cached.misses) == (2,1)
+    assert cached.stats()['bytes'] == data.nbytes
+    with pytest.raises(ValueError):
+        data[0] = 2 #Shared between callers
+
+def testLeastRecentlyUsedIsEvicted(cached):
+    for lat in range(3):
+        cached.saveHourlySolar(np.full(24,float(lat)),lat,0,*dateRange)
+    cached.loadHourlySolar(0,0,*dateRange)
+    cached.loadHourlySolar(1,0,*dateRange)
+    cached.loadHourlySolar(0,0,*dateRange)
+    cached.loadHourlySolar(2,0,*dateRange) #Evicts (1,0), the least recently used
+    assert [key[1] for key in cached.entries] == [0,2]
+    assert cached.evictions == 1 and cached.nBytes <= cached.maxBytes
+    cached.loadHourlySolar(1,0,*dateRange)
+    assert cached.misses == 4
+
+def testLargeEntriesAreNotCached(cached):
+    cached.saveHourlySolar(np.ones(24*3),0,0,*dateRange)
+    cached.loadHourlySolar(0,0,*dateRange)
+    assert len(cached.entries) == 0 and cached.nBytes == 0
+
+def testSavesInvalidate(cached):
+    solarId = cached.saveHourlySolar(np.ones(24),0,0,*dateRange)
+    cached.loadHourlySolar(0,0,*dateRange)
+    solarId = cached.saveHourlySolar(np.full(24,2.0),0,0,*dateRange)
+    assert np.all(cached.loadHourlySolar(0,0,*dateRange)[0] == 2)
+
+    cached.saveReliabilityFrontiers(frontiers(1.0),0,0,'constant',solarId)
+    assert cached.loadReliabilityFrontiers(0,0,'constant',solarId)['0_900000']['solCap'][0] == 1
+    cached.saveReliabilityFrontiers(frontiers(2.0),0,0,'constant',solarId)
+    assert cached.loadReliabilityFrontiers(0,0,'constant',solarId)['0_900000']['solCap'][0] == 2
+    cached.saveReliabilityFrontiersMany([(frontiers(3.0),0,0,'constant',solarId)])
+    loaded = cached.loadReliabilityFrontiersMany([(0,0,solarId)],'constant')
+    assert loaded[(0,0,solarId)]['0_900000']['solCap'][0] == 3
+
+def testCachedFrontiersCannotBeChanged(cached):
+    solarId = cached.saveHourlySolar(np.ones(24),0,0,*dateRange)
+    cached.saveReliabilityFrontiers(frontiers(1.0),0,0,'constant',solarId)
+    for load in [lambda: cached.loadReliabilityFrontiers(0,0,'constant',solarId),
+        lambda: cached.loadReliabilityFrontiersMany([(0,0,solarId)],'constant')[(0,0,solarId)]]:
+        frontier = load()['0_900000']
+        frontier['maxDer'] = 0
+        frontier['extra'] = 1
+        with pytest.raises(ValueError):
+            frontier['solCap'][0] = 5
+        again = load()['0_900000']
+        assert set(again) == set(frontiers(1.0)['0_900000']) and again['minDer'] == -2
+        assert np.array_equal(again['solCap'],[1.0,0.5])
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+import CostOptimizer
+
+def frontier(storCap,solCap):
+    return {'storCap': list(storCap),'solCap': list(solCap)}
+
+storCap = np.linspace(0.2,6,25)
+rng = np.random.default_rng(0)
+frontiers = [
+    frontier(storCap,0.8+1/storCap), #Convex
+    frontier(storCap,np.maximum(3-storCap,0.5)), #Convex with collinear points
+    frontier(storCap,0.8+1/storCap+0.3*rng.random(len(storCap))), #Not convex
+    frontier(storCap,2-np.sqrt(storCap)/3), #Concave
+    None,
+    frontier([1.0],[2.0]),
+    frontier([0.5,1.0],[2.0,1.0]),
+    frontier(storCap[:7],1/storCap[:7])
+]
+
+solarPrices = np.array([0,0.1,0.5,1,2,5,1000])[:,None]
+storagePrices = np.array([0,0.05,0.3,1,4,1000])[None,:]
+
+def testLeastCostMatchesBruteForce():
+    result = CostOptimizer.leastCost(frontiers,solarPrices,storagePrices)
+    assert result['solCap'].shape == (len(frontiers),)+np.broadcast(solarPrices,storagePrices).shape
+    for (i,f) in enumerate(frontiers):
+        if f is None:
+            assert np.all(result['index'][i] == -1)
+            assert np.all(np.isnan(result['capitalCost'][i]))
+            continue
+        cost = (solarPrices[:,:,None]*np.array(f['solCap'])[None,None,:]+
+            storagePrices[:,:,None]*np.array(f['storCap'])[None,None,:])
+        index = result['index'][i]
+        assert np.all(np.logical_and(index >= 0,index < len(f['solCap'])))
+        assert result['capitalCost'][i] == pytest.approx(cost.min(axis=2),rel=1e-12,abs=1e-12)
+        assert np.array_equal(result['solCap'][i],np.array(f['solCap'])[index])
+        assert np.array_equal(result['storCap'][i],np.array(f['storCap'])[index])
+        assert np.array_equal(result['interior'][i],np.logical_and(index > 0,index < len(f['solCap'])-1))
+
+def testPackedFrontiersGiveSameResult():
+    result = CostOptimizer.leastCost(frontiers,solarPrices,storagePrices)
+    packed = CostOptimizer.leastCost(CostOptimizer.packFrontiers(frontiers),solarPrices,storagePrices)
+    for k in result:
+        assert np.array_equal(result[k],packed[k],equal_nan=k in ['solCap','storCap','capitalCost'])
+
+def testOnlyMissingFrontiers():
+    result = CostOptimizer.leastCost([None,None],1,1)
+    assert np.all(result['index'] == -1)
+    assert np.all(np.isnan(result['capitalCost']))
@@ -0,0 +1,36 @@
+import numpy as np
+
+import FrontierInterpolation
+import SolarData
+from conftest import synthesizeHourly
+
+dateRange = (SolarData.defaultStartYear,2005,1,12,1,31)
+
+def frontier(scale):
+    storCap = np.linspace(0.5,5,10)
+    solCap = scale*(1+1/storCap)
+    return {'solCap': solCap.tolist(),'storCap': storCap.tolist(),'solCapD': (-scale/storCap**2).tolist()}
+
+def testNeighbourhoodWrapsLongitude():
+    cells = FrontierInterpolation._neighbourhood([(10,179)],2)
+    assert (10,-180) in cells and (10,-179) in cells
+    assert all(-180 <= lon < 180 for (_,lon) in cells)
+    assert len(cells) == 25
+
+def testNeighbourhoodStopsAtPoles():
+    cells = FrontierInterpolation._neighbourhood([(89,0),(-90,0)],2)
+    assert all(-90 <= lat <= 89 for (lat,_) in cells)
+    assert len(cells) == len(set(cells))
+
+def testInterpolatesAcrossAntimeridian(fileDatabase):
+    #Stored frontiers on both sides of the antimeridian are neighbours, so
+    #nothing is calculated (which would need to fetch solar data)
+    for (lat,lon),scale in [((10,-180),1.0),((10,178),1.1)]:
+        solarId = fileDatabase.saveHourlySolar(synthesizeHourly(lat,lon,days=10),lat,lon,*dateRange)
+        fileDatabase.saveReliabilityFrontiers({'0_900000': frontier(scale)},lat,lon,'constant',solarId)
+    result = FrontierInterpolation.loadInterpolatedReliabilityFrontiers(fileDatabase,[(10.5,179.5)],[0.9],
+        maxError=1)
+    estimate,error = result[(10,179,0.9)]
+    assert 0 < error <= 1
+    assert np.all(np.array(estimate['solCap']) > np.array(frontier(1.0)['solCap']))
+    assert np.all(np.array(estimate['solCap']) < np.array(frontier(1.1)['solCap']))
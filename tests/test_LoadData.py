@@ -0,0 +1,43 @@
+import datetime
+
+import numpy as np
+import pytest
+
+import LoadData
+import SolarData
+
+monthlyScale = np.arange(1,13)
+
+@pytest.fixture
+def seasonal(monkeypatch):
+    profile = LoadData.seasonalProfile(np.ones(24),monthlyScale)
+    monkeypatch.setitem(LoadData.builtinProfiles,'seasonal',profile)
+    yield profile
+    LoadData.clearCache('seasonal')
+
+def monthOf(series,profile,day):
+    #The monthly scale of a day of the series
+    return series[24*day]/profile[0]
+
+def testSeasonalSeriesFollowsStartDate(seasonal):
+    #Hourly series start on SolarData.hourlyStartDate, not on Jan 1
+    startDate = SolarData.hourlyStartDate(1995,1,12)
+    series = LoadData.loadSeries(None,'seasonal',24*365,startDate)
+    for day in range(365):
+        date = startDate+datetime.timedelta(days=day)
+        assert monthOf(series,seasonal,day) == pytest.approx(date.month)
+
+def testSeasonalSeriesRepeatsLeapDay(seasonal):
+    startDate = datetime.date(1996,2,27)
+    series = LoadData.loadSeries(None,'seasonal',24*5,startDate)
+    assert [monthOf(series,seasonal,day) for day in range(5)] == pytest.approx([2,2,2,3,3])
+    assert np.array_equal(series[24:48],series[48:72]) #Feb 29 repeats Feb 28
+
+def testSeasonalSeriesNeedsStartDate(seasonal):
+    with pytest.raises(ValueError):
+        LoadData.loadSeries(None,'seasonal',24*365)
+
+def testDailySeriesIgnoresStartDate():
+    series = LoadData.loadSeries(None,'residential',24*10)
+    assert LoadData.loadSeries(None,'residential',24*10,datetime.date(1995,1,12)) is series
+    assert np.array_equal(series,np.tile(LoadData.builtinProfiles['residential'],10))
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+import SolarData
+import SolarIngest
+
+dateRange = (1995,1995,1,12,1,31)
+
+def dailySeries(lat,lon):
+    #Distinct series per site so that mix-ups show
+    return 3+np.sin(np.arange(365)/58+lat)+lon/100
+
+def testRetriesFailedRequests():
+    sites = [(0,0),(1,2),(3,4)]
+    with SolarIngest.LocalSolarServer(dailySeries,failFirst=2) as server:
+        fetched = SolarIngest.fetchDailyMany(sites,*dateRange,endpoint=server.endpoint,backoff=0)
+        assert server.requests == 3*len(sites)
+    for (lat,lon) in sites:
+        assert np.allclose(fetched[(lat,lon)],dailySeries(lat,lon))
+
+def testReportsFailuresAfterRetries():
+    with SolarIngest.LocalSolarServer(dailySeries,failFirst=5) as server:
+        fetched = SolarIngest.fetchDailyMany([(0,0)],*dateRange,endpoint=server.endpoint,retries=1,backoff=0)
+        assert server.requests == 2
+    assert isinstance(fetched[(0,0)],ValueError)
+
+def testStalledRequestTimesOut():
+    with SolarIngest.LocalSolarServer(dailySeries,delay=1) as server:
+        fetched = SolarIngest.fetchDailyMany([(0,0)],*dateRange,endpoint=server.endpoint,retries=1,backoff=0,
+            timeout=0.2)
+        assert server.requests == 2
+    assert isinstance(fetched[(0,0)],ValueError)
+
+@pytest.fixture(params=['fileDatabase','mongoDatabase'])
+def db(request):
+    return request.getfixturevalue(request.param)
+
+def testSaveDailyManySkipsStored(db):
+    with SolarIngest.LocalSolarServer(dailySeries) as server:
+        ids,failures = SolarIngest.saveDailyMany(db,[(0,0),(1,2)],*dateRange,endpoint=server.endpoint)
+        assert len(failures) == 0 and set(ids) == {(0,0),(1,2)}
+        ids,failures = SolarIngest.saveDailyMany(db,[(0,0),(1,2),(3,4)],*dateRange,endpoint=server.endpoint)
+        assert set(ids) == {(3,4)}
+        assert server.requests == 3
+    data,_ = SolarData.loadDaily(db,3,4,*dateRange)
+    assert np.allclose(data,dailySeries(3,4))
+
+def testLoadHourlyManyFetchesMissingSitesInBulk(db,monkeypatch):
+    with SolarIngest.LocalSolarServer(dailySeries) as server:
+        monkeypatch.setattr(SolarData,'dailyEndpoint',server.endpoint)
+        SolarIngest.saveDailyMany(db,[(0,0)],*dateRange)
+        loaded = SolarData.loadHourlyMany(db,[(0,0),(1,2),(1,2)],*dateRange)
+        #The stored daily series is used rather than fetched again
+        assert server.requests == 2
+        again = SolarData.loadHourlyMany(db,[(0,0),(1,2)],*dateRange)
+        assert server.requests == 2
+    assert set(loaded) == {(0,0),(1,2)}
+    for site in loaded:
+        assert len(loaded[site][0]) == 24*365
+        assert np.array_equal(np.asarray(loaded[site][0]),np.asarray(again[site][0]))
+        assert loaded[site][1] == again[site][1]
+    hourly,_ = SolarData.loadHourly(db,1,2,*dateRange)
+    assert np.array_equal(np.asarray(hourly),loaded[(1,2)][0])
+
+def testLoadHourlyManyRaisesForUnfetchedSites(fileDatabase,monkeypatch):
+    with SolarIngest.LocalSolarServer(dailySeries,failFirst=5) as server:
+        monkeypatch.setattr(SolarData,'dailyEndpoint',server.endpoint)
+        with pytest.raises(ValueError):
+            SolarData.loadHourlyMany(fileDatabase,[(0,0)],*dateRange,retries=0)
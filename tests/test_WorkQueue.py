@@ -0,0 +1,93 @@
+import importlib
+
+import pytest
+
+import ReliabilityCalculator
+import SolarData
+from conftest import synthesizeHourly
+
+units = [(10,10,0.9),(10,10,0.99),(11,10,0.9)]
+
+@pytest.fixture
+def queue(database):
+    #The WorkQueue of the database's own module
+    return importlib.import_module(type(database).__module__).WorkQueue(database)
+
+def state(**counts):
+    return dict({'pending': 0,'leased': 0,'done': 0,'failed': 0},**counts)
+
+def testEnqueueIsIdempotent(queue):
+    assert queue.enqueue(units,'constant') == 3
+    assert queue.enqueue(units,'constant') == 0
+    assert queue.enqueue(units[:1],'residential') == 1
+    assert queue.counts() == state(pending=4)
+
+def testLeaseAndComplete(queue):
+    queue.enqueue(units,'constant')
+    leased = [queue.lease('a',60,3) for _ in units]
+    assert queue.lease('b',60,3) is None
+    assert sorted((x['lat'],x['lon'],x['reliability']) for x in leased) == sorted(units)
+    assert all(x['attempts'] == 1 and x['worker'] == 'a' and x['loadTypeId'] == 'constant' for x in leased)
+    assert queue.counts() == state(leased=3)
+    for x in leased:
+        queue.complete(x)
+    assert queue.counts() == state(done=3)
+    assert queue.lease('a',60,3) is None
+
+def testExpiredLeaseIsLeasedAgain(queue):
+    queue.enqueue(units[:1],'constant')
+    lost = queue.lease('a',-1,3)
+    unit = queue.lease('b',60,3)
+    assert unit is not None and unit['worker'] == 'b' and unit['attempts'] == 2
+    #The first worker no longer holds the unit, so its release changes nothing
+    assert not queue.release(lost,'crashed',3)
+    assert queue.counts() == state(leased=1)
+    queue.complete(unit)
+    assert queue.counts() == state(done=1)
+
+def testLostLeaseIsNotCountedAsFailed(queue):
+    queue.enqueue(units[:1],'constant')
+    lost = queue.lease('a',-1,3)
+    unit = queue.lease('b',60,3)
+    assert not queue.release(lost,'crashed',1)
+    assert queue.counts() == state(leased=1)
+    assert queue.release(unit,'error',2)
+    assert queue.counts() == state(failed=1)
+
+def testExpiredLeaseFailsAfterMaxAttempts(queue):
+    #A unit whose workers keep dying is not leased forever
+    queue.enqueue(units[:1],'constant')
+    assert queue.lease('a',-1,2)['attempts'] == 1
+    assert queue.lease('b',-1,2)['attempts'] == 2
+    assert queue.lease('c',60,2) is None
+    assert queue.counts() == state(failed=1)
+
+def testReleaseUntilFailed(queue):
+    queue.enqueue(units[:1],'constant')
+    unit = queue.lease('a',60,2)
+    assert not queue.release(unit,'first',2)
+    assert queue.counts() == state(pending=1)
+    unit = queue.lease('a',60,2)
+    assert unit['attempts'] == 2
+    assert queue.release(unit,'second',2)
+    assert queue.counts() == state(failed=1)
+    assert queue.lease('a',60,2) is None
+
+def testDoneAndFailedUnitsAreEnqueuedAgain(queue):
+    queue.enqueue(units[:2],'constant')
+    queue.complete(queue.lease('a',60,3))
+    queue.release(queue.lease('a',60,3),'error',1)
+    assert queue.counts() == state(done=1,failed=1)
+    assert queue.enqueue(units[:2],'constant') == 2
+    assert queue.counts() == state(pending=2)
+    assert [queue.lease('a',60,3)['attempts'] for _ in range(2)] == [1,1]
+
+def testWorkerCalculatesQueuedFrontiers(database,queue):
+    dateRange = (SolarData.defaultStartYear,2005,1,12,1,31)
+    database.saveHourlySolar(synthesizeHourly(10,10,days=120),10,10,*dateRange)
+    assert ReliabilityCalculator.enqueueHourlyReliabilityFrontiers(database,queue,[(10.5,10.5)],
+        [0.5,0.9]) == (2,2)
+    assert ReliabilityCalculator.runFrontierWorker(database,queue,'a',idleWait=0) == {'done': 2,'failed': 0}
+    assert queue.counts() == state(done=2)
+    assert ReliabilityCalculator.enqueueHourlyReliabilityFrontiers(database,queue,[(10.5,10.5)],
+        [0.5,0.9]) == (0,0)
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+import ReliabilityCalculator
+
+numba = pytest.importorskip('numba')
+
+#The numba kernels must reproduce the Python reference bit for bit, including
+#at the capacity extremes where one of the min/max clamps always binds
+
+capacities = [
+    (0.5,1.0),
+    (2.0,0.3),
+    (1.0,0.0), #No storage
+    (1e6,1.0), #Far more solar than load
+    (1e6,0.0),
+    (0.0,2.0), #No solar
+]
+
+@pytest.mark.parametrize('solarCapacity,storageCapacity',capacities)
+def testUnmetLoadBackendsEqual(series,solarCapacity,storageCapacity):
+    insolation,load = series
+    python = ReliabilityCalculator.simulateUnmetLoadPython(insolation,load,solarCapacity,storageCapacity)
+    compiled = ReliabilityCalculator.simulateUnmetLoadNumba(insolation,load,solarCapacity,storageCapacity)
+    assert np.array_equal(python,compiled)
+
+@pytest.mark.parametrize('solarCapacity,storageCapacity',capacities)
+def testStreamBackendsEqual(series,solarCapacity,storageCapacity):
+    insolation,load = series
+    results = {}
+    for backend in ['python','numba']:
+        N = len(insolation)
+        unmetLoad = np.empty(N)
+        endPeriodSOC = np.empty(N)
+        total,prevSOC = ReliabilityCalculator.streamBackends[backend](insolation,load,float(solarCapacity),
+            float(storageCapacity),float(storageCapacity),unmetLoad,endPeriodSOC,True)
+        results[backend] = (total,prevSOC,unmetLoad,endPeriodSOC)
+    python,compiled = results['python'],results['numba']
+    assert python[0] == compiled[0]
+    assert python[1] == compiled[1]
+    assert np.array_equal(python[2],compiled[2])
+    assert np.array_equal(python[3],compiled[3])
+
+def testStreamMatchesReference(series):
+    #Chunking carries the state of charge, so the per-period unmet load is
+    #that of the reference whatever the chunk size
+    insolation,load = series
+    reference = ReliabilityCalculator.simulateUnmetLoadPython(insolation,load,1.5,0.4)
+    chunks = []
+    ReliabilityCalculator.simulateReliabilityStream(ReliabilityCalculator.iterChunks(insolation,load,1000),
+        1.5,0.4,'numba',trajectory=lambda u,soc: chunks.append(u.copy()))
+    assert np.array_equal(np.concatenate(chunks),reference)
+
+def testCapacityEdgeCases(series):
+    insolation,load = series
+    for backend in ['python','numba']:
+        #Without solar or storage no load is served. The totals are summed in
+        #time order, so they agree with the exact values to rounding.
+        assert ReliabilityCalculator.simulateReliability(insolation,load,0,0,backend) == pytest.approx(0,abs=1e-12)
+        #With abundant solar and storage all load is served
+        assert ReliabilityCalculator.simulateReliability(insolation,load,1e6,10,backend) == pytest.approx(1,abs=1e-12)
+        #Without storage, only daylight periods with enough sun are served
+        sunny = np.mean(1e6*insolation >= load)
+        assert ReliabilityCalculator.simulateReliability(insolation,load,1e6,0,backend) == pytest.approx(sunny)
+
+def testBatchMatchesSingle(series):
+    insolation,load = series
+    solarCaps = np.array([0.0,0.5,1.5,1e6])[:,None]
+    storCaps = np.array([0.0,0.3,2.0])[None,:]
+    batch = ReliabilityCalculator.simulateReliabilityBatch(insolation,load,solarCaps,storCaps)
+    single = np.array([[ReliabilityCalculator.simulateReliability(insolation,load,x,y) for y in storCaps[0]]
+        for x in solarCaps[:,0]])
+    assert np.array_equal(batch,single)
+
+@pytest.mark.parametrize('hoursPerStep',[1,3,7])
+@pytest.mark.parametrize('solarCapacity,storageCapacity',capacities)
+def testAggregatedBackendsEqual(series,solarCapacity,storageCapacity,hoursPerStep):
+    insolation,load = series
+    python = ReliabilityCalculator.simulateReliabilityAggregated(insolation,load,solarCapacity,storageCapacity,
+        hoursPerStep,'python')
+    compiled = ReliabilityCalculator.simulateReliabilityAggregated(insolation,load,solarCapacity,storageCapacity,
+        hoursPerStep,'numba')
+    assert python == compiled
+
+@pytest.mark.parametrize('solarCapacity,storageCapacity',capacities)
+def testAggregatedBoundsHourly(series,solarCapacity,storageCapacity):
+    #Blocks of one period are the hourly dispatch, and longer blocks can only
+    #overestimate reliability
+    insolation,load = series
+    hourly = ReliabilityCalculator.simulateReliability(insolation,load,solarCapacity,storageCapacity)
+    assert ReliabilityCalculator.simulateReliabilityAggregated(insolation,load,solarCapacity,storageCapacity,
+        1) == pytest.approx(hourly,abs=1e-12)
+    assert ReliabilityCalculator.simulateReliabilityAggregated(insolation,load,solarCapacity,storageCapacity,
+        3) >= hourly-1e-12
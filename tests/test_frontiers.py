@@ -0,0 +1,155 @@
+import numpy as np
+import pytest
+
+import LoadData
+import ReliabilityCalculator
+
+@pytest.fixture(params=[(10,10,'constant'),(50,5,'residential')])
+def site(request):
+    from conftest import synthesizeHourly
+    lat,lon,loadTypeId = request.param
+    insolation = synthesizeHourly(lat,lon,days=730,seed=lat)
+    return insolation,LoadData.loadSeries(None,loadTypeId,len(insolation))
+
+def checkFrontier(frontier,minDer=ReliabilityCalculator.defaultMinDer,maxDer=ReliabilityCalculator.defaultMaxDer):
+    solCap,storCap,solCapD = frontier
+    assert len(solCap) >= ReliabilityCalculator.minFrontierPoints
+    assert len(solCap) == len(storCap) == len(solCapD)
+    assert np.all(np.diff(storCap) > 0)
+    assert np.all(np.logical_and(np.array(solCapD) >= minDer,np.array(solCapD) <= maxDer))
+
+def onFrontier(frontier,reliability,insolation,load,tol=1e-6):
+    #Every point just meets the reliability
+    return all(ReliabilityCalculator.simulateReliability(insolation,load,x,y,'numba') == pytest.approx(reliability,abs=tol)
+        for (x,y) in zip(frontier[0],frontier[1]))
+
+@pytest.mark.parametrize('reliability',[0.3,0.5,0.9])
+def testAnalyticFrontier(site,reliability):
+    #Low reliabilities bend sharply, so the solar sweep alone steps over them
+    insolation,load = site
+    frontier = ReliabilityCalculator.calculateReliabilityFrontierAnalytic(reliability,insolation,load,backend='numba')
+    checkFrontier(frontier)
+    assert onFrontier(frontier,reliability,insolation,load)
+
+def testSharedFrontiers(site):
+    insolation,load = site
+    reliabilities = [0.3,0.5,0.9]
+    frontiers = ReliabilityCalculator.calculateReliabilityFrontiers(reliabilities,insolation,load,backend='numba')
+    for r in reliabilities:
+        checkFrontier(frontiers[r])
+        assert onFrontier(frontiers[r],r,insolation,load)
+
+@pytest.mark.parametrize('solarCapacity',[0.0,0.1,0.5,2.0])
+def testDeficitStructureBackendsEqual(site,solarCapacity):
+    insolation,load = site
+    python = ReliabilityCalculator.calculateDeficitStructure(solarCapacity*insolation-load,'python')
+    compiled = ReliabilityCalculator.calculateDeficitStructure(solarCapacity*insolation-load,'numba')
+    for (x,y) in zip(python,compiled):
+        assert np.array_equal(x,y)
+
+def testShortStoredFrontierIsCalculatedAgain(fileDatabase):
+    from conftest import synthesizeHourly
+    import SolarData
+    db = fileDatabase
+    insolation = synthesizeHourly(10,10,days=365)
+    solarId = db.saveHourlySolar(insolation,10,10,SolarData.defaultStartYear,2005,1,12,1,31)
+    rKey = ('%.6f' % 0.3).replace('.','_')
+    db.saveReliabilityFrontiers({rKey: {'solCap': [0.1],'storCap': [0.2],'solCapD': [-0.5]}},
+        10,10,'constant',solarId)
+    assert ReliabilityCalculator.planHourlyReliabilityFrontiers(db,[(10,10)],[0.3]) == [(10,10,0.3)]
+    frontiers = ReliabilityCalculator.loadHourlyReliabilityFrontiers(db,[(10,10)],[0.3],backend='numba',
+        engine='shared')
+    assert len(frontiers[0.3]['solCap']) >= ReliabilityCalculator.minFrontierPoints
+    assert ReliabilityCalculator.planHourlyReliabilityFrontiers(db,[(10,10)],[0.3]) == []
+
+@pytest.mark.parametrize('workers',[1,2])
+def testMissingFrontierBeforeStoredSite(fileDatabase,workers):
+    #A site whose frontier is missing followed by one whose frontier is stored
+    from conftest import synthesizeHourly
+    import SolarData
+    db = fileDatabase
+    for (lat,lon) in [(10,10),(11,10)]:
+        db.saveHourlySolar(synthesizeHourly(lat,lon,days=120,seed=lat),lat,lon,SolarData.defaultStartYear,
+            2005,1,12,1,31)
+    stored = ReliabilityCalculator.loadHourlyReliabilityFrontiers(db,[(11,10)],[0.9],backend='numba')
+    assert ReliabilityCalculator.planHourlyReliabilityFrontiers(db,[(10,10),(11,10)],[0.9]) == [(10,10,0.9)]
+    frontiers = ReliabilityCalculator.loadHourlyReliabilityFrontiers(db,[(10,10),(11,10)],[0.9],backend='numba',
+        workers=workers)
+    assert np.array_equal(frontiers[0.9]['solCap'],stored[0.9]['solCap'])
+    assert ReliabilityCalculator.planHourlyReliabilityFrontiers(db,[(10,10),(11,10)],[0.9]) == []
+
+@pytest.fixture(scope='module')
+def surfaceSite():
+    from conftest import synthesizeHourly
+    insolation = synthesizeHourly(10,10,days=365)
+    load = LoadData.loadSeries(None,'residential',len(insolation))
+    return insolation,load,ReliabilityCalculator.calculateReliabilitySurface(insolation,load,backend='numba')
+
+@pytest.mark.parametrize('reliability',[0.5,0.9,0.99])
+def testSurfaceFrontierWithinTolerance(surfaceSite,reliability):
+    #Every point read off the surface meets the reliability and exceeds it
+    #by at most reliabilityTol
+    insolation,load,surface = surfaceSite
+    solCap,storCap,solCapD = ReliabilityCalculator.reliabilityFrontierFromSurface(surface,reliability)
+    assert len(solCap) > 0
+    assert np.all(np.diff(storCap) > 0)
+    for (x,y) in zip(solCap,storCap):
+        simulated = ReliabilityCalculator.simulateReliability(insolation,load,x,y,'numba')
+        assert reliability-1e-9 <= simulated <= reliability+surface['reliabilityTol']+1e-9
+
+def testSurfaceRoundTrip(database,surfaceSite):
+    import SolarData
+    insolation,_,surface = surfaceSite
+    solarId = database.saveHourlySolar(insolation,10,10,SolarData.defaultStartYear,2005,1,12,1,31)
+    assert database.loadReliabilitySurface(10,10,'residential',solarId) is None
+    database.saveReliabilitySurface(surface,10,10,'residential',solarId)
+    loaded = database.loadReliabilitySurface(10,10,'residential',solarId)
+    assert set(loaded) == set(surface)
+    for k in surface:
+        assert np.array_equal(loaded[k],surface[k])
+    assert database.loadReliabilitySurface(10,10,'constant',solarId) is None
+
+def testLowReliabilityFrontierIsRepaired(site):
+    #The sweeps alone return too few points at low reliability
+    insolation,load = site
+    instrumentation = ReliabilityCalculator.Instrumentation()
+    frontier = ReliabilityCalculator.calculateReliabilityFrontier(0.3,insolation,load,backend='numba',
+        instrumentation=instrumentation)
+    assert instrumentation.counters['repairs'] > 0
+    checkFrontier(frontier)
+    assert onFrontier(frontier,0.3,insolation,load)
+    with pytest.raises(Exception):
+        ReliabilityCalculator.calculateReliabilityFrontier(0.3,insolation,load,backend='numba',maxRepairs=0)
+
+def testExtendFrontier(site):
+    insolation,load = site
+    solCap,storCap,solCapD = ReliabilityCalculator.calculateReliabilityFrontier(0.9,insolation,load,
+        backend='numba',minDer=-1,maxDer=-0.2)
+    old = {'solCap': solCap,'storCap': storCap,'solCapD': solCapD,'minDer': -1,'maxDer': -0.2}
+    new = ReliabilityCalculator.extendReliabilityFrontier(old,0.9,insolation,load,backend='numba')
+    frontier = (new['solCap'],new['storCap'],new['solCapD'])
+    checkFrontier(frontier)
+    assert (new['minDer'],new['maxDer']) == (ReliabilityCalculator.defaultMinDer,ReliabilityCalculator.defaultMaxDer)
+    #The old points are kept as they are, between the new ones at each end
+    i = new['storCap'].index(storCap[0])
+    assert new['solCap'][i:i+len(solCap)] == list(solCap)
+    assert new['solCapD'][i:i+len(solCap)] == list(solCapD)
+    assert min(new['solCapD']) < -1 and max(new['solCapD']) > -0.2
+    assert onFrontier(frontier,0.9,insolation,load,tol=1e-4)
+
+def testExtendedFrontierIsSavedInPlace(fileDatabase):
+    from conftest import synthesizeHourly
+    import SolarData
+    db = fileDatabase
+    solarId = db.saveHourlySolar(synthesizeHourly(10,10,days=365),10,10,SolarData.defaultStartYear,2005,1,12,1,31)
+    narrow = ReliabilityCalculator.loadHourlyReliabilityFrontiers(db,[(10,10)],[0.9],backend='numba',
+        minDer=-1,maxDer=-0.2)[0.9]
+    assert ReliabilityCalculator.planHourlyReliabilityFrontiers(db,[(10,10)],[0.9]) == [(10,10,0.9)]
+    wide = ReliabilityCalculator.loadHourlyReliabilityFrontiers(db,[(10,10)],[0.9],backend='numba')[0.9]
+    assert len(wide['solCap']) > len(narrow['solCap'])
+    stored = db.loadReliabilityFrontiers(10,10,'constant',solarId)
+    assert list(stored) == ['0_900000']
+    assert np.array_equal(stored['0_900000']['solCap'],wide['solCap'])
+    assert (stored['0_900000']['minDer'],stored['0_900000']['maxDer']) == (ReliabilityCalculator.defaultMinDer,
+        ReliabilityCalculator.defaultMaxDer)
+    assert ReliabilityCalculator.planHourlyReliabilityFrontiers(db,[(10,10)],[0.9]) == []